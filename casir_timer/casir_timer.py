@@ -3,23 +3,27 @@ import time
 import os
 import shutil
 import numpy as np
-from ultralytics import YOLO
+from common.inference_engine import load_detector
+from common.inference_client import create_detector
+from common.motion_gate import MotionGate, format_gate_stats
+from common.presence_classifier import PresenceClassifier
 
 import config
 from database import get_trading_point_schedule, save_absence_to_db, sync_offline_data
-from video_stream import VideoStream
-from detection import detect_person, draw_detections
+from video_stream import create_video_stream
+from detection import detect_presence, draw_detections
 from utils import setup_ram_disk, get_next_state_delay
 
-def run_detection_session(duration, model, ram_disk_path):
+def run_detection_session(duration, model, ram_disk_path, presence_model=None):
     """
     Запускает цикл детекции на определенное время (duration секунд).
+    presence_model - классификатор присутствия (быстрый ответ, детектор - при неуверенном).
     Возвращает True, если сессия завершилась по времени, False если была прервана ошибкой.
     """
     print(f"[{time.strftime('%H:%M:%S')}] Начало рабочей сессии на {duration/60:.1f} минут.")
     
     # Запуск видеопотока только на время работы
-    video_stream = VideoStream(config.RTSP_URL).start()
+    video_stream = create_video_stream(config.RTSP_URL, retrieve_interval=config.CAPTURE_INTERVAL).start()
     time.sleep(2.0) # Разогрев
     
     session_end_time = time.time() + duration
@@ -27,27 +31,55 @@ def run_detection_session(duration, model, ram_disk_path):
     current_absence_start = None
     timeout_start = None
     is_absent = False
+    last_frame_seq = None
+    
+    # Без изменений в ROI кассира детекция не запускается - используется последний результат
+    motion_gate = MotionGate(config.MOTION_GATE_THRESHOLD, config.MOTION_GATE_MAX_INTERVAL, config.MOTION_GATE_METHOD)
+    gate_roi = [config.ROI] if config.ROI else None
+    last_gate_report = time.time()
+    person_detected, max_confidence, detection_info = False, 0.0, []
+    # Чей ответ использован: классификатора присутствия или детектора
+    decisions = {'classifier': 0, 'detector': 0}
     
     try:
         while time.time() < session_end_time:
             iteration_start = time.time()
             current_time = time.time()
             
-            # Чтение кадра
-            ret, frame = video_stream.read()
+            # Ожидание нового кадра без копирования (кадр только для чтения)
+            ret, frame_view = video_stream.wait_for_new_frame(timeout=5, after_seq=last_frame_seq)
             if not ret:
                 print("Потеря связи с камерой, ожидание...")
-                time.sleep(5)
+                continue
+            last_frame_seq = frame_view.seq
+            frame = frame_view.frame
+            
+            # Кадр, поврежденный при ошибках декодирования, не отправляем в детекцию:
+            # на серых/размазанных блоках человек не находится и фиксируется ложное отсутствие
+            if not video_stream.check_frame(frame_view):
+                # Пауза до конца интервала опроса, как после обработанного кадра
+                time.sleep(max(0, config.CAPTURE_INTERVAL - (time.time() - iteration_start)))
                 continue
             
             # Сохранение на RAM-диск
             photo_path = os.path.join(ram_disk_path, f"cashier_{int(time.time())}.jpg")
             cv2.imwrite(photo_path, frame)
             
-            # Детекция
-            person_detected, max_confidence, detection_info = detect_person(
-                frame, model, config.CONFIDENCE_THRESHOLD, config.ROI
-            )
+            # Детекция (при неизменной ROI - результат предыдущей детекции)
+            if motion_gate.check(frame, frame_view.timestamp, gate_roi):
+                person_detected, max_confidence, detection_info, source = detect_presence(
+                    frame, model, presence_model, config.CONFIDENCE_THRESHOLD, config.ROI,
+                    config.PRESENCE_LOW, config.PRESENCE_HIGH
+                )
+                decisions[source] += 1
+            if current_time - last_gate_report >= config.MOTION_GATE_REPORT_INTERVAL:
+                last_gate_report = current_time
+                print(f"[{time.strftime('%H:%M:%S')}] Детекция без изменений в ROI: "
+                      f"{format_gate_stats(motion_gate.get_stats(reset=True))}")
+                if presence_model is not None:
+                    print(f"[{time.strftime('%H:%M:%S')}] Ответы: классификатор {decisions['classifier']}, "
+                          f"детектор {decisions['detector']}")
+                    decisions = dict.fromkeys(decisions, 0)
             
             # Логика отсутствия (без изменений)
             if person_detected:
@@ -102,6 +134,10 @@ def run_detection_session(duration, model, ram_disk_path):
             if mins > 0:
                 save_absence_to_db(current_absence_start, time.time(), mins)
         
+        if motion_gate.checked:
+            print(f"Детекция без изменений в ROI: {format_gate_stats(motion_gate.get_stats())}")
+        if presence_model is not None:
+            print(f"Ответы: классификатор {decisions['classifier']}, детектор {decisions['detector']}")
         video_stream.release()
         if config.SHOW_DETECTION: cv2.destroyAllWindows()
         
@@ -115,11 +151,22 @@ def monitor_cashier_absence():
     
     # Инициализация модели (один раз)
     try:
-        model = YOLO(config.MODEL_PATH, task='detect')
-        model.overrides['device'] = 'cpu'
+        model = create_detector(config.MODEL_PATH, 'cassir', config.INFERENCE_ENGINE, config.MODEL_PRECISION,
+                                config.USE_INFERENCE_SERVER, config.INFERENCE_SOCKET)
+        if hasattr(model, 'overrides'):
+            model.overrides['device'] = 'cpu'
     except Exception as e:
-        print(f"Ошибка загрузки YOLO, пробуем fallback: {e}")
-        model = YOLO(config.MODEL_PATH, task='detect')
+        print(f"Ошибка загрузки модели ({config.INFERENCE_ENGINE}), пробуем ultralytics: {e}")
+        model = load_detector(config.MODEL_PATH, 'ultralytics', config.MODEL_PRECISION)
+
+    # Классификатор присутствия (необязательный): без него работает только детектор
+    presence_model = None
+    if config.PRESENCE_MODEL_PATH:
+        try:
+            presence_model = PresenceClassifier(config.PRESENCE_MODEL_PATH)
+            print(f"Классификатор присутствия: {config.PRESENCE_MODEL_PATH} ({presence_model.imgsz[1]}px)")
+        except Exception as e:
+            print(f"Ошибка загрузки классификатора присутствия, используется только детектор: {e}")
 
     # Linux fix
     os.environ['QT_QPA_PLATFORM'] = 'xcb'
@@ -146,7 +193,7 @@ def monitor_cashier_absence():
             
             if state == 'WORK':
                 # Работаем рассчитанное время
-                run_detection_session(delay_seconds, model, ram_disk_path)
+                run_detection_session(delay_seconds, model, ram_disk_path, presence_model)
             else:
                 # Спим до начала смены
                 print(f"[{time.strftime('%H:%M:%S')}] Нерабочее время. Ожидание {delay_seconds/3600:.2f} часов до начала смены.")
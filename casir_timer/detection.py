@@ -1,56 +1,50 @@
 import cv2
 import numpy as np
-from config import CONFIDENCE_THRESHOLD, ROI
-
-def create_roi_mask(frame_shape, roi_points):
-    """
-    Создает маску для области интереса (ROI) на основе многоугольника
-    """
-    mask = np.zeros(frame_shape[:2], dtype=np.uint8)
-    if roi_points is not None:
-        # Преобразуем точки в формат, подходящий для cv2.fillPoly
-        pts = np.array(roi_points, dtype=np.int32)
-        cv2.fillPoly(mask, [pts], 255)
-    return mask
+from config import CONFIDENCE_THRESHOLD, ROI, ROI_INFERENCE_MODE, PRESENCE_LOW, PRESENCE_HIGH
+from common.roi_crop import prepare_roi_input
+from common.roi_geometry import get_roi_geometry, box_centers
+from common.postprocess import results_to_array, boxes_xyxy, to_detection_info
+from common.presence_classifier import presence_input
 
 def detect_person(frame, model, confidence_threshold=CONFIDENCE_THRESHOLD, roi=None):
     """
     Детекция человека на кадре с порогом уверенности и областью интереса (ROI)
     """
-    person_count = 0
-    max_confidence = 0.0
-    detection_info = []
+    # Если задана область интереса, модель получает только ее (ROI_INFERENCE_MODE)
+    roi_frame, offset = prepare_roi_input(frame, [roi] if roi is not None else None, ROI_INFERENCE_MODE)
+    if roi_frame is None:
+        return False, 0.0, []
     
-    # Если задана область интереса, создаем маску
-    if roi is not None:
-        mask = create_roi_mask(frame.shape, roi)
-        # Применяем маску к кадру
-        masked_frame = cv2.bitwise_and(frame, frame, mask=mask)
-        results = model(masked_frame, verbose=False)
-    else:
-        results = model(frame, verbose=False)
+    # Люди (класс 0) с порогом уверенности - фильтр над массивами всех боксов
+    persons = results_to_array(model(roi_frame, verbose=False), offset, classes=[0], min_conf=confidence_threshold)
     
-    for result in results:
-        boxes = result.boxes
-        if boxes is not None:
-            for box in boxes:
-                cls = int(box.cls[0])
-                confidence = box.conf[0].item()
-                
-                if cls == 0 and confidence >= confidence_threshold:  # класс 'person' с порогом уверенности
-                    person_count += 1
-                    max_confidence = max(max_confidence, confidence)
-                    
-                    # Получаем координаты bounding box
-                    x1_box, y1_box, x2_box, y2_box = map(int, box.xyxy[0])
-                    
-                    # Сохраняем информацию о детекции для отрисовки
-                    detection_info.append({
-                        'bbox': (x1_box, y1_box, x2_box, y2_box),
-                        'confidence': confidence
-                    })
+    # В режиме crop в прямоугольник ROI попадают и люди вне ROI - проверяем центры всех боксов сразу
+    if roi is not None and ROI_INFERENCE_MODE == 'crop' and len(persons):
+        persons = persons[get_roi_geometry([roi], frame.shape).contains(box_centers(boxes_xyxy(persons)))]
     
-    return person_count > 0, max_confidence, detection_info
+    # Информация о детекциях для отрисовки
+    detection_info = to_detection_info(persons)
+    max_confidence = float(persons['conf'].max()) if len(persons) else 0.0
+    
+    return bool(detection_info), max_confidence, detection_info
+
+def detect_presence(frame, model, classifier, confidence_threshold=CONFIDENCE_THRESHOLD, roi=None,
+                    low=PRESENCE_LOW, high=PRESENCE_HIGH):
+    """
+    Присутствие человека в ROI: сначала классификатор присутствия, при неуверенном ответе
+    (вероятность между low и high) или без классификатора - детектор (detect_person).
+    Возвращает результат detect_person и источник ответа: 'classifier' | 'detector'.
+    По ответу классификатора боксов нет, max_confidence - вероятность присутствия
+    """
+    if classifier is not None:
+        image = presence_input(frame, roi)
+        if image is not None:
+            probability = classifier(image)
+            if probability >= high:
+                return True, probability, [], 'classifier'
+            if probability <= low:
+                return False, probability, [], 'classifier'
+    return detect_person(frame, model, confidence_threshold, roi) + ('detector',)
 
 def draw_detections(frame, detection_info, person_detected, roi=None, absence_minutes=0, timeout_remaining=0, is_absent=False):
     """
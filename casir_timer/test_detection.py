@@ -3,7 +3,7 @@ import time
 import os
 os.environ['QT_QPA_PLATFORM'] = 'xcb'
 
-from ultralytics import YOLO
+from common.inference_engine import load_detector
 import config
 from video_stream import VideoStream
 from detection import detect_person, draw_detections
@@ -14,7 +14,7 @@ def test():
     print(f"RTSP_URL: {config.RTSP_URL}")
     
     # Загружаем модель
-    model = YOLO(config.MODEL_PATH, task='detect')
+    model = load_detector(config.MODEL_PATH, config.INFERENCE_ENGINE, config.MODEL_PRECISION)
     
     # Запускаем видеопоток
     video_stream = VideoStream(config.RTSP_URL).start()
@@ -4,36 +4,45 @@ import os
 import shutil
 import numpy as np
 import threading
-from ultralytics import YOLO
 
 # Импорт конфигурации
 from config import (
     RTSP_URL, 
     # Настройки кассира
     CONFIDENCE_THRESHOLD_CASSIR, SHOW_DETECTION_CASSIR, CAPTURE_INTERVAL_CASSIR,
-    TIMEOUT_DURATION_CASSIR, ROI_LIST, MODEL_PATH,
+    TIMEOUT_DURATION_CASSIR, ROI_LIST, MODEL_PATH, INFERENCE_ENGINE, MODEL_PRECISION,
+    USE_INFERENCE_SERVER, INFERENCE_SOCKET,
     # Настройки клиента
     CONFIDENCE_THRESHOLD_CLIENT, SHOW_DETECTION_CLIENT, CAPTURE_INTERVAL_CLIENT,
     CLIENT_APPEARANCE_TIMER, CLIENT_DEPARTURE_TIMER, CASHIER_WAIT_TIMER,
     # Настройки обработки ошибок
-    DECODE_ERROR_THRESHOLD, DECODE_ERROR_WINDOW, RECONNECT_ON_DECODE_ERROR
+    DECODE_ERROR_THRESHOLD, DECODE_ERROR_WINDOW, RECONNECT_ON_DECODE_ERROR,
+    MOTION_GATE_REPORT_INTERVAL
 )
 
 # Импорты из других модулей
 from database import get_trading_point_schedule, save_absence_to_db, save_client_presence_to_db, sync_offline_data
-from video_stream import VideoStream
-from detection import detect_person_in_specific_roi, draw_detections
+from video_stream import create_video_stream
+from detection import SharedRoiDetector, select_roi_detections, draw_detections
 from utils import setup_ram_disk, get_next_state_delay
+from common.inference_client import create_detector
+from common.motion_gate import format_gate_stats
 
-def run_cashier_session(duration, model, ram_disk_path):
+def run_cashier_session(duration, model, ram_disk_path, video_stream=None, detector=None):
     """
     Сессия мониторинга кассира на рабочее время (duration секунд).
+    video_stream и detector - общие с сессией клиента (один поток камеры и одна
+    детекция на кадр); если не переданы, сессия создает свои.
     """
     print(f"[{time.strftime('%H:%M:%S')}] [КАССИР] Запуск мониторинга на {duration/3600:.2f} ч.")
     
     # Запускаем поток видео только на время смены
-    video_stream = VideoStream(RTSP_URL).start()
-    time.sleep(2.0)  # Разогрев камеры
+    own_stream = video_stream is None
+    if own_stream:
+        video_stream = create_video_stream(RTSP_URL, retrieve_interval=CAPTURE_INTERVAL_CASSIR).start()
+        time.sleep(2.0)  # Разогрев камеры
+    if detector is None:
+        detector = SharedRoiDetector(model, ROI_LIST, CONFIDENCE_THRESHOLD_CASSIR)
     
     session_end_time = time.time() + duration
     
@@ -42,6 +51,8 @@ def run_cashier_session(duration, model, ram_disk_path):
     timeout_start = None
     is_absent = False
     last_status_check = time.time()
+    last_gate_report = time.time()
+    last_frame_seq = None
     
     try:
         while time.time() < session_end_time:
@@ -54,21 +65,38 @@ def run_cashier_session(duration, model, ram_disk_path):
                 if status['decode_errors']['recent_errors'] > DECODE_ERROR_THRESHOLD // 2:
                     print(f"[{time.strftime('%H:%M:%S')}] [КАССИР] Высокий уровень ошибок: {status['decode_errors']['recent_errors']}/{DECODE_ERROR_THRESHOLD}")
             
-            # Чтение кадра
-            ret, frame = video_stream.read()
+            # Доля детекций, пропущенных без изменений в ROI (детектор общий - выводит только сессия кассира)
+            if loop_start - last_gate_report >= MOTION_GATE_REPORT_INTERVAL:
+                last_gate_report = loop_start
+                gate_stats = detector.get_stats(reset_gate=True)['motion_gate']
+                print(f"[{time.strftime('%H:%M:%S')}] [КАССИР] Детекция без изменений в ROI: {format_gate_stats(gate_stats)}")
+            
+            # Ожидание нового кадра без копирования (кадр только для чтения)
+            ret, frame_view = video_stream.wait_for_new_frame(timeout=CAPTURE_INTERVAL_CASSIR, after_seq=last_frame_seq)
             if not ret:
-                time.sleep(CAPTURE_INTERVAL_CASSIR)
                 continue
+            last_frame_seq = frame_view.seq
+            frame = frame_view.frame
+            
+            # Кадр, поврежденный при ошибках декодирования, не отправляем в детекцию:
+            # на серых/размазанных блоках человек не находится и фиксируется ложное отсутствие
+            if not video_stream.check_frame(frame_view):
+                # Пауза до конца интервала опроса, как после обработанного кадра
+                time.sleep(max(0, CAPTURE_INTERVAL_CASSIR - (time.time() - loop_start)))
+                continue
+            
+            # Детекция кассира (ROI 0 - кассир): общий с сессией клиента проход модели,
+            # результат клиента переиспользуется, если он не старше интервала опроса кассира
+            frame_view, detections = detector.detect(frame_view, max_age=CAPTURE_INTERVAL_CASSIR)
+            frame = frame_view.frame
+            person_detected, max_conf, detection_info = select_roi_detections(
+                detections, 0, CONFIDENCE_THRESHOLD_CASSIR
+            )
             
             # Сохранение фото (для обработки)
             photo_path = os.path.join(ram_disk_path, f"cashier_{int(loop_start)}.jpg")
             cv2.imwrite(photo_path, frame)
             
-            # Детекция кассира (ROI 0 - кассир)
-            person_detected, max_conf, detection_info = detect_person_in_specific_roi(
-                frame, model, 0, CONFIDENCE_THRESHOLD_CASSIR, ROI_LIST
-            )
-            
             # --- ЛОГИКА ОПРЕДЕЛЕНИЯ ОТСУТСТВИЯ КАССИРА ---
             if person_detected:
                 if is_absent:
@@ -129,21 +157,27 @@ def run_cashier_session(duration, model, ram_disk_path):
             if absence_min > 0:
                 save_absence_to_db(current_absence_start, current_time, absence_min)
         
-        video_stream.release()
+        if own_stream:
+            video_stream.release()
         if SHOW_DETECTION_CASSIR: 
             cv2.destroyAllWindows()
     
     return True
 
-def run_client_session(duration, model, ram_disk_path):
+def run_client_session(duration, model, ram_disk_path, video_stream=None, detector=None):
     """
     Сессия мониторинга клиентов на рабочее время (duration секунд).
+    video_stream и detector - общие с сессией кассира; если не переданы, сессия создает свои.
     """
     print(f"[{time.strftime('%H:%M:%S')}] [КЛИЕНТ] Запуск мониторинга на {duration/3600:.2f} ч.")
     
     # Запуск стрима
-    video_stream = VideoStream(RTSP_URL).start()
-    time.sleep(2.0)  # Разогрев
+    own_stream = video_stream is None
+    if own_stream:
+        video_stream = create_video_stream(RTSP_URL, retrieve_interval=CAPTURE_INTERVAL_CLIENT).start()
+        time.sleep(2.0)  # Разогрев
+    if detector is None:
+        detector = SharedRoiDetector(model, ROI_LIST, CONFIDENCE_THRESHOLD_CLIENT)
     
     session_end_time = time.time() + duration
     
@@ -156,6 +190,7 @@ def run_client_session(duration, model, ram_disk_path):
     client_appearance_timer_start = None
     client_departure_timer_start = None
     last_status_check = time.time()
+    last_frame_seq = None
     
     try:
         while time.time() < session_end_time:
@@ -169,8 +204,8 @@ def run_client_session(duration, model, ram_disk_path):
                 if status['decode_errors']['recent_errors'] > DECODE_ERROR_THRESHOLD // 2:
                     print(f"[{time.strftime('%H:%M:%S')}] [КЛИЕНТ] Высокий уровень ошибок: {status['decode_errors']['recent_errors']}/{DECODE_ERROR_THRESHOLD}")
             
-            # Чтение кадра
-            ret, frame = video_stream.read()
+            # Ожидание нового кадра без копирования (кадр только для чтения)
+            ret, frame_view = video_stream.wait_for_new_frame(timeout=CAPTURE_INTERVAL_CLIENT, after_seq=last_frame_seq)
             if not ret:
                 if SHOW_DETECTION_CLIENT:
                     error_frame = np.zeros((480, 640, 3), dtype=np.uint8)
@@ -179,23 +214,35 @@ def run_client_session(duration, model, ram_disk_path):
                     cv2.imshow('Client Monitoring', error_frame)
                     if cv2.waitKey(1) & 0xFF == ord('q'): 
                         return False
-                time.sleep(CAPTURE_INTERVAL_CLIENT)
                 continue
+            last_frame_seq = frame_view.seq
+            frame = frame_view.frame
             
-            # Сохранение фото
-            photo_path = os.path.join(ram_disk_path, f"client_{int(current_time)}.jpg")
-            cv2.imwrite(photo_path, frame)
+            # Кадр, поврежденный при ошибках декодирования, не отправляем в детекцию:
+            # на серых/размазанных блоках человек не находится и фиксируется ложное отсутствие
+            if not video_stream.check_frame(frame_view):
+                # Пауза до конца интервала опроса, как после обработанного кадра
+                time.sleep(max(0, CAPTURE_INTERVAL_CLIENT - (time.time() - iteration_start)))
+                continue
+            
+            # Один проход модели на обе ROI (общий с сессией кассира)
+            frame_view, detections = detector.detect(frame_view, max_age=CAPTURE_INTERVAL_CLIENT)
+            frame = frame_view.frame
             
             # Детекция клиента (ROI 1 - клиент)
-            client_detected, _, client_info = detect_person_in_specific_roi(
-                frame, model, 1, CONFIDENCE_THRESHOLD_CLIENT, ROI_LIST
+            client_detected, _, client_info = select_roi_detections(
+                detections, 1, CONFIDENCE_THRESHOLD_CLIENT
             )
             
             # Детекция кассира (ROI 0 - кассир)
-            cashier_detected, _, cashier_info = detect_person_in_specific_roi(
-                frame, model, 0, CONFIDENCE_THRESHOLD_CLIENT, ROI_LIST
+            cashier_detected, _, cashier_info = select_roi_detections(
+                detections, 0, CONFIDENCE_THRESHOLD_CLIENT
             )
             
+            # Сохранение фото
+            photo_path = os.path.join(ram_disk_path, f"client_{int(current_time)}.jpg")
+            cv2.imwrite(photo_path, frame)
+            
             # --- ЛОГИКА ОТСЛЕЖИВАНИЯ КЛИЕНТА ---
             if client_detected:
                 if not client_present:
@@ -298,7 +345,8 @@ def run_client_session(duration, model, ram_disk_path):
                 if wait_minutes > 0:
                     save_client_presence_to_db(client_confirmed_appearance_time, current_time, wait_minutes)
         
-        video_stream.release()
+        if own_stream:
+            video_stream.release()
         if SHOW_DETECTION_CLIENT: 
             cv2.destroyAllWindows()
     
@@ -306,16 +354,26 @@ def run_client_session(duration, model, ram_disk_path):
 
 def start_monitoring_threads(duration, model):
     """
-    Запускает оба мониторинга в отдельных потоках
+    Запускает оба мониторинга в отдельных потоках.
+    Сессии используют один поток камеры и одну детекцию на кадр (SharedRoiDetector).
+    Возвращает потоки сессий и видеопоток, который нужно освободить после их завершения
     """
     # Создаем отдельные RAM-диски для каждого потока
     cashier_ram_disk = setup_ram_disk("cashier")
     client_ram_disk = setup_ram_disk("client")
     
+    # Общий видеопоток: кадры нужны с частотой более частого опроса из двух сессий
+    video_stream = create_video_stream(
+        RTSP_URL, retrieve_interval=min(CAPTURE_INTERVAL_CASSIR, CAPTURE_INTERVAL_CLIENT)
+    ).start()
+    time.sleep(2.0)  # Разогрев камеры
+    # Модель запускается с меньшим из порогов, каждая сессия отбирает детекции по своему
+    detector = SharedRoiDetector(model, ROI_LIST, min(CONFIDENCE_THRESHOLD_CASSIR, CONFIDENCE_THRESHOLD_CLIENT))
+    
     # Функции для запуска в потоках
     def cashier_monitoring():
         try:
-            run_cashier_session(duration, model, cashier_ram_disk)
+            run_cashier_session(duration, model, cashier_ram_disk, video_stream, detector)
         except KeyboardInterrupt:
             pass
         finally:
@@ -326,7 +384,7 @@ def start_monitoring_threads(duration, model):
     
     def client_monitoring():
         try:
-            run_client_session(duration, model, client_ram_disk)
+            run_client_session(duration, model, client_ram_disk, video_stream, detector)
         except KeyboardInterrupt:
             pass
         finally:
@@ -342,7 +400,7 @@ def start_monitoring_threads(duration, model):
     cashier_thread.start()
     client_thread.start()
     
-    return cashier_thread, client_thread
+    return cashier_thread, client_thread, video_stream
 
 def monitor_system():
     """
@@ -350,7 +408,7 @@ def monitor_system():
     """
     # Загружаем модель один раз
     try:
-        model = YOLO(MODEL_PATH, task='detect')
+        model = create_detector(MODEL_PATH, 'client', INFERENCE_ENGINE, MODEL_PRECISION, USE_INFERENCE_SERVER, INFERENCE_SOCKET)
     except Exception as e:
         print(f"Error loading model: {e}")
         return
@@ -382,11 +440,12 @@ def monitor_system():
             if state == 'WORK':
                 # Запускаем оба мониторинга
                 print(f"[{time.strftime('%H:%M:%S')}] Начало рабочей смены. Длительность: {delay/3600:.2f} ч.")
-                cashier_thread, client_thread = start_monitoring_threads(delay, model)
+                cashier_thread, client_thread, video_stream = start_monitoring_threads(delay, model)
                 
                 # Ждем завершения обоих потоков
                 cashier_thread.join()
                 client_thread.join()
+                video_stream.release()
                 
                 print(f"[{time.strftime('%H:%M:%S')}] Смена окончена.")
             else:
@@ -18,6 +18,53 @@ RTSP_URL = os.getenv('RTSP_URL_CLIENT')
 BUFFER_SIZE = int(os.getenv('CAMERA_BUFFER_SIZE'))
 RECONNECT_TIMEOUT = int(os.getenv('CAMERA_RECONNECT_TIMEOUT'))
 MAX_RECONNECT_ATTEMPTS = int(os.getenv('CAMERA_MAX_RECONNECT_ATTEMPTS'))
+# Максимальная пауза между попытками переподключения (пауза растет вдвое от RECONNECT_TIMEOUT)
+RECONNECT_MAX_DELAY = float(os.getenv('CAMERA_RECONNECT_MAX_DELAY', '120'))
+# Таймаут подключения к камере (сек)
+OPEN_TIMEOUT = float(os.getenv('CAMERA_OPEN_TIMEOUT', '10'))
+
+# Брокер кадров: подписка на общий декодер вместо собственного RTSP подключения
+USE_FRAME_BROKER = os.getenv('USE_FRAME_BROKER', 'False').lower() == 'true'
+
+# Режим захвата: read - декодирование каждого кадра, grab - BGR кадр только по запросу
+CAPTURE_MODE = os.getenv('CAMERA_CAPTURE_MODE', 'read').lower()
+
+# Бэкенд декодирования: opencv | pyav
+CAMERA_BACKEND = os.getenv('CAMERA_BACKEND', 'opencv').lower()
+# Какие кадры декодирует PyAV: all | nonref (без B-кадров) | keyframes (только I-кадры)
+DECODE_MODE = os.getenv('CAMERA_DECODE_MODE', 'all').lower()
+# Отдавать каждый N-й декодированный кадр (PyAV)
+DECODE_EVERY = int(os.getenv('CAMERA_DECODE_EVERY', '1'))
+
+# Минимальная оценка целостности кадра для детекции (0 - без проверки)
+FRAME_QUALITY_THRESHOLD = float(os.getenv('FRAME_QUALITY_THRESHOLD', '0.7'))
+
+# Что получает модель при заданных ROI: mask - весь кадр с маской, crop - прямоугольник ROI,
+# crop_mask - прямоугольник ROI с маской
+ROI_INFERENCE_MODE = os.getenv('ROI_INFERENCE_MODE', 'crop_mask').lower()
+
+# Пропуск детекции без изменений в ROI: если доля изменившихся пикселей ROI (на уменьшенном кадре)
+# не больше порога, переиспользуется последний результат детекции (0 - детекция на каждом кадре).
+# MOTION_GATE_THRESHOLD_CLIENT переопределяет общий MOTION_GATE_THRESHOLD для этого сервиса
+MOTION_GATE_THRESHOLD = float(os.getenv('MOTION_GATE_THRESHOLD_CLIENT') or os.getenv('MOTION_GATE_THRESHOLD', '0.01'))
+# Метод: diff - разность с кадром последней детекции | mog2 - модель фона MOG2
+MOTION_GATE_METHOD = os.getenv('MOTION_GATE_METHOD', 'diff').lower()
+# Детекция не реже чем раз в N секунд, даже без изменений в ROI
+MOTION_GATE_MAX_INTERVAL = float(os.getenv('MOTION_GATE_MAX_INTERVAL', '30'))
+# Интервал вывода доли пропущенных детекций (сек)
+MOTION_GATE_REPORT_INTERVAL = float(os.getenv('MOTION_GATE_REPORT_INTERVAL', '600'))
+
+# Движок детекции: onnxruntime (модель .onnx без ultralytics) | ncnn (каталог *_ncnn_model рядом с моделью) | ultralytics.
+# INFERENCE_ENGINE_CLIENT переопределяет общий INFERENCE_ENGINE для этого сервиса
+INFERENCE_ENGINE = (os.getenv('INFERENCE_ENGINE_CLIENT') or os.getenv('INFERENCE_ENGINE', 'onnxruntime')).lower()
+
+# Точность модели: fp32 | int8 - квантованный вариант <модель>_int8 (python -m common.quantize_model).
+# MODEL_PRECISION_CLIENT переопределяет общий MODEL_PRECISION для этого сервиса
+MODEL_PRECISION = (os.getenv('MODEL_PRECISION_CLIENT') or os.getenv('MODEL_PRECISION', 'fp32')).lower()
+
+# Сервер инференса: модель загружена один раз на все сервисы (inference_server)
+USE_INFERENCE_SERVER = os.getenv('USE_INFERENCE_SERVER', 'False').lower() == 'true'
+INFERENCE_SOCKET = os.getenv('INFERENCE_SOCKET', '/tmp/cyber_inference.sock')
 
 # Модель
 MODEL_PATH = os.getenv('MODEL_PATH')
@@ -97,6 +144,15 @@ if __name__ == "__main__":
     print("\nТекущие настройки:")
     print(f"ID_POINT: {ID_POINT}")
     print(f"RTSP_URL: {RTSP_URL[:50]}..." if RTSP_URL and len(RTSP_URL) > 50 else f"RTSP_URL: {RTSP_URL}")
+    print(f"USE_FRAME_BROKER: {USE_FRAME_BROKER}")
+    print(f"CAPTURE_MODE: {CAPTURE_MODE}")
+    print(f"FRAME_QUALITY_THRESHOLD: {FRAME_QUALITY_THRESHOLD}")
+    print(f"ROI_INFERENCE_MODE: {ROI_INFERENCE_MODE}")
+    print(f"MOTION_GATE: {MOTION_GATE_THRESHOLD} ({MOTION_GATE_METHOD}, MAX_INTERVAL: {MOTION_GATE_MAX_INTERVAL} сек)")
+    print(f"INFERENCE_ENGINE: {INFERENCE_ENGINE} (MODEL_PRECISION: {MODEL_PRECISION})")
+    print(f"USE_INFERENCE_SERVER: {USE_INFERENCE_SERVER} ({INFERENCE_SOCKET})")
+    print(f"RECONNECT: {RECONNECT_TIMEOUT}-{RECONNECT_MAX_DELAY} сек, OPEN_TIMEOUT: {OPEN_TIMEOUT} сек")
+    print(f"CAMERA_BACKEND: {CAMERA_BACKEND} (DECODE_MODE: {DECODE_MODE}, DECODE_EVERY: {DECODE_EVERY})")
     print(f"ROI кассира: {'Задан' if ROI1 else 'Не задан'}")
     print(f"ROI клиента: {'Задан' if ROI2 else 'Не задан'}")
     print(f"ROI_LIST len: {len(ROI_LIST) if ROI_LIST else 0}")
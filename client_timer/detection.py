@@ -1,74 +1,43 @@
 import cv2
+import threading
 import numpy as np
-from config import CONFIDENCE_THRESHOLD, ROI_LIST
-
-def create_roi_mask(frame_shape, roi_points_list):
-    """
-    Создает маску для областей интереса (ROI) на основе многоугольников
-    """
-    mask = np.zeros(frame_shape[:2], dtype=np.uint8)
-    if roi_points_list is not None:
-        for roi_points in roi_points_list:
-            if roi_points is not None:
-                # Преобразуем точки в формат, подходящий для cv2.fillPoly
-                pts = np.array(roi_points, dtype=np.int32)
-                cv2.fillPoly(mask, [pts], 255)
-    return mask
+from config import (CONFIDENCE_THRESHOLD, ROI_LIST, ROI_INFERENCE_MODE,
+                    MOTION_GATE_THRESHOLD, MOTION_GATE_METHOD, MOTION_GATE_MAX_INTERVAL)
+from common.motion_gate import MotionGate
+from common.roi_crop import prepare_roi_input
+from common.roi_geometry import get_roi_geometry, box_centers
+from common.postprocess import results_to_array, boxes_xyxy, bbox_tuple, to_detection_info, empty_detections
 
 def detect_person(frame, model, confidence_threshold=CONFIDENCE_THRESHOLD, roi_list=None):
     """
     Детекция человека на кадре с порогом уверенности и областями интереса (ROI)
     """
-    person_count = 0
-    max_confidence = 0.0
+    # Если заданы области интереса, модель получает только их (ROI_INFERENCE_MODE)
+    roi_frame, offset = prepare_roi_input(frame, roi_list, ROI_INFERENCE_MODE)
+    if roi_frame is None:
+        return False, 0.0, []
+    persons = results_to_array(model(roi_frame, verbose=False), offset, classes=[0], min_conf=confidence_threshold)
+    
+    # ROI центра каждого bounding box (нумерация с 1, при перекрытии - первая из ROI)
+    roi_indexes = [None] * len(persons)
+    if roi_list is not None and len(persons):
+        membership = get_roi_geometry(roi_list, frame.shape).roi_membership(box_centers(boxes_xyxy(persons)))
+        roi_indexes = [int(row.argmax()) + 1 if row.any() else None for row in membership]
+    
     detection_info = []
+    for det, roi_index in zip(persons, roi_indexes):
+        # В режиме crop в прямоугольник ROI попадают и люди вне ROI
+        if roi_list is not None and roi_index is None and ROI_INFERENCE_MODE == 'crop':
+            continue
+        # Сохраняем информацию о детекции для отрисовки
+        detection_info.append({
+            'bbox': bbox_tuple(det),
+            'confidence': float(det['conf']),
+            'roi_index': roi_index
+        })
     
-    # Если заданы области интереса, создаем объединенную маску
-    if roi_list is not None:
-        mask = create_roi_mask(frame.shape, roi_list)
-        # Применяем маску к кадру
-        masked_frame = cv2.bitwise_and(frame, frame, mask=mask)
-        results = model(masked_frame, verbose=False)
-    else:
-        results = model(frame, verbose=False)
-    
-    for result in results:
-        boxes = result.boxes
-        if boxes is not None:
-            for box in boxes:
-                cls = int(box.cls[0])
-                confidence = box.conf[0].item()
-                
-                if cls == 0 and confidence >= confidence_threshold:  # класс 'person' с порогом уверенности
-                    person_count += 1
-                    max_confidence = max(max_confidence, confidence)
-                    
-                    # Получаем координаты bounding box
-                    x1_box, y1_box, x2_box, y2_box = map(int, box.xyxy[0])
-                    
-                    # Определяем, в какой ROI находится обнаружение
-                    roi_index = None
-                    if roi_list is not None:
-                        for i, roi_points in enumerate(roi_list):
-                            if roi_points is not None:
-                                # Проверяем центр bounding box
-                                center_x = (x1_box + x2_box) // 2
-                                center_y = (y1_box + y2_box) // 2
-                                
-                                # Создаем контур ROI и проверяем точку
-                                roi_contour = np.array(roi_points, dtype=np.int32)
-                                if cv2.pointPolygonTest(roi_contour, (center_x, center_y), False) >= 0:
-                                    roi_index = i + 1  # Нумерация с 1 для удобства
-                                    break
-                    
-                    # Сохраняем информацию о детекции для отрисовки
-                    detection_info.append({
-                        'bbox': (x1_box, y1_box, x2_box, y2_box),
-                        'confidence': confidence,
-                        'roi_index': roi_index
-                    })
-    
-    return person_count > 0, max_confidence, detection_info
+    max_confidence = max((d['confidence'] for d in detection_info), default=0.0)
+    return bool(detection_info), max_confidence, detection_info
 
 def detect_person_in_specific_roi(frame, model, roi_index, confidence_threshold=CONFIDENCE_THRESHOLD, roi_list=None):
     """
@@ -77,42 +46,103 @@ def detect_person_in_specific_roi(frame, model, roi_index, confidence_threshold=
     if roi_list is None or roi_index >= len(roi_list) or roi_list[roi_index] is None:
         return False, 0.0, []
     
-    # Создаем маску только для указанной ROI
-    mask = np.zeros(frame.shape[:2], dtype=np.uint8)
+    # Модель получает только указанную ROI (ROI_INFERENCE_MODE)
     roi_points = roi_list[roi_index]
-    pts = np.array(roi_points, dtype=np.int32)
-    cv2.fillPoly(mask, [pts], 255)
+    roi_frame, offset = prepare_roi_input(frame, [roi_points], ROI_INFERENCE_MODE)
+    if roi_frame is None:
+        return False, 0.0, []
+    persons = results_to_array(model(roi_frame, verbose=False), offset, classes=[0], min_conf=confidence_threshold)
     
-    # Применяем маску к кадру
-    masked_frame = cv2.bitwise_and(frame, frame, mask=mask)
-    results = model(masked_frame, verbose=False)
+    # В режиме crop в прямоугольник ROI попадают и люди вне ROI
+    if ROI_INFERENCE_MODE == 'crop' and len(persons):
+        persons = persons[get_roi_geometry([roi_points], frame.shape).contains(box_centers(boxes_xyxy(persons)))]
     
-    person_detected = False
-    max_confidence = 0.0
-    detection_info = []
+    detection_info = to_detection_info(persons, roi_index=roi_index + 1)
+    max_confidence = float(persons['conf'].max()) if len(persons) else 0.0
+    return bool(detection_info), max_confidence, detection_info
+
+# Доля площади bounding box внутри ROI, при которой детекция относится к этой ROI
+ROI_OVERLAP = 0.3
+
+def detect_persons_in_rois(frame, model, roi_list, confidence_threshold=CONFIDENCE_THRESHOLD):
+    """
+    Детекция людей во всех ROI за один проход модели.
+    Модель получает объединение ROI (prepare_roi_input, ROI_INFERENCE_MODE), затем
+    каждый bounding box относится к тем ROI, в которые попадает его центр или
+    не меньше ROI_OVERLAP его площади (проверяются все боксы и ROI сразу).
+    Возвращает массив детекций DETECTION_DTYPE: поле rois - биты ROI (бит i - ROI i)
+    """
+    roi_frame, offset = prepare_roi_input(frame, roi_list, ROI_INFERENCE_MODE)
+    if roi_frame is None:
+        return empty_detections()
+    persons = results_to_array(model(roi_frame, verbose=False), offset, classes=[0], min_conf=confidence_threshold)
+    if not len(persons):
+        return persons
+    
+    geometry = get_roi_geometry(roi_list, frame.shape)
+    bboxes = boxes_xyxy(persons)
+    membership = geometry.roi_membership(box_centers(bboxes)) | (geometry.box_coverage(bboxes) >= ROI_OVERLAP)
+    persons['rois'] = (membership << np.arange(geometry.count, dtype=np.uint32)).sum(axis=1)
+    
+    return persons[persons['rois'] > 0]
+
+def select_roi_detections(detections, roi_index, confidence_threshold=CONFIDENCE_THRESHOLD):
+    """
+    Результат detect_persons_in_rois() для одной ROI в формате detect_person_in_specific_roi():
+    (человек найден, максимальная уверенность, детекции для отрисовки)
+    """
+    selected = detections[((detections['rois'] >> roi_index) & 1 > 0) & (detections['conf'] >= confidence_threshold)]
+    detection_info = to_detection_info(selected, roi_index=roi_index + 1)
+    max_confidence = float(selected['conf'].max()) if len(selected) else 0.0
+    return bool(detection_info), max_confidence, detection_info
+
+class SharedRoiDetector:
+    """
+    Общая детекция по ROI для сессий кассира и клиента: один проход модели на кадр
+    (detect_persons_in_rois), результат кэшируется по номеру кадра.
+    Если другая сессия уже обработала кадр, полученный не раньше чем за max_age секунд
+    до запрашиваемого, возвращается ее результат - модель не запускается повторно.
+    Если ни в одной ROI нет изменений с последнего запуска модели (MotionGate),
+    результат тоже переиспользуется - модель запускается не реже MOTION_GATE_MAX_INTERVAL.
+    Вызовы модели выполняются под блокировкой: модель YOLO общая для потоков сессий.
+    """
+    def __init__(self, model, roi_list, confidence_threshold=CONFIDENCE_THRESHOLD):
+        self.model = model
+        self.roi_list = roi_list
+        self.confidence_threshold = confidence_threshold
+        self.lock = threading.Lock()
+        self.frame_view = None  # Кадр последнего результата
+        self.detections = empty_detections()
+        self.motion_gate = MotionGate(MOTION_GATE_THRESHOLD, MOTION_GATE_MAX_INTERVAL, MOTION_GATE_METHOD)
+        self.passes = 0   # Запусков модели
+        self.reused = 0   # Результатов, отданных без запуска модели
+    
+    def detect(self, frame_view, max_age=0.0):
+        """
+        Детекции для кадра frame_view (FrameView).
+        Возвращает (кадр, по которому получен результат, детекции)
+        """
+        with self.lock:
+            cached = self.frame_view
+            if cached is not None and (cached.seq == frame_view.seq or
+                                       0 <= frame_view.timestamp - cached.timestamp <= max_age):
+                self.reused += 1
+                return cached, self.detections
+            if not self.motion_gate.check(frame_view.frame, frame_view.timestamp, self.roi_list):
+                # Сцена в ROI не изменилась - детекции прежнего кадра верны и для нового
+                self.reused += 1
+                return frame_view, self.detections
+            
+            self.detections = detect_persons_in_rois(frame_view.frame, self.model, self.roi_list,
+                                                     self.confidence_threshold)
+            self.frame_view = frame_view
+            self.passes += 1
+            return frame_view, self.detections
     
-    for result in results:
-        boxes = result.boxes
-        if boxes is not None:
-            for box in boxes:
-                cls = int(box.cls[0])
-                confidence = box.conf[0].item()
-                
-                if cls == 0 and confidence >= confidence_threshold:
-                    person_detected = True
-                    max_confidence = max(max_confidence, confidence)
-                    
-                    # Получаем координаты bounding box
-                    x1_box, y1_box, x2_box, y2_box = map(int, box.xyxy[0])
-                    
-                    # Сохраняем информацию о детекции
-                    detection_info.append({
-                        'bbox': (x1_box, y1_box, x2_box, y2_box),
-                        'confidence': confidence,
-                        'roi_index': roi_index + 1
-                    })
-    
-    return person_detected, max_confidence, detection_info
+    def get_stats(self, reset_gate=False):
+        with self.lock:
+            return {'passes': self.passes, 'reused': self.reused,
+                    'motion_gate': self.motion_gate.get_stats(reset=reset_gate)}
 
 def draw_detections(frame, detection_info, person_detected, roi_list=None, absence_minutes=0, timeout_remaining=0, is_absent=False):
     """
@@ -0,0 +1,6 @@
+"""
+Общие модули для сервисов CYBER CHIEF.
+Импортируются из каталогов сервисов через PYTHONPATH=/home/sm/cyber_chief
+(см. Systemd_srevice.txt). Модули пакета не читают config.py сервисов:
+все настройки передаются параметрами.
+"""
@@ -0,0 +1,226 @@
+"""
+Сравнение задержки движков детекции на одних и тех же кадрах.
+
+    cd /home/sm/cyber_chief
+    python -m common.benchmark_engines --model models/yolov8s.onnx --frames record.mp4 --count 100
+
+--frames - видеофайл или каталог с изображениями (.jpg/.png): для воспроизводимости
+все движки получают одни и те же записанные кадры. Кадры загружаются в память заранее:
+замеряется только вызов model(frame) вместе с пред- и постобработкой.
+
+Каждый движок запускается в отдельном процессе, чтобы его память не смешивалась
+с другими движками. Для каждого движка выводятся мс/кадр (среднее, p50, p95),
+RSS процесса (прирост после загрузки модели и прогона, пиковый) и совпадение
+детекций с первым движком (доля боксов с IoU >= 0.5).
+
+--clients N - N потоков одновременно отправляют кадры через MicroBatcher
+(как сервисы на сервер инференса): дополнительно выводятся пропускная способность
+(мс/кадр по общему времени) и гистограмма размеров пакетов.
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import cv2
+import numpy as np
+from common.inference_engine import INFERENCE_ENGINES, load_detector
+from common.micro_batch import MicroBatcher, format_histogram
+from common.postprocess import DETECTION_DTYPE, results_to_array, boxes_xyxy, box_iou
+
+
+def load_images(directory, count):
+    """
+    До count изображений каталога по порядку имён: список (имя файла, кадр).
+    Нечитаемые файлы пропускаются
+    """
+    images = []
+    for name in sorted(os.listdir(directory)):
+        if len(images) >= count:
+            break
+        if name.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp')):
+            frame = cv2.imread(os.path.join(directory, name))
+            if frame is not None:
+                images.append((name, frame))
+    return images
+
+
+def load_frames(source, count):
+    """До count кадров из видео/потока или каталога изображений"""
+    if os.path.isdir(source):
+        return [frame for _, frame in load_images(source, count)]
+    frames = []
+    cap = cv2.VideoCapture(source)
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def rss_mb():
+    """Текущий RSS процесса, МБ (/proc/self/statm)"""
+    with open('/proc/self/statm') as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+
+def peak_rss_mb():
+    """Пиковый RSS процесса, МБ (ru_maxrss в Linux - КБ)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_engine(model, frames, warmup, conf, classes):
+    """Задержки (мс) и детекции движка по всем кадрам"""
+    for frame in frames[:warmup]:
+        model(frame, conf=conf, classes=classes, verbose=False)
+    latencies = []
+    detections = []
+    for frame in frames:
+        start = time.perf_counter()
+        results = model(frame, conf=conf, classes=classes, verbose=False)
+        dets = results_to_array(results)
+        latencies.append((time.perf_counter() - start) * 1000)
+        detections.append(dets)
+    return np.array(latencies), detections
+
+
+def run_concurrent(model, frames, warmup, conf, classes, clients, max_wait):
+    """
+    Задержки (мс) и детекции при clients одновременных потоках через MicroBatcher,
+    общее время прогона (сек) и гистограмма размеров пакетов
+    """
+    batcher = MicroBatcher(model, clients, max_wait)
+    for frame in frames[:warmup]:
+        batcher(frame, conf=conf, classes=classes)
+    batcher.get_stats(reset=True)
+    latencies = [0.0] * len(frames)
+    detections = [None] * len(frames)
+
+    def client(indexes):
+        for i in indexes:
+            start = time.perf_counter()
+            detections[i] = results_to_array(batcher(frames[i], conf=conf, classes=classes))
+            latencies[i] = (time.perf_counter() - start) * 1000
+
+    threads = [threading.Thread(target=client, args=(range(k, len(frames), clients),)) for k in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return np.array(latencies), detections, time.perf_counter() - start, batcher.get_stats()['histogram']
+
+
+def match_rate(reference, detections, iou_threshold=0.5):
+    """Доля боксов reference, для которых в detections есть бокс того же класса с IoU >= iou_threshold"""
+    matched = total = 0
+    for ref, dets in zip(reference, detections):
+        total += len(ref)
+        if not len(ref) or not len(dets):
+            continue
+        iou = box_iou(boxes_xyxy(ref), boxes_xyxy(dets))
+        iou[ref['cls'][:, None] != dets['cls'][None, :]] = 0
+        matched += int((iou.max(axis=1) >= iou_threshold).sum())
+    return matched / total if total else 1.0
+
+
+def benchmark_worker(args, classes):
+    """
+    Замер одного движка в текущем процессе. Результат - в npz args.output:
+    задержки, детекции всех кадров подряд с числом боксов на кадр и RSS
+    """
+    frames = load_frames(args.frames, args.count)
+    rss_frames = rss_mb()
+    start = time.perf_counter()
+    model = load_detector(args.model, args.worker, max_batch=args.clients)
+    load_time = time.perf_counter() - start
+    rss_model = rss_mb()
+    if args.clients > 1:
+        latencies, detections, wall, histogram = run_concurrent(model, frames, args.warmup, args.conf, classes,
+                                                                args.clients, args.max_wait / 1000)
+    else:
+        latencies, detections = run_engine(model, frames, args.warmup, args.conf, classes)
+        wall, histogram = latencies.sum() / 1000, {}
+    np.savez(args.output, latencies=latencies, wall=wall, histogram=np.array(list(histogram.items()), dtype=np.int64),
+             detections=np.concatenate(detections) if detections else np.empty(0, dtype=DETECTION_DTYPE),
+             counts=np.array([len(d) for d in detections]),
+             stats=np.array([load_time, rss_model - rss_frames, rss_mb() - rss_frames, peak_rss_mb()]))
+
+
+def run_isolated(args, engine):
+    """Запуск замера движка в дочернем процессе с теми же аргументами. None - движок не загружен"""
+    fd, output = tempfile.mkstemp(suffix='.npz')
+    os.close(fd)
+    command = [sys.executable, '-m', 'common.benchmark_engines', '--model', args.model,
+               '--frames', args.frames, '--count', str(args.count), '--warmup', str(args.warmup),
+               '--conf', str(args.conf), '--clients', str(args.clients), '--max-wait', str(args.max_wait),
+               '--worker', engine, '--output', output]
+    if args.classes:
+        command += ['--classes', args.classes]
+    try:
+        process = subprocess.run(command, capture_output=True, text=True)
+        if process.returncode != 0:
+            error = process.stderr.strip().splitlines()
+            print(f"{engine:12s} не загружен: {error[-1] if error else process.returncode}")
+            return None
+        with np.load(output) as data:
+            detections = np.split(data['detections'], np.cumsum(data['counts'])[:-1])
+            histogram = {int(size): int(count) for size, count in data['histogram'].reshape(-1, 2)}
+            return data['latencies'], detections, data['stats'], float(data['wall']), histogram
+    finally:
+        os.remove(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сравнение движков детекции')
+    parser.add_argument('--model', required=True, help='Путь к модели (.onnx; для ncnn - рядом каталог *_ncnn_model)')
+    parser.add_argument('--frames', required=True, help='Видео или каталог изображений')
+    parser.add_argument('--count', type=int, default=100, help='Число кадров')
+    parser.add_argument('--warmup', type=int, default=5, help='Прогревочных вызовов (не учитываются)')
+    parser.add_argument('--engines', default=','.join(INFERENCE_ENGINES), help='Движки через запятую')
+    parser.add_argument('--conf', type=float, default=0.25, help='Порог уверенности')
+    parser.add_argument('--classes', default=None, help='Классы через запятую (по умолчанию все)')
+    parser.add_argument('--clients', type=int, default=1, help='Одновременных клиентов (MicroBatcher)')
+    parser.add_argument('--max-wait', type=float, default=5.0, help='Ожидание запросов пакета, мс (при --clients > 1)')
+    parser.add_argument('--worker', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--output', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    classes = [int(c) for c in args.classes.split(',')] if args.classes else None
+
+    if args.worker:
+        benchmark_worker(args, classes)
+        return
+
+    frames = load_frames(args.frames, args.count)
+    if not frames:
+        print(f"Не удалось загрузить кадры из {args.frames}")
+        return
+    print(f"Кадров: {len(frames)}, размер: {frames[0].shape[1]}x{frames[0].shape[0]}")
+    del frames
+
+    reference = None
+    for engine in args.engines.split(','):
+        result = run_isolated(args, engine)
+        if result is None:
+            continue
+        latencies, detections, (load_time, rss_model, rss_total, rss_peak), wall, histogram = result
+        if reference is None:
+            reference = detections
+        boxes = sum(len(d) for d in detections) / len(detections)
+        print(f"{engine:12s} загрузка {load_time:6.2f} с | мс/кадр: среднее {latencies.mean():7.1f}, "
+              f"p50 {np.percentile(latencies, 50):7.1f}, p95 {np.percentile(latencies, 95):7.1f} | "
+              f"RSS модель {rss_model:6.1f} МБ, после прогона {rss_total:6.1f} МБ, пик {rss_peak:6.1f} МБ | "
+              f"боксов/кадр {boxes:5.1f} | совпадение {match_rate(reference, detections):.1%}")
+        if args.clients > 1:
+            print(f"{'':12s} клиентов {args.clients}: пропускная способность {wall / len(latencies) * 1000:7.1f} мс/кадр | "
+                  f"пакеты: {format_histogram(histogram)}")
+
+
+if __name__ == '__main__':
+    main()
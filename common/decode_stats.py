@@ -0,0 +1,129 @@
+import re
+import time
+import logging
+import threading
+import weakref
+from collections import deque
+
+try:
+    import av
+    import av.logging
+except ImportError:
+    av = None
+
+
+class DecodeStats:
+    """
+    Счетчики качества декодирования одного видеопотока.
+
+    Источники - сам декодер (PyAVCapture), а не текст сообщений об ошибках:
+    corrupt_frames - кадры с флагом повреждения (frame.is_corrupt, маскировка ошибок h264),
+    corrupt_packets - пакеты с флагом повреждения от демультиплексора (packet.is_corrupt),
+    decode_errors - пакеты, которые декодер отверг (InvalidDataError),
+    lost_packets / loss_events - потерянные RTP пакеты и число таких событий (журнал FFmpeg),
+    decoder_log_errors - сообщения декодера уровня ERROR (журнал FFmpeg),
+    read_failures - неудачные чтения кадра (единственный сигнал для бэкенда OpenCV:
+    его FFmpeg пишет ошибки декодирования только в stderr).
+
+    recent_errors() - число событий повреждения за последние window секунд
+    (corrupt_frames + corrupt_packets + decode_errors + loss_events), по нему
+    принимается решение о переподключении.
+    """
+    FIELDS = ('frames', 'corrupt_frames', 'corrupt_packets', 'decode_errors',
+              'lost_packets', 'loss_events', 'decoder_log_errors', 'read_failures')
+    ERROR_FIELDS = ('corrupt_frames', 'corrupt_packets', 'decode_errors', 'loss_events')
+
+    def __init__(self, window=180):
+        self.window = window
+        self.totals = dict.fromkeys(self.FIELDS, 0)
+        self.events = deque()  # (время, количество) событий из ERROR_FIELDS
+        self.last_error = 0
+        self.lock = threading.Lock()
+
+    def add(self, field, count=1, now=None):
+        """Учет count событий типа field"""
+        with self.lock:
+            self.totals[field] += count
+            if field in self.ERROR_FIELDS:
+                now = now or time.time()
+                self.events.append((now, 1 if field == 'loss_events' else count))
+                self.last_error = now
+
+    def _trim(self, now):
+        cutoff = now - self.window
+        while self.events and self.events[0][0] <= cutoff:
+            self.events.popleft()
+
+    def recent_errors(self, now=None):
+        """Событий повреждения за последние window секунд"""
+        with self.lock:
+            self._trim(now or time.time())
+            return sum(count for _, count in self.events)
+
+    def clear_recent(self):
+        """Сброс окна после принятия решения о переподключении (итоговые счетчики сохраняются)"""
+        with self.lock:
+            self.events.clear()
+
+    def get_stats(self, now=None):
+        with self.lock:
+            self._trim(now or time.time())
+            stats = dict(self.totals)
+            stats['recent_errors'] = sum(count for _, count in self.events)
+            stats['total_errors'] = sum(self.totals[field] for field in self.ERROR_FIELDS)
+            stats['last_error'] = self.last_error
+            return stats
+
+
+# Источники журнала FFmpeg, относящиеся к сети/транспорту (остальные - декодеры и демультиплексоры)
+NETWORK_SOURCES = ('rtsp', 'rtp', 'udp', 'tcp', 'http')
+RTP_MISSED_PACKETS = re.compile(r'missed (\d+) packets')
+
+
+class FFmpegLogCounter(logging.Handler):
+    """
+    Обработчик журнала FFmpeg (PyAV передает его в logging под именами libav.<источник>).
+    Сообщения не печатаются, а учитываются в DecodeStats зарегистрированных потоков.
+    Журнал FFmpeg общий для процесса и не указывает поток-источник: при нескольких
+    потоках PyAV в одном процессе событие журнала учитывается во всех.
+    Счетчики по флагам кадров и пакетов от этого не зависят.
+    """
+    def __init__(self):
+        super().__init__(level=logging.WARNING)
+        self.sinks = weakref.WeakSet()
+
+    def emit(self, record):
+        source = record.name.rpartition('.')[2]
+        if source in NETWORK_SOURCES:
+            missed = RTP_MISSED_PACKETS.search(record.getMessage())
+            if missed is None:
+                return
+            for stats in list(self.sinks):
+                stats.add('lost_packets', int(missed.group(1)))
+                stats.add('loss_events')
+        elif record.levelno >= logging.ERROR:
+            for stats in list(self.sinks):
+                stats.add('decoder_log_errors')
+
+
+_log_counter = None
+_log_counter_lock = threading.Lock()
+
+
+def attach_ffmpeg_log(stats):
+    """
+    Подключает DecodeStats к журналу FFmpeg (PyAV). При первом вызове включает журнал
+    FFmpeg уровня WARNING без пропуска повторов и без вывода в stderr
+    """
+    global _log_counter
+    if av is None:
+        return
+    with _log_counter_lock:
+        if _log_counter is None:
+            _log_counter = FFmpegLogCounter()
+            logger = logging.getLogger('libav')
+            logger.addHandler(_log_counter)
+            logger.propagate = False
+            av.logging.set_skip_repeated(False)
+            av.logging.set_level(av.logging.WARNING)
+        _log_counter.sinks.add(stats)
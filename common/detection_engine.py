@@ -0,0 +1,209 @@
+import threading
+import cv2
+import numpy as np
+
+LETTERBOX_COLOR = 114  # Цвет полей letterbox, как при обучении/экспорте ultralytics
+
+
+def nms(boxes, scores, iou_threshold=0.7, max_det=300):
+    """
+    Non-maximum suppression на NumPy: индексы оставленных боксов (N, 4: x1, y1, x2, y2)
+    по убыванию уверенности. IoU очередного бокса считается сразу со всеми оставшимися
+    """
+    order = scores.argsort()[::-1]
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    keep = []
+    while order.size and len(keep) < max_det:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = np.clip(np.minimum(boxes[i, 2], boxes[rest, 2]) - np.maximum(boxes[i, 0], boxes[rest, 0]), 0, None)
+        h = np.clip(np.minimum(boxes[i, 3], boxes[rest, 3]) - np.maximum(boxes[i, 1], boxes[rest, 1]), 0, None)
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+class EngineBoxes:
+    """Боксы результата движка: те же поля, что у ultralytics Boxes (xyxy, conf, cls, id), в NumPy"""
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+        self.id = None
+
+    def __len__(self):
+        return len(self.conf)
+
+
+class EngineResult:
+    """Результат движка для одного изображения - совместим с results_to_array()"""
+    def __init__(self, boxes, orig_shape, names):
+        self.boxes = boxes
+        self.orig_shape = orig_shape
+        self.names = names
+
+
+class DetectionEngine:
+    """
+    Основа движков детекции YOLO (экспорт ultralytics) без ultralytics.
+
+    Вызывается так же, как YOLO: model(frame, conf=..., classes=..., verbose=False)
+    и model.predict(...) возвращают список с одним результатом, у которого
+    result.boxes.xyxy / conf / cls - массивы NumPy в координатах исходного кадра.
+
+    Размер входа фиксирован: letterbox пишет кадр в предвыделенные canvas и буфер
+    входа self.input (1, 3, H, W), наследник реализует только forward() - запуск
+    сети на self.input с выходом YOLOv8/YOLOv5u (4 + классы, N).
+    detect_batch() обрабатывает несколько кадров: self.inputs (max_batch, 3, H, W),
+    self.input - его первый элемент. Если наследник поддерживает пакетный проход
+    (supports_batch), forward_batch() запускает сеть один раз на весь пакет.
+    Вызовы сериализуются блокировкой - буферы общие. Трекинг не поддерживается.
+    """
+    supports_batch = False
+
+    def __init__(self, imgsz, names=None, conf=0.25, iou=0.7, max_det=300, max_batch=1):
+        self.imgsz = imgsz
+        self.names = names or {}
+        self.conf = conf
+        self.iou = iou
+        self.max_det = max_det
+        self.max_batch = max(1, max_batch)
+        self.lock = threading.Lock()
+
+        height, width = imgsz
+        self.canvas = np.full((height, width, 3), LETTERBOX_COLOR, dtype=np.uint8)
+        self.canvas_rect = None  # Область canvas, занятая кадром на предыдущем вызове
+        self.inputs = np.zeros((self.max_batch, 3, height, width), dtype=np.float32)
+        self.input = self.inputs[:1]
+
+    def forward(self):
+        """Запуск сети на self.input, возвращает выход (..., 4 + классы, N)"""
+        raise NotImplementedError
+
+    def forward_batch(self, count):
+        """
+        Выходы сети для первых count входов self.inputs (по выходу на кадр).
+        По умолчанию - по одному кадру через forward()
+        """
+        outputs = []
+        for index in range(count):
+            if index:
+                self.input[0] = self.inputs[index]
+            outputs.append(self.forward().copy())
+        return outputs
+
+    def letterbox(self, frame, index=0):
+        """
+        Кадр BGR -> вход модели (3, H, W) RGB 0..1 в self.inputs[index]: уменьшение с сохранением
+        пропорций в центр canvas с полями LETTERBOX_COLOR. Возвращает (масштаб, (dx, dy))
+        """
+        height, width = self.imgsz
+        gain = min(height / frame.shape[0], width / frame.shape[1])
+        new_w, new_h = int(round(frame.shape[1] * gain)), int(round(frame.shape[0] * gain))
+        dx, dy = (width - new_w) // 2, (height - new_h) // 2
+        rect = (dx, dy, new_w, new_h)
+        if rect != self.canvas_rect:
+            # Поля перезаливаются только при смене размера кадра
+            self.canvas.fill(LETTERBOX_COLOR)
+            self.canvas_rect = rect
+        target = self.canvas[dy:dy + new_h, dx:dx + new_w]
+        if (new_w, new_h) == (frame.shape[1], frame.shape[0]):
+            target[:] = frame
+        else:
+            cv2.resize(frame, (new_w, new_h), dst=target, interpolation=cv2.INTER_LINEAR)
+        # HWC BGR uint8 -> CHW RGB float32 прямо в буфер входа
+        np.multiply(self.canvas[..., ::-1].transpose(2, 0, 1), 1 / 255.0, out=self.inputs[index], casting='unsafe')
+        return gain, (dx, dy)
+
+    def postprocess(self, output, gain, pad, orig_shape, conf, iou, classes):
+        """Выход YOLOv8/YOLOv5u (4 + классы, N) -> боксы в координатах кадра после NMS"""
+        pred = output.reshape(output.shape[-2:])
+        if pred.shape[0] > pred.shape[1]:
+            pred = pred.T  # (N, 4 + классы) -> (4 + классы, N)
+        scores = pred[4:]
+        cls = scores.argmax(axis=0)
+        conf_values = scores[cls, np.arange(scores.shape[1])]
+        keep = conf_values >= conf
+        if classes is not None:
+            keep &= np.isin(cls, classes)
+        cx, cy, w, h = pred[:4, keep]
+        cls, conf_values = cls[keep], conf_values[keep]
+
+        xyxy = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+        # NMS по классам: боксы разных классов разносятся смещением и не подавляют друг друга
+        offsets = cls[:, None] * 7680.0
+        index = nms(xyxy + offsets, conf_values, iou, self.max_det)
+        xyxy, conf_values, cls = xyxy[index], conf_values[index], cls[index]
+
+        xyxy -= (pad[0], pad[1], pad[0], pad[1])
+        xyxy /= gain
+        xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, orig_shape[1])
+        xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, orig_shape[0])
+        return EngineBoxes(xyxy.astype(np.float32), conf_values.astype(np.float32), cls.astype(np.float32))
+
+    def __call__(self, source, conf=None, iou=None, classes=None, verbose=False, **kwargs):
+        """Детекция на кадре BGR (np.ndarray). Список из одного EngineResult, как у YOLO"""
+        conf = self.conf if conf is None else conf
+        iou = self.iou if iou is None else iou
+        with self.lock:
+            gain, pad = self.letterbox(source)
+            boxes = self.postprocess(self.forward(), gain, pad, source.shape, conf, iou, classes)
+        return [EngineResult(boxes, source.shape[:2], self.names)]
+
+    def detect_batch(self, frames, options=None):
+        """
+        Детекция на нескольких кадрах: пакетами по max_batch за один проход сети.
+        options - параметры вызова (conf, iou, classes) для каждого кадра.
+        Возвращает по EngineResult на кадр
+        """
+        options = options or [{}] * len(frames)
+        results = []
+        with self.lock:
+            for start in range(0, len(frames), self.max_batch):
+                chunk = frames[start:start + self.max_batch]
+                placements = [self.letterbox(frame, index) for index, frame in enumerate(chunk)]
+                outputs = self.forward_batch(len(chunk))
+                for frame, (gain, pad), output, opts in zip(chunk, placements, outputs, options[start:]):
+                    conf = opts.get('conf', self.conf)
+                    iou = opts.get('iou', self.iou)
+                    boxes = self.postprocess(output, gain, pad, frame.shape, conf, iou, opts.get('classes'))
+                    results.append(EngineResult(boxes, frame.shape[:2], self.names))
+        return results
+
+    def predict(self, source, **kwargs):
+        return self(source, **kwargs)
+
+    def track(self, *args, **kwargs):
+        raise NotImplementedError(f"{type(self).__name__} не поддерживает трекинг - используйте ultralytics")
+
+
+def input_size(imgsz, shape=None):
+    """
+    (высота, ширина) входа: фиксированные оси формы входа модели (N, C, H, W),
+    для динамических - imgsz из метаданных экспорта (по умолчанию 640)
+    """
+    if isinstance(imgsz, int):
+        imgsz = (imgsz, imgsz)
+    imgsz = tuple(imgsz) if imgsz else (640, 640)
+    if shape is None:
+        return imgsz
+    height = shape[2] if isinstance(shape[2], int) else imgsz[0]
+    width = shape[3] if isinstance(shape[3], int) else imgsz[1]
+    return height, width
+
+
+def detect_frames(model, frames, **options):
+    """
+    Детекция на нескольких кадрах любой моделью сервиса, по результату на кадр.
+    Движки детекции обрабатывают кадры пакетами (detect_batch), YOLO ultralytics -
+    списком за один вызов, остальные (клиент сервера инференса) - по одному кадру
+    """
+    if not frames:
+        return []
+    if hasattr(model, 'detect_batch'):
+        return model.detect_batch(frames, [options] * len(frames))
+    if type(model).__module__.startswith('ultralytics'):
+        return model.predict(list(frames), verbose=False, **options)
+    return [model(frame, verbose=False, **options)[0] for frame in frames]
@@ -0,0 +1,176 @@
+"""
+Классификатор присутствия человека в ROI (common.presence_classifier), обученный
+на ответах детектора по своим записанным кадрам, и его сравнение с детектором.
+
+    cd /home/sm/cyber_chief
+    # 1. Набор данных: вырезки ROI, размеченные детектором
+    python -m common.distill_presence collect --model models/yolov8s.onnx --frames record.mp4 \
+        --roi "[[100, 200], [600, 200], [600, 700], [100, 700]]" --output presence_data --count 5000
+    # 2. Обучение YOLO-cls (ultralytics) и экспорт в ONNX
+    python -m common.distill_presence train --data presence_data --imgsz 160 --output models/presence_cassir.onnx
+    # 3. Задержка и точность против детектора на других записях
+    python -m common.distill_presence compare --model models/yolov8s.onnx --classifier models/presence_cassir.onnx \
+        --frames record_test.mp4 --roi "[[100, 200], [600, 200], [600, 700], [100, 700]]"
+
+collect: кадр относится к present, если детектор находит в ROI человека с уверенностью
+не ниже --present-conf, к absent - если максимум ниже --absent-conf; промежуточные
+кадры не используются. Последняя доля --val-fraction записи идет в val (соседние кадры
+почти одинаковы - случайное разбиение завысило бы точность).
+compare: эталон - ответ детектора с порогом --conf (как в casir_timer). Выводятся
+мс/кадр и точность детектора, классификатора (порог 0.5) и каскада: классификатор,
+при вероятности между --low и --high - детектор (PRESENCE_LOW/HIGH_CASSIR).
+"""
+import argparse
+import ast
+import os
+import shutil
+import time
+import cv2
+import numpy as np
+from common.benchmark_engines import load_frames
+from common.inference_engine import load_detector
+from common.postprocess import results_to_array
+from common.presence_classifier import PRESENCE_CLASSES, PresenceClassifier, presence_input
+
+
+def detector_confidence(model, image, conf=0.1):
+    """Наибольшая уверенность детекции человека (класс 0) на вырезке ROI, 0 - людей нет"""
+    persons = results_to_array(model(image, verbose=False, conf=conf), classes=[0], min_conf=conf)
+    return float(persons['conf'].max()) if len(persons) else 0.0
+
+
+def collect(args, roi):
+    """Вырезки ROI в <output>/{train,val}/{absent,present}/ по ответам детектора"""
+    model = load_detector(args.model, args.engine)
+    frames = load_frames(args.frames, args.count)
+    split = int(len(frames) * (1 - args.val_fraction))
+    counts = {}
+    for index, frame in enumerate(frames):
+        image = presence_input(frame, roi)
+        if image is None:
+            continue
+        confidence = detector_confidence(model, image, min(args.absent_conf, args.present_conf))
+        if confidence >= args.present_conf:
+            label = 'present'
+        elif confidence < args.absent_conf:
+            label = 'absent'
+        else:
+            continue
+        subset = 'train' if index < split else 'val'
+        directory = os.path.join(args.output, subset, label)
+        os.makedirs(directory, exist_ok=True)
+        cv2.imwrite(os.path.join(directory, f"{args.prefix}{index:06d}.jpg"), image)
+        counts[subset, label] = counts.get((subset, label), 0) + 1
+    print(f"Кадров: {len(frames)}, в наборе {args.output}:")
+    for subset in ('train', 'val'):
+        print(f"  {subset}: " + ', '.join(f"{label} {counts.get((subset, label), 0)}" for label in PRESENCE_CLASSES))
+
+
+def train(args):
+    """Обучение YOLO-cls на наборе collect и экспорт в ONNX (нужен ultralytics)"""
+    from ultralytics import YOLO
+    model = YOLO(args.base)
+    model.train(data=os.path.abspath(args.data), imgsz=args.imgsz, epochs=args.epochs, batch=args.batch,
+                project=args.project, name='presence', exist_ok=True)
+    exported = model.export(format='onnx', imgsz=args.imgsz)
+    shutil.copy(exported, args.output)
+    print(f"Классификатор присутствия: {args.output}")
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def compare(args, roi):
+    """Задержка и точность детектора, классификатора и каскада относительно детектора"""
+    model = load_detector(args.model, args.engine)
+    classifier = PresenceClassifier(args.classifier)
+    frames = load_frames(args.frames, args.count)
+    images = [image for image in (presence_input(frame, roi) for frame in frames) if image is not None]
+    for image in images[:args.warmup]:
+        detector_confidence(model, image, args.conf)
+        classifier(image)
+
+    reference, detector_ms, probability, classifier_ms = [], [], [], []
+    for image in images:
+        confidence, ms = timed(detector_confidence, model, image, args.conf)
+        reference.append(confidence >= args.conf)
+        detector_ms.append(ms)
+        value, ms = timed(classifier, image)
+        probability.append(value)
+        classifier_ms.append(ms)
+    reference, probability = np.array(reference), np.array(probability)
+    detector_ms, classifier_ms = np.array(detector_ms), np.array(classifier_ms)
+
+    # Каскад: уверенный ответ классификатора, иначе детектор
+    ambiguous = (probability > args.low) & (probability < args.high)
+    cascade = np.where(ambiguous, reference, probability >= args.high)
+    cascade_ms = classifier_ms + np.where(ambiguous, detector_ms, 0)
+
+    print(f"\n{len(images)} кадров, присутствие по детектору: {reference.mean():.0%}")
+    rows = (
+        ('детектор', detector_ms, reference),
+        ('классификатор', classifier_ms, probability >= 0.5),
+        (f'каскад {args.low}-{args.high}', cascade_ms, cascade),
+    )
+    for name, ms, answer in rows:
+        accuracy = (answer == reference).mean()
+        missed = (reference & ~answer).sum()       # Человек есть - ответ "нет" (ложное отсутствие)
+        false = (~reference & answer).sum()        # Человека нет - ответ "есть"
+        print(f"  {name:<20} мс/кадр {ms.mean():6.1f} (p95 {np.percentile(ms, 95):6.1f}) | точность {accuracy:.3f} "
+              f"| пропуски {missed} | ложные {false}")
+    print(f"  Детектор в каскаде: {ambiguous.mean():.0%} кадров, ускорение x{detector_ms.mean() / cascade_ms.mean():.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Классификатор присутствия в ROI по ответам детектора')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    collect_parser = commands.add_parser('collect', help='Набор данных: вырезки ROI, размеченные детектором')
+    collect_parser.add_argument('--model', required=True, help='Детектор людей')
+    collect_parser.add_argument('--frames', required=True, help='Видео или каталог изображений')
+    collect_parser.add_argument('--roi', default=None, help='ROI: "[[x, y], ...]" (по умолчанию весь кадр)')
+    collect_parser.add_argument('--output', required=True, help='Каталог набора данных')
+    collect_parser.add_argument('--count', type=int, default=5000, help='Число кадров')
+    collect_parser.add_argument('--present-conf', type=float, default=0.6, help='Мин. уверенность детектора для present')
+    collect_parser.add_argument('--absent-conf', type=float, default=0.2, help='Уверенность детектора ниже - absent')
+    collect_parser.add_argument('--val-fraction', type=float, default=0.2, help='Доля конца записи для val')
+    collect_parser.add_argument('--prefix', default='', help='Префикс имен файлов (несколько записей в один набор)')
+    collect_parser.add_argument('--engine', default='onnxruntime', help='Движок детекции')
+
+    train_parser = commands.add_parser('train', help='Обучение YOLO-cls и экспорт в ONNX')
+    train_parser.add_argument('--data', required=True, help='Каталог набора данных (collect)')
+    train_parser.add_argument('--output', required=True, help='Путь классификатора (.onnx)')
+    train_parser.add_argument('--base', default='yolov8n-cls.pt', help='Исходная модель ultralytics')
+    train_parser.add_argument('--imgsz', type=int, default=160, help='Размер входа (128-224)')
+    train_parser.add_argument('--epochs', type=int, default=30, help='Эпох обучения')
+    train_parser.add_argument('--batch', type=int, default=64, help='Размер пакета')
+    train_parser.add_argument('--project', default='runs/presence', help='Каталог результатов обучения')
+
+    compare_parser = commands.add_parser('compare', help='Задержка и точность против детектора')
+    compare_parser.add_argument('--model', required=True, help='Детектор людей')
+    compare_parser.add_argument('--classifier', required=True, help='Классификатор присутствия (.onnx)')
+    compare_parser.add_argument('--frames', required=True, help='Видео или каталог изображений (не из обучения)')
+    compare_parser.add_argument('--roi', default=None, help='ROI: "[[x, y], ...]" (по умолчанию весь кадр)')
+    compare_parser.add_argument('--count', type=int, default=1000, help='Число кадров')
+    compare_parser.add_argument('--warmup', type=int, default=5, help='Прогревочных вызовов (не учитываются)')
+    compare_parser.add_argument('--conf', type=float, default=0.5, help='Порог детектора (CONFIDENCE_THRESHOLD)')
+    compare_parser.add_argument('--low', type=float, default=0.1, help='Вероятность не выше - "нет" без детектора')
+    compare_parser.add_argument('--high', type=float, default=0.9, help='Вероятность не ниже - "есть" без детектора')
+    compare_parser.add_argument('--engine', default='onnxruntime', help='Движок детекции')
+    args = parser.parse_args()
+
+    if args.command == 'train':
+        train(args)
+        return
+    roi = ast.literal_eval(args.roi) if args.roi else None
+    if args.command == 'collect':
+        collect(args, roi)
+    else:
+        compare(args, roi)
+
+
+if __name__ == '__main__':
+    main()
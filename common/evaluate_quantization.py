@@ -0,0 +1,164 @@
+"""
+Оценка INT8 моделей (common.quantize_model) против исходных FP32.
+
+    cd /home/sm/cyber_chief
+    python -m common.evaluate_quantization --model models/yolov8s.onnx,models/long_roll_model.onnx \
+        --frames eval/images --labels eval/labels
+
+Для каждой модели сравниваются <модель>.onnx и <модель>_int8.onnx (или модель из списка
+--quantized в том же порядке, что и --model) на одних и тех же кадрах:
+mAP50, mAP50-95, recall при пороге --conf и мс/кадр, затем падение точности и ускорение.
+--labels - разметка YOLO (<имя кадра>.txt: класс cx cy w h в долях кадра) к каталогу
+изображений --frames, сопоставляется с кадрами по имени файла. Без разметки эталоном служат детекции FP32 модели с уверенностью
+не ниже --conf: тогда показатели INT8 - согласие с FP32, а не точность относительно людей.
+Кадры для оценки не должны совпадать с калибровочными.
+"""
+import argparse
+import os
+import numpy as np
+from common.benchmark_engines import load_frames, load_images, run_engine
+from common.inference_engine import load_detector, quantized_model_path
+from common.postprocess import DETECTION_DTYPE, boxes_xyxy, box_iou
+
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+def load_labels(labels_dir, names, frames):
+    """Разметка YOLO для кадров (names - имена их файлов) в виде массивов DETECTION_DTYPE"""
+    labels = []
+    for name, frame in zip(names, frames):
+        path = os.path.join(labels_dir, os.path.splitext(name)[0] + '.txt')
+        rows = np.loadtxt(path, ndmin=2) if os.path.exists(path) else np.empty((0, 5))
+        height, width = frame.shape[:2]
+        gt = np.zeros(len(rows), dtype=DETECTION_DTYPE)
+        if len(rows):
+            cls, cx, cy, w, h = rows[:, :5].T
+            gt['x1'], gt['x2'] = (cx - w / 2) * width, (cx + w / 2) * width
+            gt['y1'], gt['y2'] = (cy - h / 2) * height, (cy + h / 2) * height
+            gt['cls'] = cls
+        gt['conf'] = 1.0
+        gt['track_id'] = -1
+        labels.append(gt)
+    return labels
+
+
+def match_predictions(gt, dets):
+    """
+    Истинные срабатывания (len(dets), len(IOU_THRESHOLDS)): для каждого порога IoU
+    пара эталон-детекция одного класса сопоставляется жадно по убыванию IoU, один к одному
+    """
+    tp = np.zeros((len(dets), len(IOU_THRESHOLDS)), dtype=bool)
+    if not len(gt) or not len(dets):
+        return tp
+    iou = box_iou(boxes_xyxy(gt), boxes_xyxy(dets))
+    iou[gt['cls'][:, None] != dets['cls'][None, :]] = 0
+    for i, threshold in enumerate(IOU_THRESHOLDS):
+        matches = np.argwhere(iou >= threshold)
+        if not len(matches):
+            continue
+        matches = matches[iou[matches[:, 0], matches[:, 1]].argsort()[::-1]]
+        matches = matches[np.unique(matches[:, 1], return_index=True)[1]]
+        matches = matches[np.unique(matches[:, 0], return_index=True)[1]]
+        tp[matches[:, 1], i] = True
+    return tp
+
+
+def average_precision(recall, precision):
+    """AP по 101 точке интерполированной кривой precision/recall (как в COCO)"""
+    recall = np.concatenate(([0.0], recall, [1.0]))
+    precision = np.concatenate(([1.0], precision, [0.0]))
+    precision = np.flip(np.maximum.accumulate(np.flip(precision)))
+    points = np.linspace(0, 1, 101)
+    return np.interp(points, recall, precision).mean()
+
+
+def evaluate(labels, detections, conf):
+    """mAP50, mAP50-95 и recall (IoU 0.5, уверенность >= conf) детекций относительно эталона"""
+    tp = np.concatenate([match_predictions(gt, dets) for gt, dets in zip(labels, detections)])
+    dets = np.concatenate(detections) if detections else np.empty(0, dtype=DETECTION_DTYPE)
+    gt_cls = np.concatenate([gt['cls'] for gt in labels]) if labels else np.empty(0)
+    if not len(gt_cls):
+        return 0.0, 0.0, 0.0
+
+    order = dets['conf'].argsort()[::-1]
+    tp, dets = tp[order], dets[order]
+    ap = []
+    for cls in np.unique(gt_cls):
+        selected = dets['cls'] == cls
+        tpc = tp[selected].cumsum(axis=0)
+        fpc = (~tp[selected]).cumsum(axis=0)
+        n_gt = int((gt_cls == cls).sum())
+        if not len(tpc):
+            ap.append(np.zeros(len(IOU_THRESHOLDS)))
+            continue
+        recall = tpc / n_gt
+        precision = tpc / (tpc + fpc)
+        ap.append([average_precision(recall[:, i], precision[:, i]) for i in range(len(IOU_THRESHOLDS))])
+    ap = np.array(ap)
+    recall = tp[dets['conf'] >= conf, 0].sum() / len(gt_cls)
+    return float(ap[:, 0].mean()), float(ap.mean()), float(recall)
+
+
+def evaluate_model(model_path, quantized, frames, labels, args):
+    """Строки отчёта FP32 и INT8 (quantized, по умолчанию <модель>_int8.onnx) вариантов модели model_path"""
+    quantized = quantized or quantized_model_path(model_path)
+    if not os.path.exists(quantized):
+        print(f"{model_path}: нет INT8 модели {quantized} (python -m common.quantize_model)")
+        return
+    results = {}
+    for variant, path in (('fp32', model_path), ('int8', quantized)):
+        model = load_detector(path, args.engine)
+        latencies, detections = run_engine(model, frames, args.warmup, args.min_conf, None)
+        results[variant] = latencies, detections
+    if labels is None:
+        # Эталон - уверенные детекции FP32 модели
+        labels = [dets[dets['conf'] >= args.conf] for dets in results['fp32'][1]]
+
+    print(f"\n{model_path} ({len(frames)} кадров, эталон: {'разметка' if args.labels else 'FP32 детекции'})")
+    metrics = {}
+    for variant, (latencies, detections) in results.items():
+        metrics[variant] = evaluate(labels, detections, args.conf) + (latencies.mean(),)
+        map50, map50_95, recall, ms = metrics[variant]
+        print(f"  {variant}: mAP50 {map50:.3f} | mAP50-95 {map50_95:.3f} | recall {recall:.3f} | мс/кадр {ms:7.1f}")
+    fp32, int8 = metrics['fp32'], metrics['int8']
+    print(f"  INT8: mAP50 {int8[0] - fp32[0]:+.3f}, mAP50-95 {int8[1] - fp32[1]:+.3f}, "
+          f"recall {int8[2] - fp32[2]:+.3f}, ускорение x{fp32[3] / int8[3]:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Оценка INT8 моделей детекции против FP32')
+    parser.add_argument('--model', required=True, help='Исходные модели (.onnx) через запятую')
+    parser.add_argument('--quantized', default=None,
+                        help='INT8 модели через запятую, по одной на --model (по умолчанию <модель>_int8.onnx)')
+    parser.add_argument('--frames', required=True, help='Видео или каталог изображений')
+    parser.add_argument('--labels', default=None, help='Каталог разметки YOLO (.txt) к изображениям --frames')
+    parser.add_argument('--count', type=int, default=200, help='Число кадров')
+    parser.add_argument('--warmup', type=int, default=5, help='Прогревочных вызовов (не учитываются)')
+    parser.add_argument('--conf', type=float, default=0.25, help='Порог уверенности для recall и эталона FP32')
+    parser.add_argument('--min-conf', type=float, default=0.001, help='Порог уверенности детекций для mAP')
+    parser.add_argument('--engine', default='onnxruntime', help='Движок детекции')
+    args = parser.parse_args()
+
+    model_paths = args.model.split(',')
+    quantized_paths = args.quantized.split(',') if args.quantized else [None] * len(model_paths)
+    if len(quantized_paths) != len(model_paths):
+        parser.error(f"--quantized: число моделей ({len(quantized_paths)}) не совпадает с --model ({len(model_paths)})")
+    if args.labels and not os.path.isdir(args.frames):
+        parser.error("--labels требует каталог изображений в --frames")
+
+    labels = None
+    if args.labels:
+        # Разметка по именам загруженных файлов: нечитаемые изображения пропускаются
+        images = load_images(args.frames, args.count)
+        names, frames = [name for name, _ in images], [frame for _, frame in images]
+    else:
+        frames = load_frames(args.frames, args.count)
+    if not frames:
+        print(f"Не удалось загрузить кадры из {args.frames}")
+        return
+    if args.labels:
+        labels = load_labels(args.labels, names, frames)
+    for model_path, quantized in zip(model_paths, quantized_paths):
+        evaluate_model(model_path, quantized, frames, labels, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+import time
+import threading
+import cv2
+from common.reconnect import open_video_capture
+
+
+class EvidenceStream:
+    """
+    Основной (высокого разрешения) поток камеры для снимков нарушений,
+    когда детекция работает на дополнительном потоке низкого разрешения.
+
+    mode='lazy' - поток открывается только на время read_full() (1-2 секунды на подключение),
+    mode='grab' - поток постоянно открыт и вычитывается grab() без преобразования в BGR,
+    read_full() делает только retrieve().
+    open_timeout и read_timeout (сек) ограничивают подключение и чтение кадра,
+    чтобы недоступный основной поток не задерживал цикл мониторинга.
+    """
+    def __init__(self, url, mode='lazy', open_timeout=10.0, read_timeout=5.0, reopen_delay=10):
+        if mode not in ('lazy', 'grab'):
+            raise ValueError(f"Неизвестный режим основного потока: {mode}")
+        self.url = url
+        self.mode = mode
+        self.open_timeout = open_timeout
+        self.read_timeout = read_timeout
+        self.reopen_delay = reopen_delay
+
+        self.cap = None
+        self.lock = threading.Lock()
+        self.stopped = False
+        self.thread = None
+        self.last_grab_time = 0
+
+    def _open(self):
+        cap = open_video_capture(self.url, open_timeout=self.open_timeout, read_timeout=self.read_timeout)
+        try:
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        except Exception:
+            pass
+        if not cap.isOpened():
+            cap.release()
+            print(f"[{time.strftime('%H:%M:%S')}] Не удалось открыть основной поток: {self.url[:50]}...")
+            return None
+        return cap
+
+    def start(self):
+        """В режиме 'grab' запускает поток вычитывания кадров"""
+        if self.mode == 'grab' and self.thread is None:
+            self.thread = threading.Thread(target=self.update, daemon=True)
+            self.thread.start()
+        return self
+
+    def update(self):
+        """Цикл режима 'grab': кадры только вычитываются, чтобы буфер не устаревал"""
+        while not self.stopped:
+            if self.cap is None:
+                cap = self._open()
+                if cap is None:
+                    time.sleep(self.reopen_delay)
+                    continue
+                with self.lock:
+                    self.cap = cap
+                    self.last_grab_time = time.time()
+
+            with self.lock:
+                grabbed = self.cap.grab()
+                if grabbed:
+                    self.last_grab_time = time.time()
+
+            if grabbed:
+                continue
+            if time.time() - self.last_grab_time > 5.0:
+                print(f"[{time.strftime('%H:%M:%S')}] Основной поток не отдает кадры. Переподключение...")
+                with self.lock:
+                    self.cap.release()
+                    self.cap = None
+                time.sleep(self.reopen_delay)
+            else:
+                time.sleep(0.1)
+
+    def read_full(self):
+        """Один кадр основного потока в полном разрешении: (True, кадр) или (False, None)"""
+        if self.mode == 'grab':
+            with self.lock:
+                if self.cap is None or time.time() - self.last_grab_time > 5.0:
+                    return False, None
+                return self.cap.retrieve()
+
+        cap = self._open()
+        if cap is None:
+            return False, None
+        try:
+            # Первые кадры после подключения могут быть неполными до ближайшего I-кадра
+            for _ in range(5):
+                grabbed, frame = cap.read()
+                if grabbed and frame is not None and frame.size > 0:
+                    return True, frame
+            return False, None
+        finally:
+            cap.release()
+
+    def release(self):
+        self.stopped = True
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+        with self.lock:
+            if self.cap is not None:
+                self.cap.release()
+                self.cap = None
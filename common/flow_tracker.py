@@ -0,0 +1,108 @@
+import cv2
+import numpy as np
+from common.iou_tracker import IouTracker
+from common.postprocess import DETECTION_DTYPE
+
+
+class FlowTracker(IouTracker):
+    """
+    Трекер для детекции не на каждом кадре: между детекциями боксы треков переносятся
+    оптическим потоком, на кадре с детекцией сопоставляются с новыми боксами по IoU
+    (IouTracker) - после переноса бокс трека близок к детекции даже при быстром движении.
+
+    На кадре с детекцией (update) внутри каждого бокса выбираются углы (goodFeaturesToTrack).
+    На промежуточных кадрах (propagate) углы прослеживаются пирамидальным методом
+    Лукаса-Канаде на уменьшенном до width кадре: бокс сдвигается на медианное смещение
+    точек и масштабируется по медианному изменению их расстояний до центра.
+    Если точек не осталось, бокс сдвигается со скоростью трека между двумя последними детекциями.
+    Переносятся только треки, найденные на последней детекции
+    """
+    def __init__(self, iou_threshold=0.3, max_missed=3, width=640, max_points=30):
+        super().__init__(iou_threshold, max_missed)
+        self.width = width
+        self.max_points = max_points
+        self.gray = None   # Уменьшенный серый предыдущий кадр
+        self.scale = 1.0   # Масштаб уменьшенного кадра относительно исходного
+
+    def _gray(self, frame):
+        scale = min(1.0, self.width / frame.shape[1])
+        if scale < 1.0:
+            frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), scale
+
+    def _seed(self, track):
+        """Точки для прослеживания внутри бокса трека (координаты уменьшенного кадра)"""
+        height, width = self.gray.shape
+        x1, y1, x2, y2 = (track['bbox'] * self.scale).astype(np.int64)
+        x1, x2 = np.clip([x1, x2], 0, width)
+        y1, y2 = np.clip([y1, y2], 0, height)
+        track['points'] = None
+        if x2 - x1 < 4 or y2 - y1 < 4:
+            return
+        mask = np.zeros_like(self.gray)
+        mask[y1:y2, x1:x2] = 255
+        track['points'] = cv2.goodFeaturesToTrack(self.gray, self.max_points, 0.01, 3, mask=mask)
+
+    def update(self, frame, boxes, conf=None):
+        """Детекции кадра frame (N, 4) -> id треков (N,); conf - уверенности для detections()"""
+        ids = super().update(boxes)
+        self.gray, self.scale = self._gray(frame)
+        conf = np.ones(len(ids), dtype=np.float32) if conf is None else np.asarray(conf)
+        for track_id, confidence in zip(ids.tolist(), conf.tolist()):
+            track = self.tracks[track_id]
+            if 'detected_bbox' in track:
+                # Кадров от прошлой детекции: промежуточные (frames) и текущий
+                track['velocity'] = (track['bbox'] - track['detected_bbox']) / (track['frames'] + 1)
+            else:
+                track['velocity'] = np.zeros(4)
+            track.update(detected_bbox=track['bbox'].copy(), frames=0, conf=confidence)
+            self._seed(track)
+        return ids
+
+    def propagate(self, frame):
+        """Перенос боксов активных треков на кадр frame без детекции"""
+        gray, scale = self._gray(frame)
+        if self.gray is None or gray.shape != self.gray.shape:
+            self.gray, self.scale = gray, scale
+            return
+        height, width = frame.shape[:2]
+        for track in self.tracks.values():
+            track['frames'] += 1
+            if track['missed']:
+                continue
+            points = track.get('points')
+            moved = False
+            if points is not None and len(points) >= 3:
+                new_points, status, _ = cv2.calcOpticalFlowPyrLK(self.gray, gray, points, None,
+                                                                 winSize=(15, 15), maxLevel=2)
+                ok = status.ravel() == 1
+                if ok.sum() >= 3:
+                    old, new = points[ok].reshape(-1, 2), new_points[ok].reshape(-1, 2)
+                    shift = np.median(new - old, axis=0) / scale
+                    old_dist = np.linalg.norm(old - old.mean(axis=0), axis=1)
+                    new_dist = np.linalg.norm(new - new.mean(axis=0), axis=1)
+                    spread = old_dist > 1
+                    ratio = float(np.clip(np.median(new_dist[spread] / old_dist[spread]), 0.8, 1.25)) if spread.any() else 1.0
+                    x1, y1, x2, y2 = track['bbox']
+                    cx, cy = (x1 + x2) / 2 + shift[0], (y1 + y2) / 2 + shift[1]
+                    half_w, half_h = (x2 - x1) / 2 * ratio, (y2 - y1) / 2 * ratio
+                    track['bbox'] = np.array([cx - half_w, cy - half_h, cx + half_w, cy + half_h])
+                    track['points'] = new.reshape(-1, 1, 2)
+                    moved = True
+            if not moved:
+                track['bbox'] = track['bbox'] + track['velocity']
+                track['points'] = None
+            track['bbox'][[0, 2]] = track['bbox'][[0, 2]].clip(0, width)
+            track['bbox'][[1, 3]] = track['bbox'][[1, 3]].clip(0, height)
+        self.gray, self.scale = gray, scale
+
+    def detections(self, min_hits=1):
+        """Активные треки (найдены на последней детекции, не меньше min_hits детекций) -> DETECTION_DTYPE"""
+        active = [(track_id, track) for track_id, track in self.tracks.items()
+                  if not track['missed'] and track['hits'] >= min_hits]
+        dets = np.zeros(len(active), dtype=DETECTION_DTYPE)
+        for det, (track_id, track) in zip(dets, active):
+            det['x1'], det['y1'], det['x2'], det['y2'] = track['bbox']
+            det['conf'] = track['conf']
+            det['track_id'] = track_id
+        return dets
@@ -0,0 +1,76 @@
+import cv2
+import numpy as np
+
+
+class FrameTransform:
+    """
+    Преобразование кадра источника в кадр для детекции: обрезка по прямоугольнику
+    crop_rect (x1, y1, x2, y2 в координатах источника) и уменьшение до ширины output_width.
+    Соответствие координат: output = (source - начало обрезки) * scale.
+    ROI в .env заданы в координатах источника (полного кадра камеры).
+    """
+    def __init__(self, source_width, source_height, output_width=0, crop_rect=None):
+        x1, y1, x2, y2 = crop_rect if crop_rect else (0, 0, source_width, source_height)
+        x1 = min(max(0, int(x1)), source_width - 1)
+        y1 = min(max(0, int(y1)), source_height - 1)
+        x2 = min(max(x1 + 1, int(x2)), source_width)
+        y2 = min(max(y1 + 1, int(y2)), source_height)
+
+        self.source_size = (source_width, source_height)
+        self.crop = (x1, y1, x2, y2)
+        crop_width, crop_height = x2 - x1, y2 - y1
+        self.scale = min(1.0, output_width / crop_width) if output_width > 0 else 1.0
+        self.output_size = (max(1, round(crop_width * self.scale)), max(1, round(crop_height * self.scale)))
+
+    @property
+    def is_identity(self):
+        return self.scale == 1.0 and self.crop == (0, 0) + self.source_size
+
+    def apply(self, frame):
+        """Обрезка и уменьшение кадра в разрешении источника"""
+        x1, y1, x2, y2 = self.crop
+        cropped = frame[y1:y2, x1:x2]
+        if self.scale == 1.0:
+            return cropped
+        return cv2.resize(cropped, self.output_size, interpolation=cv2.INTER_AREA)
+
+    def scaled_source_size(self):
+        """Размер полного кадра после уменьшения (уменьшение выполняет декодер PyAV)"""
+        width, height = self.source_size
+        return max(1, round(width * self.scale)), max(1, round(height * self.scale))
+
+    def crop_scaled(self, scaled_frame):
+        """Обрезка кадра, уже уменьшенного до scaled_source_size()"""
+        x = round(self.crop[0] * self.scale)
+        y = round(self.crop[1] * self.scale)
+        width, height = self.output_size
+        return scaled_frame[y:y + height, x:x + width]
+
+    def to_output_points(self, points):
+        """Точки [[x, y], ...] из координат источника в координаты кадра детекции"""
+        pts = (np.asarray(points, dtype=np.float64) - self.crop[:2]) * self.scale
+        return np.round(pts).astype(int).tolist()
+
+    def to_source_points(self, points):
+        """Точки [[x, y], ...] из координат кадра детекции в координаты источника"""
+        pts = np.asarray(points, dtype=np.float64) / self.scale + self.crop[:2]
+        return np.round(pts).astype(int).tolist()
+
+    def to_output_polygon(self, polygon):
+        """Полигон ROI в координатах кадра детекции (None остается None)"""
+        if polygon is None:
+            return None
+        return self.to_output_points(polygon)
+
+    def to_source_bbox(self, bbox):
+        """Bounding box (x1, y1, x2, y2) кадра детекции в координатах источника"""
+        (x1, y1), (x2, y2) = self.to_source_points([bbox[:2], bbox[2:4]])
+        return (x1, y1, x2, y2)
+
+
+def scale_bbox(bbox, from_size, to_size):
+    """Перенос bounding box между кадрами разного разрешения одной камеры (размеры - (ширина, высота))"""
+    sx = to_size[0] / from_size[0]
+    sy = to_size[1] / from_size[1]
+    x1, y1, x2, y2 = bbox
+    return (round(x1 * sx), round(y1 * sy), round(x2 * sx), round(y2 * sy))
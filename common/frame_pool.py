@@ -0,0 +1,55 @@
+import sys
+import numpy as np
+
+
+class FramePool:
+    """
+    Пул предвыделенных кадров, которые декодер переиспользует (cap.read(slot)).
+
+    Слот свободен, когда на него никто не ссылается: numpy хранит в .base ссылку
+    на владельца памяти, поэтому любое представление слота (FrameView, срез кадра,
+    кадр в истории VideoStream) удерживает слот, и он не будет перезаписан.
+    Если все слоты заняты, декодер получает новый массив (учитывается в allocations).
+    size=0 отключает пул (бэкенд не умеет писать кадр в готовый массив).
+    """
+    def __init__(self, size):
+        self.size = max(0, size)
+        self.slots = []
+        self.shape = None
+        self.dtype = None
+        self.next_index = 0
+        self.allocations = 0  # Кадры, полученные не в слот пула
+
+    def acquire(self):
+        """Свободный слот для следующего кадра или None (размер кадра неизвестен / все заняты)"""
+        count = len(self.slots)
+        for offset in range(count):
+            index = (self.next_index + offset) % count
+            # Ссылки: список слотов и аргумент getrefcount
+            if sys.getrefcount(self.slots[index]) <= 2:
+                self.next_index = index + 1
+                return self.slots[index]
+        return None
+
+    def register(self, frame, slot):
+        """
+        Учет полученного кадра. Если декодер записал кадр не в слот (первый кадр,
+        смена разрешения, бэкенд без записи в готовый массив) - пул перестраивается
+        под размер кадра
+        """
+        if frame is slot or self.size == 0:
+            return
+        self.allocations += 1
+        if frame.shape != self.shape or frame.dtype != self.dtype:
+            self.shape = frame.shape
+            self.dtype = frame.dtype
+            self.slots = [np.empty(self.shape, self.dtype) for _ in range(self.size)]
+            self.next_index = 0
+
+    def get_stats(self):
+        """Статистика пула"""
+        return {
+            'slots': len(self.slots),
+            'free_slots': sum(1 for i in range(len(self.slots)) if sys.getrefcount(self.slots[i]) <= 2),
+            'allocations': self.allocations
+        }
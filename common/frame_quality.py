@@ -0,0 +1,68 @@
+import cv2
+import numpy as np
+
+
+def frame_integrity(frame, width=160, block=8, flat_std=0.5, grey_tolerance=12, smear_diff=0.25):
+    """
+    Оценка целостности кадра от 0 до 1 - доля блоков без признаков маскировки ошибок декодера.
+
+    Кадр прореживается выборкой каждого N-го пикселя до ширины ~width (без усреднения,
+    чтобы сохранить шум матрицы) и делится на блоки block x block. Блок считается
+    поврежденным, если он:
+    - залит серым: яркость почти постоянна (std < flat_std), близка к 128, без цвета
+      (так декодер заполняет блоки без опорного кадра);
+    - размазан по вертикали: строки блока повторяют друг друга (разность соседних строк
+      < smear_diff) при заметной разности соседних столбцов (копирование строки сверху).
+    У кадров живой камеры шум матрицы не дает ни точной заливки, ни точного повтора строк.
+    """
+    step = max(1, frame.shape[1] // width)
+    small = frame[::step, ::step]
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.float32)
+
+    rows, cols = gray.shape[0] // block, gray.shape[1] // block
+    if rows == 0 or cols == 0:
+        return 1.0
+    blocks = gray[:rows * block, :cols * block].reshape(rows, block, cols, block).swapaxes(1, 2)
+    pixels = small[:rows * block, :cols * block].astype(np.int16)
+    chroma = (pixels.max(axis=2) - pixels.min(axis=2)).reshape(rows, block, cols, block).max(axis=(1, 3))
+
+    grey = ((blocks.std(axis=(2, 3)) < flat_std)
+            & (np.abs(blocks.mean(axis=(2, 3)) - 128) < grey_tolerance)
+            & (chroma < grey_tolerance))
+    row_diff = np.abs(np.diff(blocks, axis=2)).mean(axis=(2, 3))
+    col_diff = np.abs(np.diff(blocks, axis=3)).mean(axis=(2, 3))
+    smear = (row_diff < smear_diff) & (col_diff > 4 * smear_diff)
+
+    return 1.0 - float((grey | smear).mean())
+
+
+class FrameQualityGate:
+    """
+    Фильтр поврежденных кадров перед детекцией: кадр с оценкой frame_integrity()
+    ниже threshold пропускается (во время серий ошибок декодирования детекция на
+    серых/размазанных кадрах дает ложное "отсутствие"). threshold=0 отключает проверку.
+    """
+    def __init__(self, threshold=0.7):
+        self.threshold = threshold
+        self.checked = 0
+        self.skipped = 0
+        self.last_score = None
+
+    def check(self, frame):
+        """True - кадр пригоден для детекции"""
+        if self.threshold <= 0:
+            return True
+        self.last_score = frame_integrity(frame)
+        self.checked += 1
+        if self.last_score < self.threshold:
+            self.skipped += 1
+            return False
+        return True
+
+    def get_stats(self):
+        return {
+            'threshold': self.threshold,
+            'checked': self.checked,
+            'skipped': self.skipped,
+            'last_score': self.last_score
+        }
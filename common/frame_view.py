@@ -0,0 +1,56 @@
+from collections import namedtuple
+import numpy as np
+
+
+class FrameView(namedtuple('FrameView', ['frame', 'seq', 'timestamp', 'source', 'transform'],
+                           defaults=(None, None))):
+    """
+    Кадр видеопотока без копирования.
+    frame - ndarray только для чтения (flags.writeable = False),
+    seq - порядковый номер кадра в потоке, timestamp - время получения кадра.
+    Потребитель, которому нужно рисовать на кадре, вызывает copy().
+    Если кадр уменьшен/обрезан (FrameTransform), source - кадр источника
+    в полном разрешении (ndarray или кадр PyAV), transform - преобразование координат.
+    """
+    __slots__ = ()
+
+    def copy(self):
+        """Изменяемая копия кадра"""
+        return self.frame.copy()
+
+    def full(self):
+        """Изменяемый кадр в полном разрешении источника (для снимков нарушений)"""
+        if self.source is None:
+            return self.frame.copy()
+        if isinstance(self.source, np.ndarray):
+            return self.source.copy()
+        return self.source.to_ndarray(format='bgr24')
+
+    @property
+    def source_size(self):
+        """Размер кадра источника (ширина, высота)"""
+        if self.transform is not None:
+            return self.transform.source_size
+        return self.frame.shape[1], self.frame.shape[0]
+
+    def to_output_polygon(self, polygon):
+        """Полигон из координат источника в координаты frame"""
+        if self.transform is None:
+            return polygon
+        return self.transform.to_output_polygon(polygon)
+
+    def to_source_bbox(self, bbox):
+        """Bounding box из координат frame в координаты источника"""
+        if self.transform is None:
+            return bbox
+        return self.transform.to_source_bbox(bbox)
+
+
+def make_frame_view(frame, seq, timestamp, source=None, transform=None):
+    """
+    Оборачивает кадр в FrameView. Только для чтения помечается представление кадра,
+    сам массив (например, слот FramePool) остается доступным декодеру для записи
+    """
+    frame = frame.view()
+    frame.flags.writeable = False
+    return FrameView(frame, seq, timestamp, source, transform)
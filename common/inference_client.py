@@ -0,0 +1,241 @@
+import os
+import json
+import atexit
+import time
+import socket
+import struct
+import itertools
+import threading
+import numpy as np
+from multiprocessing import shared_memory
+from common.detection_engine import EngineBoxes, EngineResult
+from common.inference_engine import load_detector
+from common.postprocess import DETECTION_DTYPE, boxes_xyxy
+
+# Сокет сервера инференса (inference_server) по умолчанию
+DEFAULT_SOCKET = '/tmp/cyber_inference.sock'
+
+# Сообщение: заголовок (длина JSON, длина данных), JSON, данные (детекции DETECTION_DTYPE)
+MESSAGE_HEADER = struct.Struct('<II')
+
+_segment_counter = itertools.count()
+
+
+def send_message(sock, message, payload=b''):
+    """Отправка сообщения протокола сервера инференса"""
+    data = json.dumps(message).encode('utf-8')
+    sock.sendall(MESSAGE_HEADER.pack(len(data), len(payload)) + data + payload)
+
+
+def _recv_exact(sock, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if count == 0:
+            raise ConnectionError("Соединение с сервером инференса закрыто")
+        received += count
+    return buffer
+
+
+def recv_message(sock):
+    """Чтение сообщения: (JSON, данные)"""
+    json_size, payload_size = MESSAGE_HEADER.unpack(_recv_exact(sock, MESSAGE_HEADER.size))
+    message = json.loads(_recv_exact(sock, json_size).decode('utf-8'))
+    payload = _recv_exact(sock, payload_size) if payload_size else b''
+    return message, payload
+
+
+class InferenceClient:
+    """
+    Детектор на сервере инференса: замена model(frame) в сервисах.
+
+    Модель загружается сервером один раз на все сервисы. Кадр передаётся через
+    сегмент общей памяти клиента (по сокету идёт только короткий запрос),
+    в ответ приходят детекции. Приоритет запросов сервер определяет по имени
+    клиента (INFERENCE_SERVER_PRIORITIES).
+
+    Вызов совместим с движками детекции: model(frame, conf=..., classes=...)
+    и model.predict(...) возвращают список с одним EngineResult.
+    detect_batch(frames, options) передаёт несколько кадров одним запросом (кадры подряд
+    в сегменте), сервер объединяет их в пакетные проходы модели.
+    engine_options (max_batch, imgsz) передаются серверу при загрузке модели -
+    модель с другими параметрами движка сервер загружает отдельно.
+    Если сервер недоступен и fallback=True, детекция идёт на локальной модели
+    (load_detector с теми же engine_options), подключение к серверу
+    повторяется каждые retry_interval секунд
+    """
+    def __init__(self, model_path, client_name, socket_path=DEFAULT_SOCKET, engine='onnxruntime',
+                 precision='fp32', fallback=True, retry_interval=30.0, timeout=30.0, engine_options=None):
+        self.model_path = os.path.abspath(str(model_path))
+        self.client_name = client_name
+        self.socket_path = socket_path
+        self.engine = engine
+        self.precision = precision
+        self.fallback = fallback
+        self.retry_interval = retry_interval
+        self.timeout = timeout
+        self.engine_options = engine_options or {}
+        self.lock = threading.Lock()
+
+        self.sock = None
+        self.shm = None
+        self.names = {}
+        self.local_model = None
+        self.last_connect_attempt = 0
+        atexit.register(self.close)
+
+    def _connect(self):
+        """Подключение к серверу и загрузка модели на нём. False - сервер недоступен"""
+        now = time.time()
+        if now - self.last_connect_attempt < self.retry_interval:
+            return False
+        self.last_connect_attempt = now
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            send_message(sock, {'op': 'load', 'client': self.client_name, 'model': self.model_path,
+                                'engine': self.engine, 'precision': self.precision,
+                                'engine_options': self.engine_options})
+            reply, _ = recv_message(sock)
+        except (OSError, ConnectionError, ValueError) as e:
+            sock.close()
+            print(f"[{time.strftime('%H:%M:%S')}] Сервер инференса недоступен ({self.socket_path}): {e}")
+            return False
+        if not reply.get('ok'):
+            sock.close()
+            print(f"[{time.strftime('%H:%M:%S')}] Сервер инференса не загрузил {self.model_path}: {reply.get('error')}")
+            return False
+        self.sock = sock
+        self.names = {int(k): v for k, v in reply.get('names', {}).items()}
+        print(f"[{time.strftime('%H:%M:%S')}] Подключено к серверу инференса: {os.path.basename(self.model_path)} "
+              f"(приоритет {reply.get('priority')})")
+        return True
+
+    def _disconnect(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+    def _segment(self, nbytes):
+        """Сегмент общей памяти для кадра, пересоздаётся при увеличении кадра"""
+        if self.shm is None or self.shm.size < nbytes:
+            self._release_segment()
+            name = f"cyber_infer_{os.getpid()}_{next(_segment_counter)}"
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=nbytes)
+        return self.shm
+
+    def _release_segment(self):
+        if self.shm is not None:
+            try:
+                self.shm.close()
+                self.shm.unlink()
+            except Exception:
+                pass
+            self.shm = None
+
+    def _remote(self, frame, options):
+        frame = np.ascontiguousarray(frame)
+        shm = self._segment(frame.nbytes)
+        np.ndarray(frame.shape, dtype=np.uint8, buffer=shm.buf)[:] = frame
+        send_message(self.sock, dict(options, op='detect', shm=shm.name, shape=frame.shape))
+        reply, payload = recv_message(self.sock)
+        if not reply.get('ok'):
+            raise RuntimeError(f"Ошибка сервера инференса: {reply.get('error')}")
+        return np.frombuffer(payload, dtype=DETECTION_DTYPE)
+
+    def _remote_batch(self, frames, options):
+        """Кадры подряд в сегменте, один запрос - детекции по кадрам"""
+        frames = [np.ascontiguousarray(frame) for frame in frames]
+        shm = self._segment(sum(frame.nbytes for frame in frames))
+        offset = 0
+        for frame in frames:
+            np.ndarray(frame.shape, dtype=np.uint8, buffer=shm.buf, offset=offset)[:] = frame
+            offset += frame.nbytes
+        send_message(self.sock, {'op': 'detect_batch', 'shm': shm.name, 'options': options,
+                                 'shapes': [frame.shape for frame in frames]})
+        reply, payload = recv_message(self.sock)
+        if not reply.get('ok'):
+            raise RuntimeError(f"Ошибка сервера инференса: {reply.get('error')}")
+        dets = np.frombuffer(payload, dtype=DETECTION_DTYPE)
+        return np.split(dets, np.cumsum(reply['counts'])[:-1])
+
+    def _local_model(self):
+        if not self.fallback:
+            raise ConnectionError(f"Сервер инференса недоступен ({self.socket_path})")
+        if self.local_model is None:
+            print(f"[{time.strftime('%H:%M:%S')}] Локальная модель вместо сервера инференса: {self.model_path}")
+            self.local_model = load_detector(self.model_path, self.engine, self.precision, **self.engine_options)
+            self.names = getattr(self.local_model, 'names', None) or self.names
+        return self.local_model
+
+    def _local(self, frame, options):
+        return self._local_model()(frame, verbose=False, **options)
+
+    def _local_batch(self, frames, options):
+        model = self._local_model()
+        if hasattr(model, 'detect_batch'):
+            return model.detect_batch(frames, options)
+        return [model(frame, verbose=False, **opts)[0] for frame, opts in zip(frames, options)]
+
+    def _result(self, dets, shape):
+        boxes = EngineBoxes(boxes_xyxy(dets).astype(np.float32), dets['conf'].copy(), dets['cls'].astype(np.float32))
+        return EngineResult(boxes, shape[:2], self.names)
+
+    def __call__(self, source, conf=None, iou=None, classes=None, verbose=False, **kwargs):
+        """Детекция на кадре BGR (np.ndarray). Список из одного EngineResult"""
+        options = {key: value for key, value in (('conf', conf), ('iou', iou), ('classes', classes)) if value is not None}
+        with self.lock:
+            if self.sock is None and not self._connect():
+                return self._local(source, options)
+            try:
+                dets = self._remote(source, options)
+            except (OSError, ConnectionError) as e:
+                print(f"[{time.strftime('%H:%M:%S')}] Потеряно соединение с сервером инференса: {e}")
+                self._disconnect()
+                return self._local(source, options)
+        return [self._result(dets, source.shape)]
+
+    def detect_batch(self, frames, options):
+        """Детекция на нескольких кадрах одним запросом: frames и options (dict на кадр) - списки"""
+        if not frames:
+            return []
+        options = [{key: value for key, value in opts.items() if key in ('conf', 'iou', 'classes')} for opts in options]
+        with self.lock:
+            if self.sock is None and not self._connect():
+                return self._local_batch(frames, options)
+            try:
+                dets = self._remote_batch(frames, options)
+            except (OSError, ConnectionError) as e:
+                print(f"[{time.strftime('%H:%M:%S')}] Потеряно соединение с сервером инференса: {e}")
+                self._disconnect()
+                return self._local_batch(frames, options)
+        return [self._result(frame_dets, frame.shape) for frame_dets, frame in zip(dets, frames)]
+
+    def predict(self, source, **kwargs):
+        return self(source, **kwargs)
+
+    def track(self, *args, **kwargs):
+        raise NotImplementedError("Сервер инференса не поддерживает трекинг - используйте ultralytics")
+
+    def close(self):
+        """Отключение от сервера и удаление сегмента кадра"""
+        with self.lock:
+            self._disconnect()
+            self._release_segment()
+
+
+def create_detector(model_path, client_name, engine='onnxruntime', precision='fp32',
+                    use_server=False, socket_path=DEFAULT_SOCKET, **engine_options):
+    """
+    Детектор сервиса: клиент сервера инференса (USE_INFERENCE_SERVER) или своя модель в процессе.
+    engine_options (max_batch, imgsz) - параметры движка модели (своей или на сервере)
+    """
+    if use_server:
+        return InferenceClient(model_path, client_name, socket_path, engine, precision, engine_options=engine_options)
+    return load_detector(model_path, engine, precision, **engine_options)
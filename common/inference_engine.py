@@ -0,0 +1,70 @@
+import os
+from common.onnx_engine import OnnxEngine, onnxruntime_available
+from common.ncnn_engine import NcnnEngine, ncnn_available
+
+# Движки детекции: ultralytics - YOLO (любой формат модели, трекинг),
+# onnxruntime - OnnxEngine для .onnx, ncnn - NcnnEngine для каталога *_ncnn_model
+# (без ultralytics/torch)
+INFERENCE_ENGINES = ('ultralytics', 'onnxruntime', 'ncnn')
+
+# Точность модели: fp32 - исходный файл, int8 - вариант <модель>_int8 (common.quantize_model)
+MODEL_PRECISIONS = ('fp32', 'int8')
+QUANTIZED_SUFFIX = '_int8'
+
+
+def quantized_model_path(model_path):
+    """Путь INT8 варианта модели: models/yolov8s.onnx -> models/yolov8s_int8.onnx"""
+    stem, ext = os.path.splitext(str(model_path).rstrip('/'))
+    return f"{stem}{QUANTIZED_SUFFIX}{ext}"
+
+
+def ncnn_model_dir(model_path):
+    """
+    Каталог NCNN модели: сам model_path, если это каталог экспорта,
+    иначе соседний каталог экспорта ultralytics (models/yolov8s.onnx -> models/yolov8s_ncnn_model)
+    """
+    model_path = str(model_path).rstrip('/')
+    if os.path.isdir(model_path):
+        return model_path
+    model_dir = os.path.splitext(model_path)[0] + '_ncnn_model'
+    return model_dir if os.path.isdir(model_dir) else None
+
+
+def load_detector(model_path, engine='onnxruntime', precision='fp32', **engine_options):
+    """
+    Загрузка детектора, вызываемого как model(frame) / model.predict(frame).
+    precision='int8' - загрузить квантованный вариант модели, если он создан
+    (для ncnn - каталог <модель>_int8_ncnn_model), иначе исходную модель с предупреждением.
+    Если движок не может загрузить модель (нет файла нужного формата, пакет не установлен),
+    используется следующий: ncnn -> onnxruntime -> ultralytics, с предупреждением.
+    ultralytics импортируется только при его использовании
+    """
+    if engine not in INFERENCE_ENGINES:
+        raise ValueError(f"Неизвестный движок детекции: {engine}")
+    if precision not in MODEL_PRECISIONS:
+        raise ValueError(f"Неизвестная точность модели: {precision}")
+    if precision == 'int8':
+        quantized = quantized_model_path(model_path)
+        if os.path.exists(quantized):
+            model_path = quantized
+        else:
+            print(f"Нет INT8 модели {quantized} (python -m common.quantize_model) - используется {model_path}")
+    if engine == 'ncnn':
+        model_dir = ncnn_model_dir(model_path)
+        if model_dir is None:
+            print(f"Для {model_path} нет NCNN модели (*_ncnn_model) - используется onnxruntime")
+        elif not ncnn_available():
+            print("ncnn не установлен (pip install ncnn) - используется onnxruntime")
+        else:
+            return NcnnEngine(model_dir, **engine_options)
+        engine = 'onnxruntime'
+    if engine == 'onnxruntime':
+        if not str(model_path).endswith('.onnx'):
+            print(f"Модель {model_path} не ONNX - используется ultralytics")
+        elif not onnxruntime_available():
+            print("onnxruntime не установлен (pip install onnxruntime) - используется ultralytics")
+        else:
+            return OnnxEngine(model_path, **engine_options)
+
+    from ultralytics import YOLO
+    return YOLO(model_path, task='detect')
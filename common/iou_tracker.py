@@ -0,0 +1,54 @@
+import numpy as np
+from common.postprocess import box_iou
+
+
+class IouTracker:
+    """
+    Трекер по пересечению боксов соседних детекций: бокс получает id трека,
+    с последним боксом которого у него наибольший IoU (не меньше iou_threshold).
+    Пары сопоставляются жадно по убыванию IoU, один к одному. Бокс без пары
+    открывает новый трек, трек без бокса удаляется после max_missed детекций подряд.
+    Подходит для медленно движущихся людей при детекции раз в несколько секунд
+    """
+    def __init__(self, iou_threshold=0.3, max_missed=3):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.tracks = {}  # id -> {'bbox': последний бокс, 'missed': детекций без бокса, 'hits': детекций с боксом}
+        self.next_id = 1
+
+    def update(self, boxes):
+        """Боксы детекции (N, 4: x1, y1, x2, y2) -> id треков (N,)"""
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        ids = np.full(len(boxes), -1, dtype=np.int64)
+        track_ids = list(self.tracks)
+
+        if track_ids and len(boxes):
+            iou = box_iou([self.tracks[track_id]['bbox'] for track_id in track_ids], boxes)
+            pairs = np.argwhere(iou >= self.iou_threshold)
+            pairs = pairs[iou[pairs[:, 0], pairs[:, 1]].argsort()[::-1]]
+            matched_tracks = set()
+            for track_index, box_index in pairs:
+                if track_index in matched_tracks or ids[box_index] >= 0:
+                    continue
+                matched_tracks.add(track_index)
+                ids[box_index] = track_ids[track_index]
+
+        matched = set(ids[ids >= 0].tolist())
+        for track_id in track_ids:
+            if track_id not in matched:
+                self.tracks[track_id]['missed'] += 1
+                if self.tracks[track_id]['missed'] > self.max_missed:
+                    del self.tracks[track_id]
+
+        for index, box in enumerate(boxes):
+            if ids[index] < 0:
+                ids[index] = self.next_id
+                self.next_id += 1
+                self.tracks[int(ids[index])] = {'bbox': box.copy(), 'missed': 0, 'hits': 1}
+            else:
+                track = self.tracks[int(ids[index])]
+                track.update(bbox=box.copy(), missed=0, hits=track['hits'] + 1)
+        return ids
+
+    def reset(self):
+        self.tracks = {}
@@ -0,0 +1,145 @@
+import time
+import heapq
+import itertools
+import threading
+from collections import Counter
+
+
+class BatchRequest:
+    """Запрос детекции в очереди MicroBatcher"""
+    def __init__(self, frame, options):
+        self.frame = frame
+        self.options = options
+        self.done = threading.Event()
+        self.submitted = time.perf_counter()
+        self.result = None
+        self.error = None
+        self.wait_time = 0.0       # Ожидание в очереди (сек)
+        self.inference_time = 0.0  # Проход модели по пакету (сек)
+        self.batch_size = 0
+
+
+class MicroBatcher:
+    """
+    Очередь запросов к одной модели с приоритетами и объединением одновременных
+    запросов в один пакетный проход (detect_batch движка детекции).
+
+    Первым берется запрос с меньшим приоритетом, при равном - более ранний.
+    Если модель поддерживает пакеты (supports_batch), после первого запроса
+    поток ждёт ещё до max_wait секунд, пока очередь не наберёт max_batch
+    запросов, и запускает модель один раз на весь пакет. Иначе запросы
+    выполняются по одному без ожидания. Размеры пакетов копятся в гистограмме.
+
+    Вызов совместим с моделью: batcher(frame, conf=..., classes=...) - список
+    с одним результатом
+    """
+    def __init__(self, model, max_batch=4, max_wait=0.005, name='model'):
+        self.model = model
+        self.name = name
+        self.batched = getattr(model, 'supports_batch', False)
+        self.max_batch = max(1, min(max_batch, getattr(model, 'max_batch', max_batch))) if self.batched else 1
+        self.max_wait = max_wait
+        self.queue = []
+        self.order = itertools.count()
+        self.condition = threading.Condition()
+        self.stats_lock = threading.Lock()
+        self.histogram = Counter()
+        self.thread = threading.Thread(target=self.run, daemon=True, name=f"batcher_{name}")
+        self.thread.start()
+
+    def submit(self, frame, options=None, priority=0):
+        """Постановка запроса в очередь и ожидание результата. Возвращает BatchRequest"""
+        request = BatchRequest(frame, options or {})
+        with self.condition:
+            heapq.heappush(self.queue, (priority, next(self.order), request))
+            self.condition.notify()
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request
+
+    def submit_many(self, frames, options, priority=0):
+        """
+        Постановка нескольких кадров одного клиента в очередь сразу (объединяются в пакеты)
+        и ожидание всех результатов. options - dict на кадр. Возвращает список BatchRequest
+        """
+        requests = [BatchRequest(frame, opts or {}) for frame, opts in zip(frames, options)]
+        with self.condition:
+            for request in requests:
+                heapq.heappush(self.queue, (priority, next(self.order), request))
+            self.condition.notify()
+        for request in requests:
+            request.done.wait()
+        for request in requests:
+            if request.error is not None:
+                raise request.error
+        return requests
+
+    def __call__(self, source, conf=None, iou=None, classes=None, verbose=False, **kwargs):
+        options = {key: value for key, value in (('conf', conf), ('iou', iou), ('classes', classes)) if value is not None}
+        return [self.submit(source, options).result]
+
+    def predict(self, source, **kwargs):
+        return self(source, **kwargs)
+
+    def _next_batch(self):
+        """Ожидание запросов и выбор пакета: не больше max_batch, не дольше max_wait после первого"""
+        with self.condition:
+            while not self.queue:
+                self.condition.wait()
+            deadline = time.perf_counter() + self.max_wait
+            while len(self.queue) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            count = min(len(self.queue), self.max_batch)
+            return [heapq.heappop(self.queue)[2] for _ in range(count)]
+
+    def _infer(self, batch):
+        frames = [request.frame for request in batch]
+        options = [request.options for request in batch]
+        if self.batched:
+            return self.model.detect_batch(frames, options)
+        return [self.model(frame, verbose=False, **opts)[0] for frame, opts in zip(frames, options)]
+
+    def run(self):
+        while True:
+            batch = self._next_batch()
+            start = time.perf_counter()
+            try:
+                results = self._infer(batch)
+            except Exception as e:
+                results = [None] * len(batch)
+                for request in batch:
+                    request.error = e
+            inference_time = time.perf_counter() - start
+            with self.stats_lock:
+                self.histogram[len(batch)] += 1
+            for request, result in zip(batch, results):
+                request.result = result
+                request.frame = None  # Кадр может быть в общей памяти клиента - ссылку не держим
+                request.wait_time = start - request.submitted
+                request.inference_time = inference_time
+                request.batch_size = len(batch)
+                request.done.set()
+
+    def get_stats(self, reset=False):
+        """Гистограмма размеров пакетов {размер: число проходов}, число проходов и запросов"""
+        with self.stats_lock:
+            histogram = dict(sorted(self.histogram.items()))
+            if reset:
+                self.histogram = Counter()
+        return {
+            'histogram': histogram,
+            'batches': sum(histogram.values()),
+            'requests': sum(size * count for size, count in histogram.items())
+        }
+
+
+def format_histogram(histogram):
+    """Гистограмма размеров пакетов строкой: '1: 40 (57%), 2: 30 (43%)' - доля запросов"""
+    requests = sum(size * count for size, count in histogram.items())
+    if not requests:
+        return 'нет запросов'
+    return ', '.join(f"{size}: {count} ({size * count / requests:.0%})" for size, count in histogram.items())
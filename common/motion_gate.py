@@ -0,0 +1,113 @@
+import time
+import cv2
+from common.roi_geometry import get_roi_geometry
+
+# Методы обнаружения изменений: diff - разность с кадром последней детекции,
+# mog2 - модель фона MOG2 (обновляется на каждом кадре)
+MOTION_METHODS = ('diff', 'mog2')
+
+
+class MotionGate:
+    """
+    Дешёвая проверка изменений в ROI перед запуском модели детекции.
+
+    Кадр уменьшается до ширины width и переводится в оттенки серого. Для каждой ROI
+    считается доля изменившихся пикселей: для diff - отличие яркости от кадра последней
+    детекции больше pixel_threshold, для mog2 - передний план модели фона.
+    Если ни в одной ROI доля не превышает threshold, детекция пропускается
+    и сервис переиспользует последний результат. Детекция выполняется не реже
+    чем раз в max_interval секунд. threshold=0 отключает проверку.
+    """
+    def __init__(self, threshold=0.01, max_interval=30.0, method='diff', width=160, pixel_threshold=25):
+        if method not in MOTION_METHODS:
+            raise ValueError(f"Неизвестный метод обнаружения изменений: {method}")
+        self.threshold = threshold
+        self.max_interval = max_interval
+        self.method = method
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.reference = None        # Уменьшенный кадр последней детекции (diff)
+        self.subtractor = None       # Модель фона (mog2)
+        self.last_inference = None   # Время последней детекции
+        self.last_changes = []       # Доли изменившихся пикселей по ROI на последней проверке
+        self.checked = 0
+        self.skipped = 0
+        self.forced = 0              # Детекций по max_interval без изменений в ROI
+
+    def _small(self, frame):
+        scale = min(1.0, self.width / frame.shape[1])
+        if scale < 1.0:
+            frame = cv2.resize(frame, (max(1, round(frame.shape[1] * scale)), max(1, round(frame.shape[0] * scale))),
+                               interpolation=cv2.INTER_AREA)
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return gray, scale
+
+    def _changes(self, moving, roi_list, scale):
+        """Доля изменившихся пикселей (moving > 0) в каждой ROI, без ROI - во всём кадре"""
+        if not roi_list:
+            return [cv2.countNonZero(moving) / moving.size]
+        scaled = [None if roi is None else [[int(x * scale), int(y * scale)] for x, y in roi] for roi in roi_list]
+        geometry = get_roi_geometry(scaled, moving.shape)
+        changes = []
+        for mask in geometry.masks:
+            area = cv2.countNonZero(mask) if mask is not None else 0
+            changes.append(cv2.countNonZero(cv2.bitwise_and(moving, mask)) / area if area else 0.0)
+        return changes
+
+    def check(self, frame, timestamp=None, roi_list=None):
+        """
+        True - нужна детекция (изменения в ROI, прошло max_interval или первый кадр),
+        False - можно переиспользовать последний результат.
+        roi_list - полигоны ROI в координатах кадра (None - весь кадр)
+        """
+        if self.threshold <= 0:
+            return True
+        now = time.time() if timestamp is None else timestamp
+        gray, scale = self._small(frame)
+        self.checked += 1
+
+        if self.method == 'mog2':
+            if self.subtractor is None or self.reference is None or self.reference.shape != gray.shape:
+                self.subtractor = cv2.createBackgroundSubtractorMOG2(detectShadows=False)
+            moving = self.subtractor.apply(gray)
+            self.reference = gray
+            changed = self._changed(moving, roi_list, scale)
+        elif self.reference is None or self.reference.shape != gray.shape:
+            changed = True
+        else:
+            moving = cv2.threshold(cv2.absdiff(gray, self.reference), self.pixel_threshold, 255, cv2.THRESH_BINARY)[1]
+            changed = self._changed(moving, roi_list, scale)
+
+        if not changed and self.last_inference is not None and now - self.last_inference < self.max_interval:
+            self.skipped += 1
+            return False
+        if not changed and self.last_inference is not None:
+            self.forced += 1
+        self.last_inference = now
+        if self.method == 'diff':
+            self.reference = gray.copy()
+        return True
+
+    def _changed(self, moving, roi_list, scale):
+        self.last_changes = self._changes(moving, roi_list, scale)
+        return max(self.last_changes) > self.threshold
+
+    def get_stats(self, reset=False):
+        """Проверок, пропущенных и принудительных детекций, доля пропущенных"""
+        stats = {
+            'checked': self.checked,
+            'skipped': self.skipped,
+            'forced': self.forced,
+            'skip_ratio': self.skipped / self.checked if self.checked else 0.0
+        }
+        if reset:
+            self.checked = self.skipped = self.forced = 0
+        return stats
+
+
+def format_gate_stats(stats):
+    """Статистика MotionGate строкой: 'пропущено 812 из 1000 (81%), принудительно 20'"""
+    if not stats['checked']:
+        return 'нет проверок'
+    return (f"пропущено {stats['skipped']} из {stats['checked']} ({stats['skip_ratio']:.0%}), "
+            f"принудительно {stats['forced']}")
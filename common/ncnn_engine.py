@@ -0,0 +1,55 @@
+import os
+import numpy as np
+from common.detection_engine import DetectionEngine, input_size
+
+try:
+    import ncnn
+except ImportError:
+    ncnn = None
+
+
+def ncnn_available():
+    """Установлен ли ncnn (pip install ncnn)"""
+    return ncnn is not None
+
+
+def read_metadata(model_dir):
+    """names и imgsz из metadata.yaml каталога экспорта ultralytics (format=ncnn)"""
+    path = os.path.join(model_dir, 'metadata.yaml')
+    if not os.path.exists(path):
+        return {}
+    import yaml
+    with open(path, 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f) or {}
+
+
+class NcnnEngine(DetectionEngine):
+    """
+    Детектор YOLO (экспорт ultralytics в NCNN: каталог *_ncnn_model с model.ncnn.param,
+    model.ncnn.bin и metadata.yaml) на ncnn. Vulkan выключен - расчёт на CPU
+    """
+    def __init__(self, model_dir, imgsz=None, threads=0, **options):
+        if ncnn is None:
+            raise ImportError("ncnn не установлен (pip install ncnn)")
+        self.net = ncnn.Net()
+        self.net.opt.use_vulkan_compute = False
+        if threads:
+            self.net.opt.num_threads = threads
+        if self.net.load_param(os.path.join(model_dir, 'model.ncnn.param')) != 0 or \
+                self.net.load_model(os.path.join(model_dir, 'model.ncnn.bin')) != 0:
+            raise RuntimeError(f"Не удалось загрузить NCNN модель из {model_dir}")
+        self.model_path = model_dir
+        self.input_name = self.net.input_names()[0]
+        self.output_name = self.net.output_names()[0]
+
+        meta = read_metadata(model_dir)
+        super().__init__(input_size(imgsz or meta.get('imgsz')), meta.get('names'), **options)
+
+    def forward(self):
+        # Экстрактор одноразовый: хранит промежуточные блобы одного прогона
+        extractor = self.net.create_extractor()
+        extractor.input(self.input_name, ncnn.Mat(self.input[0]))
+        ret, output = extractor.extract(self.output_name)
+        if ret != 0:
+            raise RuntimeError(f"Ошибка NCNN extract: {ret}")
+        return np.array(output)
@@ -0,0 +1,69 @@
+import ast
+import numpy as np
+from common.detection_engine import DetectionEngine, input_size
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+
+def onnxruntime_available():
+    """Установлен ли onnxruntime (pip install onnxruntime)"""
+    return ort is not None
+
+
+def parse_meta(value, default):
+    """Метаданные экспорта ultralytics в ONNX хранятся строками Python-литералов"""
+    if not value:
+        return default
+    try:
+        return ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return default
+
+
+class OnnxEngine(DetectionEngine):
+    """
+    Детектор YOLO (экспорт ultralytics в ONNX) на onnxruntime.
+    Буферы входа и выхода привязаны к сессии один раз (IO binding):
+    на кадр не создаются новые тензоры. Модель с динамической осью batch
+    обрабатывает пакет кадров (detect_batch) за один запуск
+    """
+    def __init__(self, model_path, imgsz=None, threads=0, max_batch=1, **options):
+        if ort is None:
+            raise ImportError("onnxruntime не установлен (pip install onnxruntime)")
+        session_options = ort.SessionOptions()
+        session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            session_options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, sess_options=session_options,
+                                            providers=['CPUExecutionProvider'])
+        self.model_path = model_path
+
+        meta = self.session.get_modelmeta().custom_metadata_map
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        imgsz = input_size(imgsz or parse_meta(meta.get('imgsz'), None), model_input.shape)
+        self.supports_batch = max_batch > 1 and not isinstance(model_input.shape[0], int)
+        if max_batch > 1 and not self.supports_batch:
+            print(f"Модель {model_path} экспортирована с batch={model_input.shape[0]} - кадры пакета обрабатываются по одному "
+                  f"(для пакетов нужен экспорт с dynamic=True)")
+        super().__init__(imgsz, parse_meta(meta.get('names'), {}), max_batch=max_batch, **options)
+
+        # Форма выхода известна только после первого запуска, если в модели динамические оси
+        self.output_name = self.session.get_outputs()[0].name
+        output = self.session.run([self.output_name], {self.input_name: self.input})[0]
+        self.output = np.empty(output.shape, dtype=np.float32)
+        self.binding = self.session.io_binding()
+        self.binding.bind_input(self.input_name, 'cpu', 0, np.float32, self.input.shape, self.input.ctypes.data)
+        self.binding.bind_output(self.output_name, 'cpu', 0, np.float32, self.output.shape, self.output.ctypes.data)
+
+    def forward(self):
+        self.session.run_with_iobinding(self.binding)
+        return self.output
+
+    def forward_batch(self, count):
+        if count == 1 or not self.supports_batch:
+            return super().forward_batch(count)
+        return self.session.run([self.output_name], {self.input_name: self.inputs[:count]})[0]
@@ -0,0 +1,91 @@
+import numpy as np
+
+# Детекции в виде структурированного массива (одна строка - один бокс):
+# bbox в координатах кадра, уверенность, класс, id трека (-1 - без трекинга),
+# rois - биты ROI, к которым отнесена детекция (бит i - ROI i)
+DETECTION_DTYPE = np.dtype([
+    ('x1', np.int32), ('y1', np.int32), ('x2', np.int32), ('y2', np.int32),
+    ('conf', np.float32), ('cls', np.int16), ('track_id', np.int32), ('rois', np.uint32)
+])
+
+
+def empty_detections():
+    return np.zeros(0, dtype=DETECTION_DTYPE)
+
+
+def _to_numpy(values):
+    """Тензор (torch) или массив -> numpy: один перенос на CPU на весь результат"""
+    if hasattr(values, 'cpu'):
+        values = values.cpu().numpy()
+    return np.asarray(values)
+
+
+def results_to_array(results, offset=(0, 0), classes=None, min_conf=0.0):
+    """
+    Результаты модели (ultralytics Results) -> массив DETECTION_DTYPE.
+    xyxy / conf / cls / id забираются из результата целиком, фильтр по классам
+    и уверенности выполняется над массивами, а не по одному боксу.
+    offset - смещение изображения модели в кадре (prepare_roi_input)
+    """
+    parts = []
+    for result in results:
+        boxes = result.boxes
+        if boxes is None:
+            continue
+        xyxy = _to_numpy(boxes.xyxy).reshape(-1, 4)
+        if len(xyxy) == 0:
+            continue
+        conf = _to_numpy(boxes.conf).reshape(-1)
+        cls = _to_numpy(boxes.cls).reshape(-1).astype(np.int16)
+
+        keep = conf >= min_conf
+        if classes is not None:
+            keep &= np.isin(cls, classes)
+        if not keep.any():
+            continue
+
+        dets = np.zeros(int(keep.sum()), dtype=DETECTION_DTYPE)
+        xyxy = xyxy[keep].astype(np.int32)  # Отбрасывание дробной части, как int()
+        dets['x1'] = xyxy[:, 0] + offset[0]
+        dets['y1'] = xyxy[:, 1] + offset[1]
+        dets['x2'] = xyxy[:, 2] + offset[0]
+        dets['y2'] = xyxy[:, 3] + offset[1]
+        dets['conf'] = conf[keep]
+        dets['cls'] = cls[keep]
+        dets['track_id'] = _to_numpy(boxes.id).reshape(-1)[keep] if boxes.id is not None else -1
+        parts.append(dets)
+    return np.concatenate(parts) if parts else empty_detections()
+
+
+def boxes_xyxy(dets):
+    """Боксы детекций (N, 4)"""
+    return np.stack([dets['x1'], dets['y1'], dets['x2'], dets['y2']], axis=1)
+
+
+def box_iou(a, b):
+    """Матрица IoU (N, M) боксов a (N, 4) и b (M, 4) в формате x1, y1, x2, y2"""
+    a, b = np.asarray(a, dtype=np.float64).reshape(-1, 4), np.asarray(b, dtype=np.float64).reshape(-1, 4)
+    w = np.clip(np.minimum(a[:, None, 2], b[None, :, 2]) - np.maximum(a[:, None, 0], b[None, :, 0]), 0, None)
+    h = np.clip(np.minimum(a[:, None, 3], b[None, :, 3]) - np.maximum(a[:, None, 1], b[None, :, 1]), 0, None)
+    inter = w * h
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def bottom_centers(dets):
+    """Нижние центры боксов (N, 2) - точка опоры человека"""
+    return np.stack([(dets['x1'] + dets['x2']) // 2, dets['y2']], axis=1)
+
+
+def bbox_tuple(det):
+    """Бокс одной детекции как (x1, y1, x2, y2) из int"""
+    return int(det['x1']), int(det['y1']), int(det['x2']), int(det['y2'])
+
+
+def to_detection_info(dets, **extra):
+    """
+    Детекции в формате для отрисовки и сохранения: [{'bbox', 'confidence', ...extra}].
+    Вызывается для уже отфильтрованных детекций (обычно единицы)
+    """
+    return [dict({'bbox': bbox_tuple(det), 'confidence': float(det['conf'])}, **extra) for det in dets]
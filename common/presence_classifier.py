@@ -0,0 +1,68 @@
+import threading
+import cv2
+import numpy as np
+from common.detection_engine import input_size
+from common.onnx_engine import ort, parse_meta
+from common.roi_crop import prepare_roi_input
+
+# Классы классификатора присутствия (каталоги набора данных common.distill_presence)
+PRESENCE_CLASSES = ('absent', 'present')
+
+
+def presence_input(frame, roi=None):
+    """Вход классификатора: прямоугольник ROI с маской (crop_mask), без ROI - весь кадр. None - ROI вне кадра"""
+    image, _ = prepare_roi_input(frame, [roi] if roi is not None else None, 'crop_mask')
+    return image if image is not None and image.size else None
+
+
+class PresenceClassifier:
+    """
+    Бинарный классификатор присутствия человека в ROI на onnxruntime:
+    экспорт ultralytics YOLO-cls в ONNX, обученный common.distill_presence
+    на ответах детектора по своим записанным кадрам.
+
+    Подготовка как при проверке в ultralytics: меньшая сторона вырезки - к размеру входа,
+    центральная часть, RGB 0..1. model(image) - вероятность присутствия 0..1
+    """
+    def __init__(self, model_path, threads=0):
+        if ort is None:
+            raise ImportError("onnxruntime не установлен (pip install onnxruntime)")
+        session_options = ort.SessionOptions()
+        session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            session_options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, sess_options=session_options,
+                                            providers=['CPUExecutionProvider'])
+        self.model_path = model_path
+        self.lock = threading.Lock()
+
+        meta = self.session.get_modelmeta().custom_metadata_map
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.imgsz = input_size(parse_meta(meta.get('imgsz'), None) or 224, model_input.shape)
+        names = parse_meta(meta.get('names'), dict(enumerate(PRESENCE_CLASSES)))
+        present = [index for index, name in names.items() if name == 'present']
+        if not present:
+            raise ValueError(f"В модели {model_path} нет класса 'present': {names}")
+        self.present_index = present[0]
+        self.input = np.zeros((1, 3) + self.imgsz, dtype=np.float32)
+
+    def preprocess(self, image):
+        """Вырезка BGR -> self.input: масштаб по меньшей стороне и центральная часть размера входа"""
+        height, width = self.imgsz
+        scale = max(height / image.shape[0], width / image.shape[1])
+        new_w, new_h = max(width, round(image.shape[1] * scale)), max(height, round(image.shape[0] * scale))
+        resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        top, left = (new_h - height) // 2, (new_w - width) // 2
+        crop = resized[top:top + height, left:left + width]
+        np.multiply(crop[..., ::-1].transpose(2, 0, 1), 1 / 255.0, out=self.input[0], casting='unsafe')
+
+    def __call__(self, image):
+        with self.lock:
+            self.preprocess(image)
+            scores = self.session.run(None, {self.input_name: self.input})[0].reshape(-1)
+        if not np.isclose(scores.sum(), 1.0, atol=1e-3) or scores.min() < 0:
+            # Выход без softmax (экспорт головы не в режиме проверки)
+            scores = np.exp(scores - scores.max())
+            scores /= scores.sum()
+        return float(scores[self.present_index])
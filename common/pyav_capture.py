@@ -0,0 +1,185 @@
+import time
+import cv2
+from common.rate_meter import RateMeter
+from common.frame_geometry import FrameTransform
+from common.decode_stats import DecodeStats, attach_ffmpeg_log
+
+try:
+    import av
+except ImportError:
+    av = None
+
+# Режимы декодирования -> значение skip_frame декодера FFmpeg:
+# all - все кадры, nonref - без неопорных (B) кадров, keyframes - только I-кадры
+SKIP_FRAME = {
+    'all': 'DEFAULT',
+    'nonref': 'NONREF',
+    'keyframes': 'NONKEY'
+}
+
+
+def pyav_available():
+    """Установлен ли PyAV (pip install av)"""
+    return av is not None
+
+
+class PyAVCapture:
+    """
+    Захват видеопотока через PyAV с интерфейсом cv2.VideoCapture
+    (isOpened / grab / retrieve / read / set / get / release).
+
+    decode_mode задает, какие кадры декодер вообще декодирует (SKIP_FRAME),
+    decode_every - каждый N-й декодированный кадр отдается потребителю,
+    остальные не преобразуются в BGR.
+    output_width / crop_rect - уменьшение и обрезка кадра (FrameTransform): уменьшение
+    выполняет swscale при преобразовании в BGR, полный BGR кадр не создается.
+    decode_stats - счетчики поврежденных кадров/пакетов и потерь (DecodeStats),
+    передается из VideoStream, чтобы сохраняться между переподключениями.
+    """
+    def __init__(self, url, decode_mode='all', decode_every=1, open_timeout=10.0, read_timeout=30.0,
+                 output_width=0, crop_rect=None, decode_stats=None):
+        if decode_mode not in SKIP_FRAME:
+            raise ValueError(f"Неизвестный режим декодирования: {decode_mode}")
+        self.url = url
+        self.decode_mode = decode_mode
+        self.decode_every = max(1, int(decode_every))
+        self.open_timeout = open_timeout
+        self.read_timeout = read_timeout
+        self.output_width = output_width
+        self.crop_rect = crop_rect
+        self.transform = None
+        self.last_source = None  # Кадр PyAV в полном разрешении для последнего retrieve()
+
+        self.container = None
+        self.stream = None
+        self.frames = None
+        self.pending = None
+        self.decode_stats = decode_stats if decode_stats is not None else DecodeStats()
+
+        # Частота декодированных кадров и кадров, отданных потребителю
+        self.decode_meter = RateMeter()
+        self.output_meter = RateMeter()
+        self.open()
+
+    def open(self):
+        """Открытие потока. Возвращает False при ошибке"""
+        if av is None:
+            print(f"[{time.strftime('%H:%M:%S')}] PyAV не установлен (pip install av)")
+            return False
+        try:
+            options = {'rtsp_transport': 'tcp'} if self.url.startswith('rtsp') else {}
+            self.container = av.open(self.url, options=options, timeout=(self.open_timeout, self.read_timeout))
+            self.stream = self.container.streams.video[0]
+            self.stream.thread_type = 'AUTO'
+            self.stream.codec_context.skip_frame = SKIP_FRAME[self.decode_mode]
+            self.frames = self._decode()
+            attach_ffmpeg_log(self.decode_stats)
+            self.decode_meter.reset()
+            self.output_meter.reset()
+            return True
+        except (av.FFmpegError, IndexError, OSError) as e:
+            print(f"[{time.strftime('%H:%M:%S')}] Ошибка открытия потока через PyAV: {e}")
+            self.release()
+            return False
+
+    def _decode(self):
+        """
+        Кадры потока с учетом повреждений: флаг повреждения пакета (демультиплексор)
+        и отвергнутые декодером пакеты не прерывают декодирование
+        """
+        for packet in self.container.demux(self.stream):
+            if packet.is_corrupt:
+                self.decode_stats.add('corrupt_packets')
+            try:
+                frames = packet.decode()
+            except av.InvalidDataError:
+                self.decode_stats.add('decode_errors')
+                continue
+            for frame in frames:
+                self.decode_stats.add('frames')
+                if frame.is_corrupt:
+                    self.decode_stats.add('corrupt_frames')
+                yield frame
+
+    def isOpened(self):
+        return self.container is not None
+
+    def grab(self):
+        """Декодирование следующего отдаваемого кадра (без преобразования в BGR)"""
+        if self.frames is None:
+            return False
+        try:
+            for _ in range(self.decode_every):
+                self.pending = next(self.frames)
+                self.decode_meter.tick()
+            return True
+        except StopIteration:
+            # Поток закончился - VideoStream переподключится по isOpened()
+            self.release()
+        except (av.FFmpegError, OSError) as e:
+            print(f"[{time.strftime('%H:%M:%S')}] Ошибка чтения потока через PyAV: {e}")
+            # Генератор после исключения завершен - создаем новый на том же подключении
+            self.frames = self._decode() if self.container is not None else None
+        self.pending = None
+        return False
+
+    def retrieve(self, image=None):
+        """
+        Преобразование последнего кадра в BGR (с уменьшением и обрезкой, если заданы).
+        image - для совместимости с cv2.VideoCapture: PyAV всегда создает новый массив
+        """
+        if self.pending is None:
+            return False, None
+        if not self.output_width and not self.crop_rect:
+            image = self.pending.to_ndarray(format='bgr24')
+        else:
+            size = (self.pending.width, self.pending.height)
+            if self.transform is None or self.transform.source_size != size:
+                self.transform = FrameTransform(size[0], size[1], self.output_width, self.crop_rect)
+            width, height = self.transform.scaled_source_size()
+            scaled = self.pending.to_ndarray(width=width, height=height, format='bgr24', interpolation='AREA')
+            image = self.transform.crop_scaled(scaled)
+            self.last_source = self.pending
+        self.output_meter.tick()
+        return True, image
+
+    def read(self, image=None):
+        if not self.grab():
+            return False, None
+        return self.retrieve(image)
+
+    def set(self, prop_id, value):
+        """Параметры cv2.VideoCapture не поддерживаются (совместимость)"""
+        return False
+
+    def get(self, prop_id):
+        if self.stream is None:
+            return 0.0
+        if prop_id == cv2.CAP_PROP_FPS:
+            rate = self.stream.average_rate or self.stream.guessed_rate
+            return float(rate) if rate else 0.0
+        if prop_id == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.stream.codec_context.width)
+        if prop_id == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.stream.codec_context.height)
+        return 0.0
+
+    def sample_rate(self):
+        """Фактическая частота кадров, отдаваемых потребителю"""
+        return self.output_meter.rate()
+
+    def decode_rate(self):
+        """Фактическая частота декодированных кадров"""
+        return self.decode_meter.rate()
+
+    def release(self):
+        self.frames = None
+        self.pending = None
+        self.last_source = None
+        self.stream = None
+        if self.container is not None:
+            try:
+                self.container.close()
+            except Exception:
+                pass
+            self.container = None
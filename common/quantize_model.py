@@ -0,0 +1,125 @@
+"""
+Статическая INT8 квантизация детекторов YOLO (.onnx) по своим записанным кадрам.
+
+    cd /home/sm/cyber_chief
+    python -m common.quantize_model --model models/yolov8s.onnx --frames calibration/ --count 200
+
+--frames - видеофайл или каталог изображений с камер, на которых работает модель
+(для СИЗ и роллов - кадры своих камер). Кадры проходят тот же letterbox, что и в
+движках, диапазоны активаций собираются onnxruntime по этим кадрам. Результат -
+models/yolov8s_int8.onnx рядом с исходной моделью: его загружают сервисы при
+MODEL_PRECISION=int8. Голова Detect (последний модуль /model.N/ экспорта ultralytics)
+по умолчанию остаётся в FP32 - квантизация координат боксов даёт основную потерю точности.
+Проверка потери mAP/recall и выигрыша по задержке - common.evaluate_quantization.
+"""
+import argparse
+import os
+import re
+import tempfile
+from common.benchmark_engines import load_frames
+from common.detection_engine import DetectionEngine, input_size
+from common.inference_engine import quantized_model_path
+from common.onnx_engine import parse_meta
+
+CALIBRATION_METHODS = ('minmax', 'entropy', 'percentile')
+
+
+def detect_head_nodes(model):
+    """Узлы головы Detect: имена последнего модуля /model.N/ экспорта ultralytics"""
+    indexes = [int(m.group(1)) for m in (re.match(r'/model\.(\d+)/', node.name) for node in model.graph.node) if m]
+    if not indexes:
+        return []
+    prefix = f'/model.{max(indexes)}/'
+    return [node.name for node in model.graph.node if node.name.startswith(prefix)]
+
+
+def calibration_reader(frames, input_name, imgsz):
+    """CalibrationDataReader onnxruntime: кадры через letterbox движка в формате входа модели"""
+    from onnxruntime.quantization import CalibrationDataReader
+
+    class FramesReader(CalibrationDataReader):
+        def __init__(self):
+            self.letterbox = DetectionEngine(imgsz)
+            self.frames = iter(frames)
+
+        def get_next(self):
+            frame = next(self.frames, None)
+            if frame is None:
+                return None
+            self.letterbox.letterbox(frame)
+            return {input_name: self.letterbox.input.copy()}
+
+    return FramesReader()
+
+
+def quantize(model_path, frames, output_path=None, method='minmax', per_channel=True, keep_head=True):
+    """
+    INT8 (QDQ: веса QInt8, активации QUInt8) вариант модели model_path по кадрам frames.
+    Метаданные экспорта (names, imgsz) переносятся в результат. Возвращает путь к результату
+    """
+    import onnx
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    if method not in CALIBRATION_METHODS:
+        raise ValueError(f"Неизвестный метод калибровки: {method}")
+    output_path = output_path or quantized_model_path(model_path)
+    model = onnx.load(model_path)
+    meta = {prop.key: prop.value for prop in model.metadata_props}
+    model_input = model.graph.input[0]
+    shape = [d.dim_value or d.dim_param for d in model_input.type.tensor_type.shape.dim]
+    imgsz = input_size(parse_meta(meta.get('imgsz'), None), shape)
+    exclude = detect_head_nodes(model) if keep_head else []
+
+    fd, prepared = tempfile.mkstemp(suffix='.onnx')
+    os.close(fd)
+    try:
+        # Свёртка констант и вывод форм - без них часть узлов не квантуется (формы экспорта YOLO статические)
+        try:
+            quant_pre_process(model_path, prepared, skip_symbolic_shape=True)
+        except Exception as e:
+            print(f"Предобработка модели пропущена: {e}")
+            onnx.save(model, prepared)
+        quantize_static(
+            prepared, output_path, calibration_reader(frames, model_input.name, imgsz),
+            quant_format=QuantFormat.QDQ, per_channel=per_channel,
+            activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+            nodes_to_exclude=exclude,
+            calibrate_method={'minmax': CalibrationMethod.MinMax, 'entropy': CalibrationMethod.Entropy,
+                              'percentile': CalibrationMethod.Percentile}[method])
+    finally:
+        os.remove(prepared)
+
+    quantized = onnx.load(output_path)
+    del quantized.metadata_props[:]
+    for key, value in meta.items():
+        quantized.metadata_props.add(key=key, value=value)
+    quantized.metadata_props.add(key='quantization', value=f'int8 static {method}, calibration frames: {len(frames)}')
+    onnx.save(quantized, output_path)
+    return output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Статическая INT8 квантизация моделей детекции')
+    parser.add_argument('--model', required=True, help='Путь к модели (.onnx)')
+    parser.add_argument('--frames', required=True, help='Калибровочные кадры: видео или каталог изображений')
+    parser.add_argument('--count', type=int, default=200, help='Число калибровочных кадров')
+    parser.add_argument('--output', default=None, help='Путь результата (по умолчанию <модель>_int8.onnx)')
+    parser.add_argument('--method', default='minmax', choices=CALIBRATION_METHODS, help='Метод калибровки')
+    parser.add_argument('--per-tensor', action='store_true', help='Масштаб весов на тензор вместо канала')
+    parser.add_argument('--quantize-head', action='store_true', help='Квантовать и голову Detect')
+    args = parser.parse_args()
+
+    frames = load_frames(args.frames, args.count)
+    if not frames:
+        print(f"Не удалось загрузить кадры из {args.frames}")
+        return
+    print(f"Калибровка {args.model} по {len(frames)} кадрам ({args.method})...")
+    output = quantize(args.model, frames, args.output, args.method,
+                      per_channel=not args.per_tensor, keep_head=not args.quantize_head)
+    print(f"INT8 модель: {output} ({os.path.getsize(args.model) / 2 ** 20:.1f} -> "
+          f"{os.path.getsize(output) / 2 ** 20:.1f} МБ)")
+
+
+if __name__ == '__main__':
+    main()
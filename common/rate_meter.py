@@ -0,0 +1,25 @@
+import time
+from collections import deque
+
+
+class RateMeter:
+    """
+    Скользящая оценка частоты событий (например, кадров в секунду)
+    по последним window отметкам времени.
+    """
+    def __init__(self, window=30):
+        self.times = deque(maxlen=window)
+
+    def tick(self, now=None):
+        """Отметка события"""
+        self.times.append(time.time() if now is None else now)
+
+    def rate(self):
+        """Частота событий в секунду (0.0, если отметок недостаточно)"""
+        if len(self.times) < 2:
+            return 0.0
+        span = self.times[-1] - self.times[0]
+        return (len(self.times) - 1) / span if span > 0 else 0.0
+
+    def reset(self):
+        self.times.clear()
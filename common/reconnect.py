@@ -0,0 +1,134 @@
+import random
+import time
+import cv2
+
+
+def open_video_capture(url, open_timeout=10.0, read_timeout=30.0):
+    """
+    Открытие потока через OpenCV (FFMPEG) с ограничением времени подключения.
+    Таймауты передаются в конструктор: cap.set(CAP_PROP_OPEN_TIMEOUT_MSEC) после
+    создания VideoCapture не действует, подключение к этому моменту уже выполнено
+    """
+    params = [
+        cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, int(open_timeout * 1000),
+        cv2.CAP_PROP_READ_TIMEOUT_MSEC, int(read_timeout * 1000)
+    ]
+    try:
+        return cv2.VideoCapture(url, cv2.CAP_FFMPEG, params)
+    except (TypeError, cv2.error):
+        # OpenCV без параметров в конструкторе (< 4.5.2)
+        return cv2.VideoCapture(url, cv2.CAP_FFMPEG)
+
+
+class ReconnectState:
+    """
+    Машина состояний переподключения к камере:
+    connected -> backoff (пауза) -> connecting (попытка) -> connected или снова backoff.
+
+    Первая попытка после потери потока выполняется сразу, пауза после каждой
+    неудачной попытки растет вдвое от base_delay до max_delay, со случайным
+    разбросом ±jitter (камеры одной точки не переподключаются одновременно).
+    Число попыток не ограничено - поток захвата не завершается.
+
+    Счетчики: задержка переподключения (от обнаружения потери потока до подключения)
+    и простой (от последнего валидного кадра до подключения).
+    """
+    CONNECTED = 'connected'
+    BACKOFF = 'backoff'
+    CONNECTING = 'connecting'
+
+    def __init__(self, base_delay=1.0, max_delay=60.0, jitter=0.2):
+        self.base_delay = max(0.1, base_delay)
+        self.max_delay = max(self.base_delay, max_delay)
+        self.jitter = jitter
+
+        self.state = self.CONNECTED
+        self.failures = 0            # Неудачных попыток подряд
+        self.next_attempt_time = 0
+        self.disconnected_at = None  # Когда обнаружена потеря потока
+        self.outage_start = None     # Последний валидный кадр перед потерей
+
+        self.outages = 0             # Сколько раз терялся поток
+        self.reconnects = 0          # Успешных переподключений
+        self.total_attempts = 0
+        self.last_latency = None
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+        self.total_downtime = 0.0
+
+    @property
+    def is_connected(self):
+        return self.state == self.CONNECTED
+
+    def disconnect(self, now=None, last_frame_time=None):
+        """Поток потерян: переход в backoff, первая попытка - сразу"""
+        if not self.is_connected:
+            return
+        now = now or time.time()
+        self.state = self.BACKOFF
+        self.failures = 0
+        self.next_attempt_time = now
+        self.disconnected_at = now
+        self.outage_start = min(last_frame_time or now, now)
+        self.outages += 1
+
+    def delay_remaining(self, now=None):
+        """Сколько секунд осталось до следующей попытки"""
+        if self.is_connected:
+            return 0.0
+        return max(0.0, self.next_attempt_time - (now or time.time()))
+
+    def begin_attempt(self):
+        """Начало попытки подключения. Возвращает номер попытки в текущей серии"""
+        self.state = self.CONNECTING
+        self.total_attempts += 1
+        return self.failures + 1
+
+    def attempt_failed(self, now=None):
+        """Попытка не удалась. Возвращает паузу до следующей попытки (сек)"""
+        now = now or time.time()
+        self.failures += 1
+        delay = min(self.max_delay, self.base_delay * 2 ** (self.failures - 1))
+        delay *= random.uniform(1.0 - self.jitter, 1.0 + self.jitter)
+        self.state = self.BACKOFF
+        self.next_attempt_time = now + delay
+        return delay
+
+    def attempt_succeeded(self, now=None):
+        """Камера подключена. Возвращает задержку переподключения (сек)"""
+        now = now or time.time()
+        if self.disconnected_at is None:
+            # Первое подключение при запуске не считается переподключением
+            self.state = self.CONNECTED
+            self.failures = 0
+            return 0.0
+        latency = now - self.disconnected_at
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency, latency)
+        self.total_latency += latency
+        self.total_downtime += now - self.outage_start
+        self.reconnects += 1
+
+        self.state = self.CONNECTED
+        self.failures = 0
+        self.disconnected_at = None
+        self.outage_start = None
+        return latency
+
+    def get_stats(self, now=None):
+        """Статистика переподключений (время в секундах)"""
+        now = now or time.time()
+        current_downtime = now - self.outage_start if self.outage_start is not None else 0.0
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'next_attempt_in': self.delay_remaining(now),
+            'outages': self.outages,
+            'reconnects': self.reconnects,
+            'total_attempts': self.total_attempts,
+            'last_latency': self.last_latency,
+            'avg_latency': self.total_latency / self.reconnects if self.reconnects else None,
+            'max_latency': self.max_latency,
+            'current_downtime': current_downtime,
+            'total_downtime': self.total_downtime + current_downtime
+        }
@@ -0,0 +1,58 @@
+import cv2
+from common.roi_geometry import get_roi_geometry
+
+# Подготовка кадра для детектора при заданных ROI:
+# mask - весь кадр, вне ROI залито черным (модель уменьшает весь кадр до своего входа);
+# crop - только ограничивающий прямоугольник ROI (меньше пикселей, люди крупнее на входе модели);
+# crop_mask - прямоугольник ROI, внутри него вне полигонов залито черным
+ROI_INFERENCE_MODES = ('mask', 'crop', 'crop_mask')
+
+
+def prepare_roi_input(frame, roi_list, mode='crop_mask', padding=0):
+    """
+    Кадр для детектора с учетом ROI (режимы ROI_INFERENCE_MODES).
+    Возвращает (изображение, (dx, dy)): координаты детекций на изображении переводятся
+    в координаты кадра через shift_bbox(). Изображение None - ROI вне кадра.
+    Без ROI возвращается исходный кадр
+    """
+    if mode not in ROI_INFERENCE_MODES:
+        raise ValueError(f"Неизвестный режим детекции по ROI: {mode}")
+    if not roi_list or all(roi_points is None for roi_points in roi_list):
+        return frame, (0, 0)
+
+    geometry = get_roi_geometry(roi_list, frame.shape)
+    if mode == 'mask':
+        return cv2.bitwise_and(frame, frame, mask=geometry.mask), (0, 0)
+
+    rect = geometry.bounding_rect(padding=padding)
+    if rect is None:
+        return None, (0, 0)
+    x1, y1, x2, y2 = rect
+    crop = frame[y1:y2, x1:x2]
+    if mode == 'crop_mask':
+        crop = cv2.bitwise_and(crop, crop, mask=geometry.mask[y1:y2, x1:x2])
+    return crop, (x1, y1)
+
+
+def shift_bbox(bbox, offset):
+    """Bounding box с изображения prepare_roi_input() в координатах кадра"""
+    dx, dy = offset
+    x1, y1, x2, y2 = bbox
+    return x1 + dx, y1 + dy, x2 + dx, y2 + dy
+
+
+def box_crops(frame, boxes, padding=0.15):
+    """
+    Вырезки кадра по боксам (x1, y1, x2, y2) с отступом padding от размера бокса
+    в границах кадра. Возвращает список (изображение, (dx, dy)) - смещения для shift_bbox()
+    и results_to_array(); пустые вырезки пропускаются
+    """
+    height, width = frame.shape[:2]
+    crops = []
+    for x1, y1, x2, y2 in boxes:
+        pad_x, pad_y = int((x2 - x1) * padding), int((y2 - y1) * padding)
+        x1, y1 = max(0, int(x1) - pad_x), max(0, int(y1) - pad_y)
+        x2, y2 = min(width, int(x2) + pad_x), min(height, int(y2) + pad_y)
+        if x2 > x1 and y2 > y1:
+            crops.append((frame[y1:y2, x1:x2], (x1, y1)))
+    return crops
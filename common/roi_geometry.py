@@ -0,0 +1,130 @@
+import threading
+import cv2
+import numpy as np
+
+
+class RoiGeometry:
+    """
+    Геометрия набора ROI, построенная один раз для размера кадра.
+
+    masks / mask - маски отдельных ROI и их объединения (255 внутри),
+    rects / rect - ограничивающие прямоугольники (x1, y1, x2, y2) в границах кадра (None - ROI вне кадра),
+    labels - растр битов принадлежности: бит i установлен в пикселях ROI i
+    (перекрывающиеся ROI не мешают друг другу), проверка точки - одно чтение массива.
+    Проверки принимают массивы точек/боксов и выполняются для всех сразу.
+    Точки вне кадра не принадлежат ни одной ROI.
+    """
+    def __init__(self, roi_list, frame_shape):
+        self.shape = tuple(frame_shape[:2])
+        self.roi_list = roi_list
+        self.count = len(roi_list)
+        dtype = np.uint8 if self.count <= 8 else np.uint16 if self.count <= 16 else np.uint32
+        self.labels = np.zeros(self.shape, dtype=dtype)
+        self.masks = []
+        self.rects = []
+        self._integrals = None  # Интегральные изображения масок (строятся при первом box_coverage)
+
+        for i, roi_points in enumerate(roi_list):
+            if roi_points is None:
+                self.masks.append(None)
+                self.rects.append(None)
+                continue
+            pts = np.array(roi_points, dtype=np.int32).reshape(-1, 2)
+            mask = np.zeros(self.shape, dtype=np.uint8)
+            cv2.fillPoly(mask, [pts], 255)
+            self.labels[mask > 0] |= dtype(1 << i)
+            self.masks.append(mask)
+            self.rects.append(self._mask_rect(mask))
+
+        self.mask = np.where(self.labels > 0, 255, 0).astype(np.uint8)
+        self.rect = self._mask_rect(self.mask)
+
+    @staticmethod
+    def _mask_rect(mask):
+        if not mask.any():
+            return None
+        x, y, w, h = cv2.boundingRect(mask)
+        return x, y, x + w, y + h
+
+    def bounding_rect(self, index=None, padding=0):
+        """Ограничивающий прямоугольник ROI index (None - всех ROI) с отступом padding в границах кадра"""
+        rect = self.rect if index is None else self.rects[index]
+        if rect is None or not padding:
+            return rect
+        x1, y1, x2, y2 = rect
+        return (max(0, x1 - padding), max(0, y1 - padding),
+                min(self.shape[1], x2 + padding), min(self.shape[0], y2 + padding))
+
+    def labels_at(self, points):
+        """Биты принадлежности ROI для массива точек (N, 2) -> (N,)"""
+        points = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+        x, y = points[:, 0], points[:, 1]
+        inside = (x >= 0) & (x < self.shape[1]) & (y >= 0) & (y < self.shape[0])
+        result = np.zeros(len(points), dtype=self.labels.dtype)
+        result[inside] = self.labels[y[inside], x[inside]]
+        return result
+
+    def contains(self, points, index=None):
+        """Точки (N, 2) внутри ROI index (None - любой ROI) -> bool (N,)"""
+        labels = self.labels_at(points)
+        if index is None:
+            return labels > 0
+        return (labels >> index) & 1 > 0
+
+    def roi_membership(self, points):
+        """Принадлежность точек (N, 2) каждой ROI -> bool (N, число ROI)"""
+        labels = self.labels_at(points)
+        return (labels[:, None] >> np.arange(self.count, dtype=labels.dtype)) & 1 > 0
+
+    def box_coverage(self, boxes):
+        """
+        Доля площади боксов (N, 4: x1, y1, x2, y2) внутри каждой ROI -> (N, число ROI).
+        Площадь пересечения с маской - 4 чтения интегрального изображения на бокс
+        """
+        if self._integrals is None:
+            self._integrals = [cv2.integral(mask // 255) if mask is not None else None for mask in self.masks]
+        boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+        h, w = self.shape
+        x1, x2 = np.clip(boxes[:, 0], 0, w), np.clip(boxes[:, 2], 0, w)
+        y1, y2 = np.clip(boxes[:, 1], 0, h), np.clip(boxes[:, 3], 0, h)
+        area = np.maximum(1, (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1]))
+        coverage = np.zeros((len(boxes), self.count))
+        for i, integral in enumerate(self._integrals):
+            if integral is not None:
+                inside = integral[y2, x2] - integral[y1, x2] - integral[y2, x1] + integral[y1, x1]
+                coverage[:, i] = np.maximum(inside, 0) / area
+        return coverage
+
+    def box_touches(self, boxes, index=None):
+        """Углы или центр боксов (N, 4) внутри ROI index (None - любой ROI) -> bool (N,)"""
+        boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+        x1, y1, x2, y2 = boxes.T
+        points = np.stack([
+            np.stack([x1, y1], 1), np.stack([x2, y1], 1), np.stack([x2, y2], 1),
+            np.stack([x1, y2], 1), np.stack([(x1 + x2) // 2, (y1 + y2) // 2], 1)
+        ], 1)
+        return self.contains(points.reshape(-1, 2), index).reshape(-1, 5).any(axis=1)
+
+
+def box_centers(boxes):
+    """Центры боксов (N, 4) -> (N, 2)"""
+    boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+    return np.stack([(boxes[:, 0] + boxes[:, 2]) // 2, (boxes[:, 1] + boxes[:, 3]) // 2], 1)
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def get_roi_geometry(roi_list, frame_shape):
+    """
+    RoiGeometry для списка ROI и размера кадра - строится при первом запросе,
+    дальше берется из кэша (ROI сравниваются по значению)
+    """
+    key = (tuple(frame_shape[:2]), repr(roi_list))
+    with _cache_lock:
+        geometry = _cache.get(key)
+        if geometry is None:
+            geometry = RoiGeometry(roi_list, frame_shape)
+            _cache[key] = geometry
+        return geometry
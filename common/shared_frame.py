@@ -0,0 +1,391 @@
+import os
+import time
+import struct
+import hashlib
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+from common.frame_view import make_frame_view
+from common.rate_meter import RateMeter
+from common.frame_quality import FrameQualityGate
+
+# Раскладка заголовка сегмента общей памяти.
+# Поле seq работает как seqlock: нечетное значение - идет запись кадра.
+# Поле frame_seq - порядковый номер опубликованного кадра.
+# Поле generation - случайный номер экземпляра брокера: после перезапуска брокер
+# создает сегмент с тем же именем, и подписчики отличают его от старого по generation.
+HEADER_FORMAT = '<8sQQddIIIIIdIIdIIQ'
+HEADER_FIELDS = (
+    'magic', 'seq', 'frame_seq', 'frame_time', 'heartbeat',
+    'height', 'width', 'channels',
+    'is_opened', 'reconnect_attempts', 'last_valid_frame_time',
+    'total_errors', 'recent_errors', 'last_error',
+    'window_size', 'threshold', 'generation'
+)
+HEADER_SIZE = 128
+MAGIC = b'CCFRAME2'
+SEQ_OFFSET = 8
+
+# Через сколько секунд без heartbeat брокер считается остановленным
+BROKER_STALE_TIMEOUT = 5.0
+
+# Как часто подписчик с устаревшим заголовком проверяет, не пересоздан ли сегмент (сек)
+BROKER_REATTACH_INTERVAL = 1.0
+
+# Период проверки заголовка при ожидании нового кадра от брокера
+# (между процессами нет общей условной переменной)
+BROKER_POLL_INTERVAL = 0.02
+
+
+def segment_name(rtsp_url):
+    """Имя сегмента общей памяти для RTSP URL (одна камера - один сегмент)"""
+    digest = hashlib.sha1(rtsp_url.encode('utf-8')).hexdigest()[:16]
+    return f"cyber_frame_{digest}"
+
+
+def attach_segment(name):
+    """
+    Подключение к существующему сегменту без регистрации в resource_tracker,
+    иначе подписчик удалит сегмент брокера при своем завершении.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13: параметра track нет
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        except Exception:
+            pass
+        return shm
+
+
+class SharedFrameWriter:
+    """
+    Публикация последнего декодированного кадра камеры в общую память.
+    Используется процессом брокера кадров (frame_broker).
+    """
+    def __init__(self, rtsp_url, max_width, max_height, channels=3):
+        self.rtsp_url = rtsp_url
+        self.name = segment_name(rtsp_url)
+        self.capacity = max_width * max_height * channels
+        self.seq = 0
+        self.oversize_reported = False
+
+        # Остатки сегмента от аварийно завершенного брокера удаляем
+        try:
+            stale = attach_segment(self.name)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+
+        self.shm = shared_memory.SharedMemory(name=self.name, create=True, size=HEADER_SIZE + self.capacity)
+        self.data = np.ndarray((self.capacity,), dtype=np.uint8, buffer=self.shm.buf, offset=HEADER_SIZE)
+        self.header = {
+            'magic': MAGIC, 'seq': 0, 'frame_seq': 0, 'frame_time': 0.0, 'heartbeat': time.time(),
+            'height': 0, 'width': 0, 'channels': 0,
+            'is_opened': 0, 'reconnect_attempts': 0, 'last_valid_frame_time': 0.0,
+            'total_errors': 0, 'recent_errors': 0, 'last_error': 0.0,
+            'window_size': 0, 'threshold': 0,
+            'generation': int.from_bytes(os.urandom(8), 'little')
+        }
+        self._write_header()
+
+    def _write_header(self):
+        self.header['seq'] = self.seq
+        struct.pack_into(HEADER_FORMAT, self.shm.buf, 0, *(self.header[f] for f in HEADER_FIELDS))
+
+    def _set_status(self, status):
+        """Перенос статуса VideoStream.get_status() в поля заголовка"""
+        if not status:
+            return
+        errors = status.get('decode_errors', {})
+        self.header['is_opened'] = int(bool(status.get('is_opened', False)))
+        self.header['reconnect_attempts'] = int(status.get('reconnect_attempts', 0))
+        self.header['last_valid_frame_time'] = time.time() - status.get('last_valid_frame', 0)
+        self.header['total_errors'] = int(errors.get('total_errors', 0))
+        self.header['recent_errors'] = int(errors.get('recent_errors', 0))
+        self.header['last_error'] = float(errors.get('last_error', 0))
+        self.header['window_size'] = int(errors.get('window_size', 0))
+        self.header['threshold'] = int(errors.get('threshold', 0))
+
+    def publish(self, frame, status=None):
+        """Запись нового кадра. Возвращает False, если кадр не помещается в сегмент"""
+        if frame.nbytes > self.capacity:
+            if not self.oversize_reported:
+                print(f"[{time.strftime('%H:%M:%S')}] Кадр {frame.shape} больше сегмента брокера "
+                      f"({self.capacity} байт). Увеличьте FRAME_BROKER_MAX_WIDTH/HEIGHT.")
+                self.oversize_reported = True
+            return False
+
+        height, width = frame.shape[:2]
+        channels = frame.shape[2] if frame.ndim == 3 else 1
+
+        # Нечетный seq - подписчики не читают кадр, пока идет запись
+        self.seq += 1
+        struct.pack_into('<Q', self.shm.buf, SEQ_OFFSET, self.seq)
+
+        self.data[:frame.nbytes] = frame.reshape(-1)
+        now = time.time()
+        self.header.update({
+            'frame_seq': self.header['frame_seq'] + 1,
+            'frame_time': now, 'heartbeat': now,
+            'height': height, 'width': width, 'channels': channels
+        })
+        self._set_status(status)
+
+        self.seq += 1
+        self._write_header()
+        return True
+
+    def heartbeat(self, status=None):
+        """Обновление статуса камеры без нового кадра (брокер жив)"""
+        self.header['heartbeat'] = time.time()
+        self._set_status(status)
+        self.seq += 1
+        struct.pack_into('<Q', self.shm.buf, SEQ_OFFSET, self.seq)
+        self.seq += 1
+        self._write_header()
+
+    def close(self):
+        """Удаление сегмента"""
+        try:
+            self.data = None
+            self.shm.close()
+            self.shm.unlink()
+        except Exception:
+            pass
+
+
+def _unpack_header(shm):
+    header = dict(zip(HEADER_FIELDS, struct.unpack_from(HEADER_FORMAT, shm.buf, 0)))
+    return header if header['magic'] == MAGIC else None
+
+
+class SharedFrameReader:
+    """
+    Чтение последнего кадра камеры из общей памяти брокера.
+    После перезапуска брокера сегмент с тем же именем создается заново, а подключенный
+    остается у подписчика без обновлений - reattach() переходит на новый сегмент
+    """
+    def __init__(self, rtsp_url):
+        self.rtsp_url = rtsp_url
+        self.name = segment_name(rtsp_url)
+        self.shm = None
+        self.data = None
+        self.generation = None  # generation подключенного сегмента
+
+    def attach(self):
+        """Подключение к сегменту. Возвращает False, если брокер еще не создал его"""
+        if self.shm is not None:
+            return True
+        try:
+            shm = attach_segment(self.name)
+        except (FileNotFoundError, ValueError):
+            # ValueError - сегмент только что создан и еще не получил размер
+            return False
+        self._use(shm)
+        return True
+
+    def _use(self, shm):
+        self.close()
+        self.shm = shm
+        self.data = np.ndarray((shm.size - HEADER_SIZE,), dtype=np.uint8, buffer=shm.buf, offset=HEADER_SIZE)
+        header = _unpack_header(shm)
+        self.generation = header['generation'] if header is not None else None
+
+    def reattach(self):
+        """
+        Проверка сегмента по имени: если брокер пересоздал его (другой generation)
+        или удалил, старый сегмент отключается. Возвращает True при переходе на новый сегмент
+        """
+        try:
+            shm = attach_segment(self.name)
+        except (FileNotFoundError, ValueError):
+            self.close()
+            return False
+        header = _unpack_header(shm)
+        if self.shm is not None and header is not None and header['generation'] == self.generation:
+            shm.close()
+            return False
+        self._use(shm)
+        return True
+
+    def read_header(self):
+        """Чтение заголовка сегмента (без кадра)"""
+        if not self.attach():
+            return None
+        header = _unpack_header(self.shm)
+        if header is None:
+            # Чужая раскладка или сегмент еще не заполнен - подключимся заново при следующем чтении
+            self.close()
+            return None
+        if header['generation'] != self.generation:
+            self.generation = header['generation']
+        return header
+
+    def read(self, retries=5):
+        """
+        Согласованное чтение кадра по seqlock.
+        Возвращает (header, frame) или (header, None), если кадра нет.
+        """
+        for _ in range(retries):
+            header = self.read_header()
+            if header is None:
+                return None, None
+            seq = header['seq']
+            if seq & 1:
+                time.sleep(0.001)
+                continue
+            if header['height'] == 0:
+                return header, None
+
+            shape = (header['height'], header['width'], header['channels'])
+            size = shape[0] * shape[1] * shape[2]
+            frame = self.data[:size].copy().reshape(shape)
+
+            if struct.unpack_from('<Q', self.shm.buf, SEQ_OFFSET)[0] == seq:
+                if shape[2] == 1:
+                    frame = frame.reshape(shape[:2])
+                return header, frame
+        return header, None
+
+    def close(self):
+        """Отключение от сегмента (сам сегмент остается у брокера)"""
+        if self.shm is not None:
+            self.data = None
+            try:
+                self.shm.close()
+            except Exception:
+                pass
+            self.shm = None
+            self.generation = None
+
+
+class BrokerVideoStream:
+    """
+    Подписка на кадры камеры из брокера кадров (frame_broker).
+    Повторяет контракт VideoStream: start() / read() / get_status() / release(),
+    но не открывает RTSP поток и не декодирует видео в процессе сервиса.
+    """
+    def __init__(self, rtsp_url, stale_timeout=BROKER_STALE_TIMEOUT, quality_threshold=0):
+        self.rtsp_url = rtsp_url
+        self.stale_timeout = stale_timeout
+        self.reader = SharedFrameReader(rtsp_url)
+        self.last_header = None
+        self.attach_reported = False
+        self.last_frame_seq = None
+        self.last_reattach = 0
+        # Номера кадров для FrameView растут и после перезапуска брокера (frame_seq нового сегмента - с 1)
+        self.generation = None
+        self.seq_base = 0
+        self.max_seq = 0
+        self.sample_meter = RateMeter()
+        self.quality_gate = FrameQualityGate(quality_threshold)
+
+    def start(self):
+        """Подключение к брокеру (если брокер еще не запущен - подключимся при чтении)"""
+        if not self.reader.attach():
+            print(f"[{time.strftime('%H:%M:%S')}] Брокер кадров не публикует поток {self.rtsp_url[:50]}... Ожидание.")
+            self.attach_reported = True
+        return self
+
+    def _broker_alive(self, header):
+        if header is not None and time.time() - header['heartbeat'] <= self.stale_timeout:
+            return True
+        # Брокер мог перезапуститься с новым сегментом под тем же именем - раз в
+        # BROKER_REATTACH_INTERVAL проверяем сегмент по имени
+        now = time.time()
+        if now - self.last_reattach >= BROKER_REATTACH_INTERVAL:
+            self.last_reattach = now
+            if self.reader.reattach():
+                print(f"[{time.strftime('%H:%M:%S')}] Брокер кадров перезапущен, подключено к новому сегменту")
+        return False
+
+    def _seq(self, header):
+        """Номер кадра подписки: frame_seq сегмента плюс номера кадров прежних экземпляров брокера"""
+        if header['generation'] != self.generation:
+            if self.generation is not None:
+                self.seq_base = self.max_seq
+            self.generation = header['generation']
+        seq = header['frame_seq'] + self.seq_base
+        self.max_seq = max(self.max_seq, seq)
+        return seq
+
+    def read(self):
+        """Чтение последнего кадра"""
+        header, frame = self.reader.read()
+        if header is not None and self.attach_reported:
+            print(f"[{time.strftime('%H:%M:%S')}] Подключено к брокеру кадров")
+            self.attach_reported = False
+        self.last_header = header
+        if frame is None or not self._broker_alive(header):
+            return False, None
+        seq = self._seq(header)
+        if seq != self.last_frame_seq:
+            self.last_frame_seq = seq
+            self.sample_meter.tick(header['frame_time'])
+        return True, frame
+
+    def read_view(self):
+        """
+        Чтение последнего кадра как FrameView. Кадр копируется из общей памяти
+        один раз (иначе брокер перезапишет его), дальше копий нет
+        """
+        ret, frame = self.read()
+        if not ret:
+            return False, None
+        return True, make_frame_view(frame, self.last_frame_seq, self.last_header['frame_time'])
+
+    def wait_for_new_frame(self, timeout=None, after_seq=None):
+        """
+        Ожидание кадра новее after_seq (None - новее текущего).
+        Возвращает (True, FrameView) или (False, None) по таймауту
+        """
+        if after_seq is None:
+            header = self.reader.read_header()
+            after_seq = self._seq(header) if header is not None else 0
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            header = self.reader.read_header()
+            if self._broker_alive(header) and self._seq(header) != after_seq:
+                return self.read_view()
+            if deadline is not None and time.time() >= deadline:
+                return False, None
+            time.sleep(BROKER_POLL_INTERVAL)
+
+    def stop(self):
+        """Совместимость с VideoStream"""
+        pass
+
+    def release(self):
+        """Отключение от брокера"""
+        self.reader.close()
+        print(f"[{time.strftime('%H:%M:%S')}] Подписка на брокер кадров остановлена")
+
+    def get_status(self):
+        """Возвращает статус видеопотока в формате VideoStream.get_status()"""
+        header = self.reader.read_header()
+        alive = self._broker_alive(header)
+        if header is None:
+            header = dict.fromkeys(HEADER_FIELDS, 0)
+        return {
+            'is_opened': alive and bool(header['is_opened']),
+            'reconnect_attempts': header['reconnect_attempts'],
+            'last_valid_frame': time.time() - header['last_valid_frame_time'],
+            'frame_buffer_size': 1 if alive and header['height'] else 0,
+            'decode_errors': {
+                'total_errors': header['total_errors'],
+                'recent_errors': header['recent_errors'],
+                'last_error': header['last_error'],
+                'window_size': header['window_size'],
+                'threshold': header['threshold']
+            },
+            'sample_rate': self.sample_meter.rate(),
+            'frame_quality': self.quality_gate.get_stats(),
+            'broker_alive': alive
+        }
+
+    def check_frame(self, frame_view):
+        """Пригоден ли кадр для детекции (FrameQualityGate)"""
+        return self.quality_gate.check(frame_view.frame)
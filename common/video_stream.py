@@ -0,0 +1,439 @@
+import cv2
+import time
+import threading
+from collections import deque
+from common.frame_view import make_frame_view
+from common.frame_pool import FramePool
+from common.pyav_capture import PyAVCapture, pyav_available
+from common.rate_meter import RateMeter
+from common.frame_quality import FrameQualityGate
+from common.decode_stats import DecodeStats
+from common.reconnect import ReconnectState, open_video_capture
+
+class DecodeErrorMonitor:
+    """
+    Мониторинг ошибок декодирования по счетчикам декодера (DecodeStats):
+    поврежденные кадры и пакеты, отвергнутые пакеты и потери RTP.
+    Счетчики повреждений ведет бэкенд PyAV; для OpenCV учитываются только
+    неудачные чтения кадра (ошибки его FFmpeg видны только в stderr)
+    """
+    def __init__(self, window=180, threshold=10, reconnect_on_error=True):
+        self.window = window
+        self.threshold = threshold
+        self.reconnect_on_error = reconnect_on_error
+        self.stats = DecodeStats(window)
+    
+    def record(self, field, count=1):
+        """Учет события (поле DecodeStats)"""
+        self.stats.add(field, count)
+    
+    def should_reconnect(self):
+        """
+        Проверяет, нужно ли переподключаться: событий повреждения
+        за window секунд не меньше threshold
+        """
+        if not self.reconnect_on_error:
+            return False
+        
+        recent_errors = self.stats.recent_errors()
+        if recent_errors >= self.threshold:
+            # Сбрасываем окно после принятия решения о переподключении
+            self.stats.clear_recent()
+            print(f"[{time.strftime('%H:%M:%S')}] Превышен порог ошибок: {recent_errors}/{self.threshold} за {self.window} сек")
+            return True
+        
+        return False
+    
+    def get_error_stats(self):
+        """Возвращает статистику ошибок"""
+        stats = self.stats.get_stats()
+        stats['window_size'] = self.window
+        stats['threshold'] = self.threshold
+        return stats
+
+
+class VideoStream:
+    """
+    Класс для захвата видео в отдельном потоке с механизмом переподключения
+    и мониторингом ошибок декодирования. Общий для сервисов и брокера кадров:
+    настройки передаются параметрами (в сервисах - из их config, см. video_stream сервиса)
+    """
+    def __init__(self, rtsp_url, buffer_size=1, reconnect_timeout=5, max_reconnect_attempts=10,
+                 reconnect_max_delay=120.0, open_timeout=10.0, capture_mode='read', retrieve_interval=None,
+                 backend='opencv', decode_mode='all', decode_every=1, quality_threshold=0.0,
+                 decode_error_threshold=10, decode_error_window=180, reconnect_on_decode_error=False):
+        self.rtsp_url = rtsp_url
+        self.buffer_size = buffer_size
+        self.reconnect_timeout = reconnect_timeout
+        self.max_reconnect_attempts = max_reconnect_attempts
+        self.open_timeout = open_timeout
+        
+        # Режим захвата: 'read' - декодирование каждого кадра в BGR,
+        # 'grab' - поток вычитывается grab(), retrieve() только по запросу или раз в retrieve_interval
+        self.capture_mode = capture_mode
+        self.retrieve_interval = retrieve_interval
+        self.retrieve_timeout = 2.0
+        self.retrieve_requested = threading.Event()
+        self.last_retrieve_time = 0
+        
+        # Бэкенд декодирования: 'opencv' или 'pyav' (режимы keyframes/nonref и прореживание кадров)
+        self.backend = backend
+        if self.backend == 'pyav' and not pyav_available():
+            print("PyAV не установлен (pip install av), используется OpenCV")
+            self.backend = 'opencv'
+        self.decode_mode = decode_mode if self.backend == 'pyav' else 'all'
+        self.decode_every = decode_every
+        self.sample_meter = RateMeter()  # Фактическая частота кадров для детекции
+        self.quality_gate = FrameQualityGate(quality_threshold)  # Пропуск поврежденных кадров перед детекцией
+        
+        # Переподключение: пауза между попытками растет от reconnect_timeout до reconnect_max_delay,
+        # max_reconnect_attempts - после стольких неудач подряд выводится предупреждение
+        self.reconnect_state = ReconnectState(reconnect_timeout, reconnect_max_delay)
+        self.decode_error_monitor = DecodeErrorMonitor(decode_error_window, decode_error_threshold,
+                                                       reconnect_on_decode_error)
+        self.last_reconnect_time = 0
+        self.reconnect_cooldown = 30  # Минимальное время между переподключениями (сек)
+        
+        self.cap = None
+        if not self.initialize_capture():
+            self.reconnect_state.disconnect()
+        
+        # Буфер для хранения последнего кадра
+        self.frame_buffer = deque(maxlen=self.buffer_size)  # История последних кадров (FrameView)
+        self.frame_pool = FramePool(0 if self.backend == 'pyav' else self.buffer_size + 2)  # Слоты для декодера: история + кадр у потребителя + декодируемый
+        self.lock = threading.Lock()
+        self.new_frame = threading.Condition(self.lock)
+        self.stopped = False
+        self.grabbed = False
+        self.current_frame = None
+        self.last_valid_frame_time = time.time()
+        self.last_status_check = time.time()
+        self.frame_seq = 0  # Порядковый номер последнего кадра
+        self.latest_view = None
+        
+    def initialize_capture(self):
+        """Инициализация захвата видео с обработкой ошибок"""
+        try:
+            if self.cap is not None:
+                self.cap.release()
+                self.cap = None
+                
+            print(f"[{time.strftime('%H:%M:%S')}] Подключение к камере: {self.rtsp_url[:50]}...")
+            
+            self.cap = self.open_capture()
+            
+            # Устанавливаем параметры для уменьшения проблем
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            
+            # Проверяем, открылось ли видео
+            if not self.cap.isOpened():
+                raise Exception("Не удалось открыть RTSP поток")
+            
+            # Пробуем прочитать первый кадр для проверки
+            for _ in range(3):  # 3 попытки
+                grabbed, _ = self.cap.read()
+                if grabbed:
+                    break
+                time.sleep(0.1)
+            
+            print(f"[{time.strftime('%H:%M:%S')}] Камера успешно подключена")
+            return True
+            
+        except Exception as e:
+            # Неудачное подключение учитывает ReconnectState, это не ошибка декодирования
+            print(f"[{time.strftime('%H:%M:%S')}] Ошибка инициализации камеры: {e}")
+            return False
+    
+    def open_capture(self, **pyav_options):
+        """
+        Открытие потока выбранным бэкендом. pyav_options - дополнительные параметры PyAVCapture
+        (подклассы передают уменьшение и обрезку кадра при декодировании)
+        """
+        # Таймаут подключения ограничивает время одной попытки переподключения
+        if self.backend == 'pyav':
+            return PyAVCapture(self.rtsp_url, decode_mode=self.decode_mode, decode_every=self.decode_every,
+                               open_timeout=self.open_timeout, decode_stats=self.decode_error_monitor.stats,
+                               **pyav_options)
+        return open_video_capture(self.rtsp_url, open_timeout=self.open_timeout)
+    
+    def transform_frame(self, frame):
+        """
+        Преобразование кадра перед публикацией. Возвращает (кадр, кадр источника, FrameTransform);
+        без преобразования - (кадр, None, None). Подклассы уменьшают/обрезают кадр для детекции
+        """
+        return frame, None, None
+    
+    def check_decode_errors(self):
+        """Проверяет необходимость переподключения из-за ошибок декодирования"""
+        # Проверяем статистику ошибок
+        if not self.decode_error_monitor.reconnect_on_error:
+            return False
+        
+        if self.decode_error_monitor.should_reconnect():
+            current_time = time.time()
+            
+            # Проверяем, не переподключались ли мы недавно
+            if current_time - self.last_reconnect_time > self.reconnect_cooldown:
+                return True
+        
+        return False
+    
+    def reconnect(self, reason=None):
+        """
+        Шаг переподключения к камере (без рекурсии). При потере потока камера освобождается,
+        дальше - одна попытка подключения после паузы backoff (ReconnectState).
+        Пауза прерывается stop(). Возвращает True, если камера подключена
+        """
+        now = time.time()
+        if self.reconnect_state.is_connected:
+            if reason:
+                print(f"[{time.strftime('%H:%M:%S')}] {reason}. Переподключение...")
+            self.last_reconnect_time = now
+            self.reconnect_state.disconnect(now, self.last_valid_frame_time)
+            if self.cap is not None:
+                self.cap.release()
+                self.cap = None
+        
+        delay = self.reconnect_state.delay_remaining(now)
+        if delay > 0:
+            with self.lock:
+                self.new_frame.wait_for(lambda: self.stopped, timeout=delay)
+            if self.stopped:
+                return False
+        
+        attempt = self.reconnect_state.begin_attempt()
+        print(f"[{time.strftime('%H:%M:%S')}] Попытка переподключения {attempt}...")
+        
+        if self.initialize_capture():
+            latency = self.reconnect_state.attempt_succeeded()
+            self.last_valid_frame_time = time.time()
+            print(f"[{time.strftime('%H:%M:%S')}] Переподключение успешно (камера недоступна {latency:.1f} сек)")
+            return True
+        
+        delay = self.reconnect_state.attempt_failed()
+        if attempt == self.max_reconnect_attempts:
+            print(f"[{time.strftime('%H:%M:%S')}] Камера недоступна после {attempt} попыток, попытки продолжаются")
+        print(f"[{time.strftime('%H:%M:%S')}] Ошибка переподключения, следующая попытка через {delay:.1f} сек...")
+        return False
+    
+    def retrieve_due(self):
+        """Нужно ли в режиме 'grab' преобразовать вычитанный кадр (retrieve)"""
+        if self.retrieve_requested.is_set() or self.latest_view is None:
+            return True
+        if self.retrieve_interval is None:
+            return False
+        return time.time() - self.last_retrieve_time >= self.retrieve_interval
+    
+    def capture_frame(self):
+        """
+        Получение кадра с учетом режима захвата.
+        В режиме 'grab' возвращает (True, None), если кадр вычитан из потока, но не запрошен
+        """
+        slot = self.frame_pool.acquire()
+        if self.capture_mode != 'grab':
+            grabbed, frame = self.cap.read(slot)
+        else:
+            if not self.cap.grab():
+                return False, None
+            if not self.retrieve_due():
+                return True, None
+            self.retrieve_requested.clear()
+            self.last_retrieve_time = time.time()
+            grabbed, frame = self.cap.retrieve(slot)
+        if grabbed and frame is not None:
+            self.frame_pool.register(frame, slot)
+        return grabbed, frame
+    
+    def request_frame(self):
+        """
+        В режиме 'grab' запрашивает преобразование свежего кадра и ждет его
+        не дольше retrieve_timeout. В режиме 'read' ничего не делает
+        """
+        if self.capture_mode != 'grab' or self.stopped:
+            return
+        with self.lock:
+            seq = self.frame_seq
+            self.retrieve_requested.set()
+            self.new_frame.wait_for(lambda: self.frame_seq != seq or self.stopped, timeout=self.retrieve_timeout)
+    
+    def start(self):
+        """Запуск потока захвата видео"""
+        self.thread = threading.Thread(target=self.update, args=())
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+    
+    def update(self):
+        """Основной цикл захвата кадров"""
+        consecutive_errors = 0
+        max_consecutive_errors = 5
+        
+        while not self.stopped:
+            try:
+                # Периодическая проверка статуса (раз в 30 секунд)
+                current_time = time.time()
+                if current_time - self.last_status_check > 30:
+                    self.last_status_check = current_time
+                    status = self.get_status()
+                    if status['decode_errors']['recent_errors'] > 0:
+                        print(f"[{time.strftime('%H:%M:%S')}] Статистика ошибок: {status['decode_errors']['recent_errors']} ошибок за последние {self.decode_error_monitor.window} сек")
+                
+                # Проверяем необходимость переподключения из-за ошибок декодирования
+                if self.check_decode_errors():
+                    self.reconnect("Инициирую переподключение из-за ошибок декодирования")
+                    continue
+                
+                # Поток захвата не завершается: пока камера недоступна, reconnect() ждет паузу и пробует снова
+                if self.cap is None or not self.cap.isOpened() or not self.reconnect_state.is_connected:
+                    self.reconnect("Камера не подключена")
+                    continue
+                
+                grabbed, frame = self.capture_frame()
+                
+                if grabbed and frame is None and self.capture_mode == 'grab':
+                    # Кадр вычитан без преобразования в BGR - поток жив
+                    self.last_valid_frame_time = time.time()
+                    consecutive_errors = 0
+                    continue
+                
+                if grabbed and frame is not None and frame.size > 0:
+                    frame, source, transform = self.transform_frame(frame)
+                    with self.lock:
+                        self.grabbed = grabbed
+                        self.current_frame = frame
+                        self.last_valid_frame_time = time.time()
+                        self.frame_seq += 1
+                        self.latest_view = make_frame_view(frame, self.frame_seq, self.last_valid_frame_time,
+                                                           source, transform)
+                        self.sample_meter.tick(self.last_valid_frame_time)
+                        consecutive_errors = 0  # Сбрасываем счетчик последовательных ошибок
+                        
+                        self.frame_buffer.append(self.latest_view)
+                        self.new_frame.notify_all()
+                else:
+                    # Проблема с получением кадра
+                    consecutive_errors += 1
+                    
+                    # Периодически выводим информацию о состоянии
+                    if consecutive_errors % 10 == 0:
+                        print(f"[{time.strftime('%H:%M:%S')}] Не удалось получить кадр. Последовательных ошибок: {consecutive_errors}")
+                    
+                    # Неудачное чтение (поврежденные кадры/пакеты учитывает сам бэкенд PyAV)
+                    self.decode_error_monitor.record('read_failures')
+                    
+                    # Если слишком много ошибок подряд, пробуем переподключиться
+                    if consecutive_errors >= max_consecutive_errors:
+                        self.reconnect(f"Слишком много последовательных ошибок ({consecutive_errors})")
+                        consecutive_errors = 0
+                        continue
+                    
+                    # Проверяем таймаут без валидных кадров
+                    if time.time() - self.last_valid_frame_time > 5.0:
+                        self.reconnect("Без валидных кадров более 5 секунд")
+                        consecutive_errors = 0
+                        continue
+                    
+                    # Пауза только при ошибке чтения: успешный cap.read() сам ждет следующий кадр
+                    time.sleep(0.01)
+                
+            except Exception as e:
+                # Ловим все исключения и учитываем их как неудачные чтения
+                print(f"[{time.strftime('%H:%M:%S')}] Исключение в потоке захвата видео: {e}")
+                self.decode_error_monitor.record('read_failures')
+                
+                consecutive_errors += 1
+                
+                # Если слишком много исключений, пробуем переподключиться
+                if consecutive_errors >= max_consecutive_errors:
+                    self.reconnect(f"Слишком много исключений подряд ({consecutive_errors})")
+                    consecutive_errors = 0
+                
+                time.sleep(1)  # Делаем паузу после исключения
+    
+    def read(self):
+        """Чтение последнего кадра"""
+        self.request_frame()
+        with self.lock:
+            if self.frame_buffer:
+                return True, self.frame_buffer[-1].copy()
+            return False, None
+    
+    def read_history(self, count=None):
+        """
+        Последние count кадров (не больше buffer_size) как FrameView без копирования,
+        от старых к новым. Для временного голосования по нескольким кадрам
+        """
+        with self.lock:
+            views = list(self.frame_buffer)
+        if count is None:
+            return views
+        return views[max(0, len(views) - count):]
+    
+    def read_view(self):
+        """
+        Чтение последнего кадра без копирования: FrameView с кадром только для чтения
+        и порядковым номером. Для изменения кадра вызывайте view.copy()
+        """
+        self.request_frame()
+        with self.lock:
+            if self.frame_buffer:
+                return True, self.latest_view
+            return False, None
+    
+    def check_frame(self, frame_view):
+        """
+        Пригоден ли кадр для детекции: поврежденные при ошибках декодирования кадры
+        (серая заливка, размазанные блоки) пропускаются, счетчик - в get_status()['frame_quality']
+        """
+        return self.quality_gate.check(frame_view.frame)
+    
+    def wait_for_new_frame(self, timeout=None, after_seq=None):
+        """
+        Ожидание кадра новее after_seq (None - новее текущего) без опроса в цикле.
+        Возвращает (True, FrameView) или (False, None) по таймауту / остановке потока
+        """
+        with self.lock:
+            if after_seq is None:
+                after_seq = self.frame_seq
+            if self.capture_mode == 'grab':
+                self.retrieve_requested.set()
+            self.new_frame.wait_for(lambda: self.frame_seq != after_seq or self.stopped, timeout=timeout)
+            if self.frame_seq != after_seq and self.frame_buffer:
+                return True, self.latest_view
+            return False, None
+    
+    def stop(self):
+        """Остановка потока"""
+        self.stopped = True
+        with self.lock:
+            self.new_frame.notify_all()
+        if hasattr(self, 'thread'):
+            self.thread.join(timeout=2.0)
+    
+    def release(self):
+        """Освобождение ресурсов"""
+        self.stop()
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+        print(f"[{time.strftime('%H:%M:%S')}] Видеопоток остановлен")
+    
+    def get_status(self):
+        """Возвращает статус видеопотока"""
+        with self.lock:
+            error_stats = self.decode_error_monitor.get_error_stats()
+            return {
+                'is_opened': self.cap.isOpened() if self.cap else False,
+                'reconnect_attempts': self.reconnect_state.failures,
+                'reconnect': self.reconnect_state.get_stats(),
+                'last_valid_frame': time.time() - self.last_valid_frame_time,
+                'frame_buffer_size': len(self.frame_buffer),
+                'frame_pool': self.frame_pool.get_stats(),
+                'capture_mode': self.capture_mode,
+                'backend': self.backend,
+                'decode_mode': self.decode_mode,
+                'sample_rate': self.sample_meter.rate(),
+                'frame_quality': self.quality_gate.get_stats(),
+                'decode_errors': error_stats
+            }
+
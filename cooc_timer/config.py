@@ -19,6 +19,9 @@ LAST_SCHEDULE_UPDATE = None
 
 # --- Параметры приложения ---
 RTSP_URL = os.getenv('RTSP_URL_COOK')
+# Основной поток камеры для снимков нарушений (если RTSP_URL_COOK - дополнительный поток низкого разрешения)
+RTSP_URL_MAIN = os.getenv('RTSP_URL_COOK_MAIN') or None
+EVIDENCE_STREAM_MODE = os.getenv('EVIDENCE_STREAM_MODE_COOK', 'lazy').lower()  # lazy | grab
 MODEL_PATH = os.getenv('MODEL_PATH')
 HAT_GLOVE_MODEL_PATH = os.getenv('HAT_GLOVE_MODEL_PATH')
 
@@ -28,6 +31,18 @@ ID_POINT = int(os.getenv('POINT_ID'))
 CONFIDENCE_THRESHOLD = float(os.getenv('CONFIDENCE_THRESHOLD_COOK'))
 HAT_GLOVE_CONFIDENCE_THRESHOLD = float(os.getenv('HAT_GLOVE_CONFIDENCE_THRESHOLD'))
 
+# --- Детекция СИЗ по вырезкам людей у стола ---
+PPE_ON_PERSON_CROPS = os.getenv('PPE_ON_PERSON_CROPS_COOK', 'True').lower() == 'true'  # Модель СИЗ получает вырезки людей, а не весь кадр
+PPE_CROP_PADDING = float(os.getenv('PPE_CROP_PADDING_COOK', '0.15'))  # Отступ вокруг бокса человека (доля размера бокса)
+PPE_IMGSZ = int(os.getenv('PPE_IMGSZ_COOK', '0'))  # Вход модели СИЗ для вырезок (0 - из модели; только для экспорта с динамическим входом)
+PPE_MAX_BATCH = int(os.getenv('PPE_MAX_BATCH_COOK', '4'))  # Вырезок в одном проходе модели СИЗ (экспорт с динамической осью batch)
+PPE_REFRESH_FRAMES = int(os.getenv('PPE_REFRESH_FRAMES_COOK', '5'))  # Результат СИЗ трека повторно используется до N кадров (0 - модель СИЗ на каждом кадре)
+PPE_REFRESH_CHANGE = float(os.getenv('PPE_REFRESH_CHANGE_COOK', '0.1'))  # Изменение вырезки человека (доля яркости), после которого СИЗ проверяются заново
+
+# --- Трекинг людей у стола (IoU боксов соседних детекций) ---
+TRACK_IOU_THRESHOLD = float(os.getenv('TRACK_IOU_THRESHOLD_COOK', '0.3'))  # Мин. IoU бокса с треком
+TRACK_MAX_MISSED = int(os.getenv('TRACK_MAX_MISSED_COOK', '3'))  # Детекций без бокса до удаления трека
+
 SHOW_DETECTION = os.getenv('SHOW_DETECTION_COOK', 'False').lower() == 'true'
 CAPTURE_INTERVAL = int(os.getenv('CAPTURE_INTERVAL_COOK'))
 TIMEOUT_DURATION = int(os.getenv('TIMEOUT_DURATION_COOK'))
@@ -60,6 +75,23 @@ except Exception as e:
 BUFFER_SIZE = int(os.getenv('CAMERA_BUFFER_SIZE'))
 RECONNECT_TIMEOUT = int(os.getenv('CAMERA_RECONNECT_TIMEOUT'))
 MAX_RECONNECT_ATTEMPTS = int(os.getenv('CAMERA_MAX_RECONNECT_ATTEMPTS'))
+RECONNECT_MAX_DELAY = float(os.getenv('CAMERA_RECONNECT_MAX_DELAY', '120'))  # Максимальная пауза между попытками (сек)
+OPEN_TIMEOUT = float(os.getenv('CAMERA_OPEN_TIMEOUT', '10'))  # Таймаут подключения к камере (сек)
+CAPTURE_MODE = os.getenv('CAMERA_CAPTURE_MODE', 'read').lower()  # read | grab
+CAMERA_BACKEND = os.getenv('CAMERA_BACKEND', 'opencv').lower()  # opencv | pyav
+DECODE_MODE = os.getenv('CAMERA_DECODE_MODE', 'all').lower()  # all | nonref | keyframes (PyAV)
+DECODE_EVERY = int(os.getenv('CAMERA_DECODE_EVERY', '1'))  # Каждый N-й декодированный кадр (PyAV)
+OUTPUT_WIDTH = int(os.getenv('OUTPUT_WIDTH_COOK', '0'))  # Ширина кадра для детекции (0 - полное разрешение)
+CROP_TO_ROI = os.getenv('CROP_TO_ROI_COOK', 'False').lower() == 'true'  # Обрезать кадр по ограничивающему прямоугольнику ROI
+ROI_INFERENCE_MODE = os.getenv('ROI_INFERENCE_MODE_COOK', 'crop').lower()  # Вход модели: mask | crop | crop_mask (прямоугольник ROI с маской)
+INFERENCE_ENGINE = (os.getenv('INFERENCE_ENGINE_COOK') or os.getenv('INFERENCE_ENGINE', 'onnxruntime')).lower()  # Движок детекции: onnxruntime | ncnn | ultralytics
+MODEL_PRECISION = (os.getenv('MODEL_PRECISION_COOK') or os.getenv('MODEL_PRECISION', 'fp32')).lower()  # Точность моделей человека и СИЗ: fp32 | int8
+USE_INFERENCE_SERVER = os.getenv('USE_INFERENCE_SERVER', 'False').lower() == 'true'  # Детекция на сервере инференса (inference_server)
+INFERENCE_SOCKET = os.getenv('INFERENCE_SOCKET', '/tmp/cyber_inference.sock')  # Сокет сервера инференса
+MOTION_GATE_THRESHOLD = float(os.getenv('MOTION_GATE_THRESHOLD_COOK') or os.getenv('MOTION_GATE_THRESHOLD', '0.01'))  # Доля изменившихся пикселей ROI, ниже которой детекция пропускается (0 - детекция на каждом кадре)
+MOTION_GATE_METHOD = os.getenv('MOTION_GATE_METHOD', 'diff').lower()  # diff - разность с кадром последней детекции | mog2 - модель фона
+MOTION_GATE_MAX_INTERVAL = float(os.getenv('MOTION_GATE_MAX_INTERVAL', '30'))  # Детекция не реже чем раз в N секунд
+MOTION_GATE_REPORT_INTERVAL = float(os.getenv('MOTION_GATE_REPORT_INTERVAL', '600'))  # Интервал вывода доли пропущенных детекций (сек)
 
 # --- Параметры ошибок декодирования ---
 DECODE_ERROR_THRESHOLD = int(os.getenv('DECODE_ERROR_THRESHOLD', '10'))
@@ -5,8 +5,13 @@ import subprocess
 import threading
 import time
 from datetime import datetime
-from ultralytics import YOLO
-from config import MODEL_PATH, CONFIDENCE_THRESHOLD, ROI, HAT_GLOVE_MODEL_PATH, HAT_GLOVE_CONFIDENCE_THRESHOLD, ROI_TABLE, ID_POINT, RAM_DISK_PATH, COUNT_VIOLATIONS, SOUND_PATH_WARNING
+from config import MODEL_PATH, CONFIDENCE_THRESHOLD, ROI, HAT_GLOVE_MODEL_PATH, HAT_GLOVE_CONFIDENCE_THRESHOLD, ROI_TABLE, ID_POINT, RAM_DISK_PATH, COUNT_VIOLATIONS, SOUND_PATH_WARNING, ROI_INFERENCE_MODE, INFERENCE_ENGINE, MODEL_PRECISION, USE_INFERENCE_SERVER, INFERENCE_SOCKET
+from config import PPE_ON_PERSON_CROPS, PPE_CROP_PADDING, PPE_IMGSZ, PPE_MAX_BATCH
+from common.roi_crop import prepare_roi_input, box_crops
+from common.roi_geometry import get_roi_geometry, box_centers
+from common.postprocess import results_to_array, boxes_xyxy, bbox_tuple, to_detection_info
+from common.inference_client import create_detector
+from common.detection_engine import detect_frames
 from sftp_client import SFTPUploader
 
 # Импортируем функцию локального сохранения
@@ -14,40 +19,11 @@ from database import save_violation_to_local
 
 HAT_GLOVE_CLASSES = {0: 'hat', 1: 'glove'}
 
-# Глобальный счетчик подряд идущих нарушений
-consecutive_violations_count = 0
+# Счетчики подряд идущих нарушений по трекам людей у стола: id трека -> число кадров
+violation_counts = {}
 is_sound_playing = False
 sound_lock = threading.Lock()
 
-def is_point_in_polygon(point, polygon):
-    """Проверка, находится ли точка внутри полигона"""
-    x, y = point
-    n = len(polygon)
-    inside = False
-    p1x, p1y = polygon[0]
-    for i in range(1, n + 1):
-        p2x, p2y = polygon[i % n]
-        if y > min(p1y, p2y):
-            if y <= max(p1y, p2y):
-                if x <= max(p1x, p2x):
-                    if p1y != p2y:
-                        xinters = (y - p1y) * (p2x - p1x) / (p2y - p1y) + p1x
-                    if p1x == p2x or x <= xinters:
-                        inside = not inside
-        p1x, p1y = p2x, p2y
-    return inside
-
-def bbox_intersects_polygon(bbox, polygon):
-    """Проверка пересечения bounding box с полигоном"""
-    if polygon is None: 
-        return False
-    x1, y1, x2, y2 = bbox
-    points = [(x1, y1), (x2, y1), (x2, y2), (x1, y2), ((x1+x2)//2, (y1+y2)//2)]
-    for p in points:
-        if is_point_in_polygon(p, polygon): 
-            return True
-    return False
-
 def get_polygon_bounding_rect(polygon):
     """Получение ограничивающего прямоугольника для полигона"""
     xs = [p[0] for p in polygon]
@@ -56,59 +32,34 @@ def get_polygon_bounding_rect(polygon):
 
 def detect_person(frame, model, confidence_threshold=CONFIDENCE_THRESHOLD, roi=ROI, roi_table=ROI_TABLE):
     """Детекция людей в кадре"""
-    roi_rect = get_polygon_bounding_rect(roi)
-    x1_rect, y1_rect, x2_rect, y2_rect = roi_rect
-    
-    # Проверка границ ROI
-    if (x1_rect >= x2_rect or y1_rect >= y2_rect or 
-        x2_rect > frame.shape[1] or y2_rect > frame.shape[0]):
+    # Модель получает прямоугольник ROI (ROI_INFERENCE_MODE), пустой - ROI вне кадра
+    roi_frame, offset = prepare_roi_input(frame, [roi], ROI_INFERENCE_MODE)
+    if roi_frame is None or roi_frame.size == 0:
         return False, 0.0, [], []
-    
-    roi_frame = frame[y1_rect:y2_rect, x1_rect:x2_rect]
-    
-    # Проверка, что ROI не пустой
-    if roi_frame.size == 0:
+
+    persons = results_to_array(model(roi_frame, verbose=False), offset, classes=[0], min_conf=confidence_threshold)
+    if not len(persons):
         return False, 0.0, [], []
-        
-    results = model(roi_frame, verbose=False)
     
-    person_count = 0
-    max_confidence = 0.0
-    detection_info = []
-    person_bboxes = []
+    # Центр в ROI повара, углы или центр в ROI стола - для всех боксов сразу (ROI 0 - повар, 1 - стол)
+    geometry = get_roi_geometry([roi, roi_table], frame.shape)
+    bboxes = boxes_xyxy(persons)
+    in_roi = geometry.contains(box_centers(bboxes), 0)
+    at_table = geometry.box_touches(bboxes, 1) if roi_table else np.zeros(len(persons), dtype=bool)
+    persons, at_table = persons[in_roi], at_table[in_roi]
     
-    for result in results:
-        boxes = result.boxes
-        if boxes is not None:
-            for box in boxes:
-                cls = int(box.cls[0])
-                conf = box.conf[0].item()
-                if cls == 0 and conf >= confidence_threshold:
-                    x1, y1, x2, y2 = map(int, box.xyxy[0])
-                    x1_f, y1_f = x1 + roi_rect[0], y1 + roi_rect[1]
-                    x2_f, y2_f = x2 + roi_rect[0], y2 + roi_rect[1]
-                    cx, cy = (x1_f + x2_f)//2, (y1_f + y2_f)//2
-                    
-                    if is_point_in_polygon((cx, cy), roi):
-                        person_count += 1
-                        max_confidence = max(max_confidence, conf)
-                        bbox = (x1_f, y1_f, x2_f, y2_f)
-                        person_bboxes.append(bbox)
-                        inter = False
-                        if roi_table: 
-                            inter = bbox_intersects_polygon(bbox, roi_table)
-                        detection_info.append({
-                            'bbox': bbox, 
-                            'confidence': conf, 
-                            'class': 'person', 
-                            'intersects_table': inter
-                        })
-    return person_count > 0, max_confidence, detection_info, person_bboxes
+    detection_info = [
+        {'bbox': bbox_tuple(det), 'confidence': float(det['conf']), 'class': 'person', 'intersects_table': bool(inter)}
+        for det, inter in zip(persons, at_table)
+    ]
+    person_bboxes = [d['bbox'] for d in detection_info]
+    max_confidence = float(persons['conf'].max()) if len(persons) else 0.0
+    return bool(detection_info), max_confidence, detection_info, person_bboxes
 
 def load_model():
     """Загрузка модели детекции людей"""
     try:
-        model = YOLO(MODEL_PATH, task='detect')
+        model = create_detector(MODEL_PATH, 'cook', INFERENCE_ENGINE, MODEL_PRECISION, USE_INFERENCE_SERVER, INFERENCE_SOCKET)
         print(f"Model loaded: {MODEL_PATH}")
         return model
     except Exception as e:
@@ -118,7 +69,12 @@ def load_model():
 def load_hat_glove_model():
     """Загрузка модели детекции средств защиты"""
     try:
-        model = YOLO(HAT_GLOVE_MODEL_PATH, task='detect')
+        # Вырезки людей обрабатываются одним пакетом, при PPE_IMGSZ - на уменьшенном входе
+        engine_options = {'max_batch': PPE_MAX_BATCH} if PPE_ON_PERSON_CROPS else {}
+        if PPE_ON_PERSON_CROPS and PPE_IMGSZ > 0:
+            engine_options['imgsz'] = PPE_IMGSZ
+        model = create_detector(HAT_GLOVE_MODEL_PATH, 'cook', INFERENCE_ENGINE, MODEL_PRECISION, USE_INFERENCE_SERVER, INFERENCE_SOCKET,
+                                **engine_options)
         print(f"PPE Model loaded: {HAT_GLOVE_MODEL_PATH}")
         return model
     except Exception as e:
@@ -126,41 +82,125 @@ def load_hat_glove_model():
         return None
 
 def detect_hat_glove(frame, model, person_bboxes, confidence_threshold=HAT_GLOVE_CONFIDENCE_THRESHOLD):
-    """Детекция шлемов и перчаток"""
-    if model is None: 
+    """
+    Детекция шлемов и перчаток у людей person_bboxes.
+    PPE_ON_PERSON_CROPS - модель получает вырезки людей с отступом PPE_CROP_PADDING
+    (одним пакетом), иначе весь кадр. На вырезке перчатки крупнее на входе модели
+    """
+    if model is None or not person_bboxes:
         return [], []
-        
-    results = model.predict(frame, conf=confidence_threshold, classes=[0, 1], verbose=False)
+    
+    if PPE_ON_PERSON_CROPS:
+        crops = box_crops(frame, person_bboxes, PPE_CROP_PADDING)
+        results = detect_frames(model, [crop for crop, _ in crops], conf=confidence_threshold, classes=[0, 1])
+        dets = np.concatenate([
+            results_to_array([result], offset, classes=list(HAT_GLOVE_CLASSES), min_conf=confidence_threshold)
+            for result, (_, offset) in zip(results, crops)
+        ]) if crops else []
+    else:
+        results = model.predict(frame, conf=confidence_threshold, classes=[0, 1], verbose=False)
+        dets = results_to_array(results[:1] if results else [], classes=list(HAT_GLOVE_CLASSES), min_conf=confidence_threshold)
+    if not len(dets):
+        return [], []
+    
+    # Центр СИЗ внутри бокса хотя бы одного человека - все пары СИЗ x человек сразу
+    centers = box_centers(boxes_xyxy(dets))
+    persons = np.asarray(person_bboxes)
+    cx, cy = centers[:, 0:1], centers[:, 1:2]
+    in_person = ((persons[:, 0] <= cx) & (cx <= persons[:, 2]) & (persons[:, 1] <= cy) & (cy <= persons[:, 3])).any(axis=1)
+    dets = dets[in_person]
+    
     hg_dets = []
     g_dets = []
-    
-    if results and results[0].boxes is not None:
-        for box in results[0].boxes:
-            cls = int(box.cls[0])
-            conf = box.conf[0].item()
-            x1, y1, x2, y2 = map(int, box.xyxy[0])
-            cx, cy = (x1+x2)//2, (y1+y2)//2
-            
-            in_person = False
-            for px1, py1, px2, py2 in person_bboxes:
-                if px1 <= cx <= px2 and py1 <= cy <= py2:
-                    in_person = True
-                    break
-            if in_person:
-                info = {
-                    'bbox': (x1, y1, x2, y2), 
-                    'confidence': conf, 
-                    'class': HAT_GLOVE_CLASSES.get(cls, 'unknown')
-                }
-                hg_dets.append(info)
-                if cls == 1: 
-                    g_dets.append(info)
+    for info, cls in zip(to_detection_info(dets), dets['cls']):
+        info['class'] = HAT_GLOVE_CLASSES.get(int(cls), 'unknown')
+        hg_dets.append(info)
+        if cls == 1:
+            g_dets.append(info)
     return hg_dets, g_dets
 
+class TrackPpeCache:
+    """
+    Результаты СИЗ по трекам людей у стола (person['track_id']): модель СИЗ запускается
+    только для треков с устаревшим результатом - прошло refresh_frames кадров, вырезка
+    человека заметно изменилась (средняя разность уменьшенных вырезок больше refresh_change,
+    в долях яркости) или на прошлой проверке перчатка не найдена: нарушение засчитывается
+    только по свежей детекции. Сохраненные СИЗ сдвигаются вслед за боксом человека.
+    refresh_frames=0 - модель СИЗ на каждом кадре
+    """
+    def __init__(self, refresh_frames=5, refresh_change=0.1):
+        self.refresh_frames = refresh_frames
+        self.refresh_change = refresh_change
+        self.entries = {}  # id трека -> {'bbox', 'thumb', 'age', 'items', 'has_glove'}
+        self.checked = 0   # Людей, для которых нужен результат СИЗ
+        self.reused = 0    # Из них - результат из кэша
+
+    @staticmethod
+    def _thumbnail(frame, bbox):
+        """Уменьшенная вырезка человека в оттенках серого без средней яркости (автоэкспозиция камеры)"""
+        x1, y1, x2, y2 = bbox
+        crop = frame[max(0, y1):y2, max(0, x1):x2]
+        if crop.size == 0:
+            return None
+        gray = cv2.cvtColor(cv2.resize(crop, (16, 32), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY).astype(np.float32)
+        return gray - gray.mean()
+
+    def _stale(self, entry, thumb):
+        if self.refresh_frames <= 0 or entry is None or thumb is None:
+            return True
+        if entry['age'] >= self.refresh_frames or not entry['has_glove']:
+            return True
+        return np.abs(thumb - entry['thumb']).mean() / 255 > self.refresh_change
+
+    def detect(self, frame, model, persons, confidence_threshold=HAT_GLOVE_CONFIDENCE_THRESHOLD):
+        """СИЗ людей persons (person_info с track_id) -> (hat_glove_info, glove_detections), как detect_hat_glove"""
+        hat_glove_info, stale = [], []
+        for person in persons:
+            entry = self.entries.get(person['track_id'])
+            thumb = self._thumbnail(frame, person['bbox'])
+            if self._stale(entry, thumb):
+                stale.append((person, thumb))
+                continue
+            entry['age'] += 1
+            dx, dy = person['bbox'][0] - entry['bbox'][0], person['bbox'][1] - entry['bbox'][1]
+            for item in entry['items']:
+                x1, y1, x2, y2 = item['bbox']
+                hat_glove_info.append(dict(item, bbox=(x1 + dx, y1 + dy, x2 + dx, y2 + dy)))
+            self.reused += 1
+        self.checked += len(persons)
+
+        if stale:
+            # Один проход модели СИЗ на всех людей с устаревшим результатом
+            found, _ = detect_hat_glove(frame, model, [person['bbox'] for person, _ in stale], confidence_threshold)
+            for person, thumb in stale:
+                px1, py1, px2, py2 = person['bbox']
+                items = [item for item in found
+                         if px1 <= (item['bbox'][0] + item['bbox'][2]) // 2 <= px2
+                         and py1 <= (item['bbox'][1] + item['bbox'][3]) // 2 <= py2]
+                self.entries[person['track_id']] = {
+                    'bbox': person['bbox'], 'thumb': thumb, 'age': 0, 'items': items,
+                    'has_glove': any(item['class'] == 'glove' for item in items)
+                }
+                hat_glove_info.extend(items)
+
+        # Треки, которых нет у стола, забываются
+        current = {person['track_id'] for person in persons}
+        for track_id in list(self.entries):
+            if track_id not in current:
+                del self.entries[track_id]
+        return hat_glove_info, [item for item in hat_glove_info if item['class'] == 'glove']
+
+    def get_stats(self, reset=False):
+        stats = {'checked': self.checked, 'reused': self.reused}
+        if reset:
+            self.checked = self.reused = 0
+        return stats
+
 def check_violation(person_info, glove_detections, frame, timestamp):
-    """Проверка нарушений (отсутствие перчаток)"""
-    global consecutive_violations_count
+    """Проверка нарушений (отсутствие перчаток), счетчики - по трекам людей (person['track_id'])"""
+    global violation_counts
     violations = []
+    counts = {}
     
     # Проверяем каждого человека в ROI_TABLE
     for person in person_info:
@@ -176,22 +216,26 @@ def check_violation(person_info, glove_detections, frame, timestamp):
                     break
                     
             if not has_glove:
+                track_id = person.get('track_id', -1)
+                counts[track_id] = violation_counts.get(track_id, 0) + 1
                 violations.append({
                     'person_bbox': person['bbox'], 
                     'timestamp': timestamp, 
-                    'person_confidence': person['confidence']
+                    'person_confidence': person['confidence'],
+                    'track_id': track_id,
+                    'count': counts[track_id]
                 })
+                print(f"[Violation] Track {track_id} consecutive: {counts[track_id]}/{COUNT_VIOLATIONS}")
     
-    # Обновление счетчика нарушений
-    if violations:
-        consecutive_violations_count += 1
-        print(f"[Violation] Consecutive: {consecutive_violations_count}/{COUNT_VIOLATIONS}")
-    else:
-        # Если на этом кадре нет нарушений - сбрасываем счетчик
-        consecutive_violations_count = 0
+    # Счетчики треков без нарушения на этом кадре (в перчатках или ушедших от стола) сбрасываются
+    violation_counts = counts
     
     return violations
 
+def max_violation_count():
+    """Наибольшее число подряд идущих нарушений среди треков"""
+    return max(violation_counts.values(), default=0)
+
 def play_warning_sound():
     """Воспроизведение звука предупреждения"""
     global is_sound_playing
@@ -224,11 +268,16 @@ def play_warning_sound():
 
     threading.Thread(target=play, daemon=True).start()
 
-def save_violation_images(frame, violations):
-    """Сохранение изображений нарушений"""
-    global consecutive_violations_count
-    
-    if consecutive_violations_count >= COUNT_VIOLATIONS:
+def save_violation_images(frame, violations, frame_view=None, video_stream=None):
+    """
+    Сохранение изображений нарушений.
+    frame_view - FrameView кадра: если детекция работала на уменьшенном кадре,
+    снимок сохраняется в полном разрешении камеры. video_stream - для снимка
+    из основного потока камеры (RTSP_URL_COOK_MAIN)
+    """
+    # Снимок - по нарушителю с наибольшим счетчиком, достигшим порога
+    due = [v for v in violations if v.get('count', 0) >= COUNT_VIOLATIONS]
+    if due:
         print(f"[ATTENTION] Threshold reached ({COUNT_VIOLATIONS}). Saving evidence.")
         
         uploader = SFTPUploader()
@@ -241,19 +290,25 @@ def save_violation_images(frame, violations):
                 print(f"Error creating RAM disk directory: {e}")
                 return
         
-        if violations:
-            violation = violations[0]
+        if due:
+            violation = max(due, key=lambda v: v['count'])
             timestamp = violation['timestamp']
             person_bbox = violation['person_bbox']
             
-            violation_frame = frame.copy()
+            if frame_view is not None and video_stream is not None:
+                violation_frame, person_bbox = video_stream.read_evidence(frame_view, person_bbox)
+            elif frame_view is not None:
+                violation_frame = frame_view.full()
+                person_bbox = frame_view.to_source_bbox(person_bbox)
+            else:
+                violation_frame = frame.copy()
             x1, y1, x2, y2 = person_bbox
             
             # Рисуем bounding box нарушителя
             cv2.rectangle(violation_frame, (x1, y1), (x2, y2), (0, 0, 255), 3)
             
             # Добавляем текст
-            cv2.putText(violation_frame, f'VIOLATION: No gloves ({consecutive_violations_count})', 
+            cv2.putText(violation_frame, f'VIOLATION: No gloves ({violation["count"]})', 
                        (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,255), 2)
             cv2.putText(violation_frame, f'Point ID: {ID_POINT}', 
                        (10, 70), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0,0,255), 2)
@@ -275,8 +330,8 @@ def save_violation_images(frame, violations):
                     # Воспроизведение звука при достижении порога
                     play_warning_sound()
                     
-                    # Сброс счетчика после реакции
-                    consecutive_violations_count = 0
+                    # Сброс счетчика нарушителя после реакции
+                    violation_counts.pop(violation['track_id'], None)
                 else:
                     print(f"Failed to save image: {local_path}")
             except Exception as e:
@@ -300,8 +355,9 @@ def draw_detections(frame, person_info, hg_info, person_detected, roi=ROI, roi_t
             color = (0, 255, 0)  # Зеленый
         cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
         
-        # Добавляем confidence score
-        cv2.putText(frame, f"{d['confidence']:.2f}", 
+        # Добавляем id трека и confidence score
+        label = f"#{d['track_id']} {d['confidence']:.2f}" if 'track_id' in d else f"{d['confidence']:.2f}"
+        cv2.putText(frame, label, 
                    (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
     
     # Рисуем bounding boxes средств защиты
@@ -315,12 +371,12 @@ def draw_detections(frame, person_info, hg_info, person_detected, roi=ROI, roi_t
                    (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
 
     # Добавляем счетчик нарушений
-    cv2.putText(frame, f"Violations: {consecutive_violations_count}/{COUNT_VIOLATIONS}", 
+    cv2.putText(frame, f"Violations: {max_violation_count()}/{COUNT_VIOLATIONS}", 
                (10, 400), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,255), 2)
     
     return frame
 
 def reset_violation_counter():
-    """Сбрасывает счетчик последовательных нарушений"""
-    global consecutive_violations_count
-    consecutive_violations_count = 0
+    """Сбрасывает счетчики последовательных нарушений всех треков"""
+    global violation_counts
+    violation_counts = {}
@@ -3,12 +3,16 @@ import time
 import cv2
 import numpy as np
 import shutil
-from config import SHOW_DETECTION, CAPTURE_INTERVAL, RAM_DISK_PATH, TIMEOUT_DURATION, ROI_TABLE
+from config import (SHOW_DETECTION, CAPTURE_INTERVAL, RAM_DISK_PATH, TIMEOUT_DURATION, ROI, ROI_TABLE, CROP_TO_ROI,
+                    MOTION_GATE_THRESHOLD, MOTION_GATE_METHOD, MOTION_GATE_MAX_INTERVAL, MOTION_GATE_REPORT_INTERVAL,
+                    PPE_REFRESH_FRAMES, PPE_REFRESH_CHANGE, TRACK_IOU_THRESHOLD, TRACK_MAX_MISSED)
 from database import check_database_connection, save_work_session_to_db, get_gmt_offset
 from video_stream import VideoStream
-from detection import load_model, load_hat_glove_model, detect_person, detect_hat_glove, draw_detections, check_violation, save_violation_images, reset_violation_counter
+from detection import load_model, load_hat_glove_model, detect_person, TrackPpeCache, draw_detections, check_violation, save_violation_images, reset_violation_counter, get_polygon_bounding_rect
 from schedule import should_monitoring_be_active
 from sftp_client import SFTPUploader
+from common.motion_gate import MotionGate, format_gate_stats
+from common.iou_tracker import IouTracker
 
 def setup_ram_disk():
     """Настройка RAM-диска"""
@@ -50,7 +54,9 @@ def monitor_chef_work_time():
         print("КРИТИЧЕСКАЯ ОШИБКА: Не удалось загрузить модель детекции людей!")
         return
     
-    video_stream = VideoStream().start()
+    # Кадр для детекции можно сразу обрезать по ROI и уменьшить (OUTPUT_WIDTH_COOK)
+    crop_rect = get_polygon_bounding_rect(ROI) if CROP_TO_ROI else None
+    video_stream = VideoStream(retrieve_interval=CAPTURE_INTERVAL, crop_rect=crop_rect).start()
     time.sleep(2.0) # Разогрев камеры
     
     os.environ['QT_QPA_PLATFORM'] = 'xcb'
@@ -60,6 +66,16 @@ def monitor_chef_work_time():
     is_working = False
     last_detection_time = None
     last_gmt_check = time.time()
+    last_frame_seq = None
+    
+    # Без изменений в ROI повара и стола детекция не запускается - используется последний результат
+    motion_gate = MotionGate(MOTION_GATE_THRESHOLD, MOTION_GATE_MAX_INTERVAL, MOTION_GATE_METHOD)
+    last_gate_report = time.time()
+    person_detected, person_info, hat_glove_info, violations = False, [], [], []
+    
+    # Треки людей: результат СИЗ и счетчик нарушений ведутся по каждому человеку
+    person_tracker = IouTracker(TRACK_IOU_THRESHOLD, TRACK_MAX_MISSED)
+    ppe_cache = TrackPpeCache(PPE_REFRESH_FRAMES, PPE_REFRESH_CHANGE)
     
     try:
         while True:
@@ -76,12 +92,20 @@ def monitor_chef_work_time():
                 time.sleep(CAPTURE_INTERVAL)
                 continue
             
-            ret, frame = video_stream.read()
+            # Ожидание нового кадра без копирования (только для чтения), копии делаются только для отрисовки.
+            # Тот же кадр повторно не анализируется (режим keyframes / прореживание),
+            # чтобы не считать нарушение дважды
+            ret, frame_view = video_stream.wait_for_new_frame(timeout=CAPTURE_INTERVAL, after_seq=last_frame_seq)
             if not ret:
                 if SHOW_DETECTION:
                     show_status_screen("VIDEO STREAM DISCONNECTED", (0, 0, 255))
-                time.sleep(CAPTURE_INTERVAL)
                 continue
+            last_frame_seq = frame_view.seq
+            frame = frame_view.frame
+            
+            # ROI заданы в координатах полного кадра камеры
+            roi = frame_view.to_output_polygon(ROI)
+            roi_table = frame_view.to_output_polygon(ROI_TABLE)
             
             # Работа с RAM диском (сохранение текущего кадра для других целей, если нужно)
             timestamp = int(time.time())
@@ -89,26 +113,41 @@ def monitor_chef_work_time():
             cv2.imwrite(photo_path, frame)
             
             # --- Детекция ---
-            person_detected, max_conf, person_info, person_bboxes = detect_person(frame, model_person, roi_table=ROI_TABLE)
-            
-            hat_glove_info, glove_detections = [], []
-            if person_detected:
-                hat_glove_info, glove_detections = detect_hat_glove(frame, model_hat_glove, person_bboxes)
-            
-            # Проверка нарушений
-            violations = []
-            if ROI_TABLE is not None and person_detected:
-                violations = check_violation(person_info, glove_detections, frame, timestamp)
+            # Без изменений в ROI остаются результаты прошлой детекции, счетчик нарушений
+            # не меняется: нарушение считается только по кадрам, прошедшим через модель
+            if motion_gate.check(frame, frame_view.timestamp, [roi, roi_table]):
+                person_detected, max_conf, person_info, person_bboxes = detect_person(frame, model_person, roi=roi, roi_table=roi_table)
+                for person, track_id in zip(person_info, person_tracker.update(person_bboxes)):
+                    person['track_id'] = int(track_id)
                 
-                # Сохраняем фото нарушения и воспроизводим звук, если достигнут порог
-                if violations:
-                    save_violation_images(frame, violations)
-            else:
-                # Если не выполняются условия для проверки нарушений
-                # (нет ROI_TABLE или нет людей) - сбрасываем счетчик
-                reset_violation_counter()
+                # СИЗ проверяются только у людей у стола (ROI_TABLE) - нарушения ищутся только среди них
+                hat_glove_info, glove_detections = [], []
+                table_persons = [person for person in person_info if person['intersects_table']]
+                if table_persons:
+                    hat_glove_info, glove_detections = ppe_cache.detect(frame, model_hat_glove, table_persons)
+                
+                # Проверка нарушений
+                violations = []
+                if ROI_TABLE is not None and person_detected:
+                    violations = check_violation(person_info, glove_detections, frame, timestamp)
+                    
+                    # Сохраняем фото нарушения и воспроизводим звук, если достигнут порог
+                    if violations:
+                        save_violation_images(frame, violations, frame_view, video_stream)
+                else:
+                    # Если не выполняются условия для проверки нарушений
+                    # (нет ROI_TABLE или нет людей) - сбрасываем счетчик
+                    reset_violation_counter()
             
             current_time = time.time()
+            if current_time - last_gate_report >= MOTION_GATE_REPORT_INTERVAL:
+                last_gate_report = current_time
+                print(f"[{time.strftime('%H:%M:%S')}] Детекция без изменений в ROI: "
+                      f"{format_gate_stats(motion_gate.get_stats(reset=True))}")
+                ppe_stats = ppe_cache.get_stats(reset=True)
+                if ppe_stats['checked']:
+                    print(f"[{time.strftime('%H:%M:%S')}] СИЗ из кэша треков: {ppe_stats['reused']} из {ppe_stats['checked']} "
+                          f"({ppe_stats['reused'] / ppe_stats['checked']:.0%})")
             
             # Логика сессий
             if person_detected:
@@ -133,7 +172,7 @@ def monitor_chef_work_time():
             # --- Визуализация ---
             if SHOW_DETECTION:
                 debug_frame = draw_detections(frame.copy(), person_info, hat_glove_info, person_detected, 
-                                             roi_table=ROI_TABLE, violations=violations)
+                                             roi=roi, roi_table=roi_table, violations=violations)
                 
                 # Добавляем информацию о статусе
                 status_text = "РАБОТАЕТ" if person_detected else "НЕ РАБОТАЕТ"
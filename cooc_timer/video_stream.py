@@ -1,218 +1,98 @@
-import cv2
-import time
-import threading
-from collections import deque
-from config import RTSP_URL, BUFFER_SIZE, RECONNECT_TIMEOUT, MAX_RECONNECT_ATTEMPTS, DECODE_ERROR_THRESHOLD, DECODE_ERROR_WINDOW, RECONNECT_ON_DECODE_ERROR
+from config import RTSP_URL, BUFFER_SIZE, RECONNECT_TIMEOUT, MAX_RECONNECT_ATTEMPTS, DECODE_ERROR_THRESHOLD, DECODE_ERROR_WINDOW, RECONNECT_ON_DECODE_ERROR, CAPTURE_MODE
+from config import RECONNECT_MAX_DELAY, OPEN_TIMEOUT
+from config import CAMERA_BACKEND, DECODE_MODE, DECODE_EVERY, OUTPUT_WIDTH, RTSP_URL_MAIN, EVIDENCE_STREAM_MODE
+from common import video_stream
+from common.frame_geometry import FrameTransform, scale_bbox
+from common.evidence_stream import EvidenceStream
 
-class VideoStream:
+class VideoStream(video_stream.VideoStream):
     """
-    Класс для захвата видео в отдельном потоке с механизмом переподключения
-    и отслеживания ошибок декодирования
+    Захват видео (common.video_stream.VideoStream) с настройками камеры cooc_timer.
+    Кадр для детекции обрезается по crop_rect и уменьшается до output_width,
+    снимки нарушений - в полном разрешении или из основного потока камеры
     """
-    def __init__(self, rtsp_url=RTSP_URL, buffer_size=BUFFER_SIZE, 
-                 reconnect_timeout=RECONNECT_TIMEOUT, max_reconnect_attempts=MAX_RECONNECT_ATTEMPTS):
-        self.rtsp_url = rtsp_url
-        self.buffer_size = buffer_size
-        self.reconnect_timeout = reconnect_timeout
-        self.max_reconnect_attempts = max_reconnect_attempts
-        
-        # Параметры для отслеживания ошибок декодирования
-        self.decode_error_threshold = DECODE_ERROR_THRESHOLD
-        self.decode_error_window = DECODE_ERROR_WINDOW
-        self.reconnect_on_decode_error = RECONNECT_ON_DECODE_ERROR
-        
-        # Счетчики ошибок декодирования
-        self.decode_error_times = deque(maxlen=self.decode_error_threshold * 2)
-        
-        self.reconnect_attempts = 0
-        self.cap = None
-        self.initialize_capture()
-        
-        # Буфер для хранения последнего кадра
-        self.frame_buffer = deque(maxlen=self.buffer_size)
-        self.lock = threading.Lock()
-        self.stopped = False
-        self.grabbed = False
-        self.current_frame = None
-        self.last_valid_frame_time = time.time()
-        
-        # Счетчик последовательных неудачных чтений
-        self.consecutive_read_errors = 0
-        self.max_consecutive_errors = 10  # Максимум 10 ошибок подряд
-        
-    def initialize_capture(self):
-        """Инициализация захвата видео с обработкой ошибок"""
-        try:
-            if self.cap is not None:
-                self.cap.release()
-                
-            print(f"Подключение к RTSP: {self.rtsp_url}")
-            self.cap = cv2.VideoCapture(self.rtsp_url)
-            
-            # Настройка параметров для улучшения стабильности
-            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 3)
-            self.cap.set(cv2.CAP_PROP_FPS, 10)
-            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'H264'))
-            
-            if not self.cap.isOpened():
-                raise Exception(f"Ошибка: Не удалось открыть RTSP поток {self.rtsp_url}")
-                
-            self.reconnect_attempts = 0
-            self.consecutive_read_errors = 0
-            print("Подключение к камере успешно")
-            return True
-            
-        except Exception as e:
-            print(f"Ошибка инициализации камеры: {e}")
-            return False
-    
-    def record_decode_error(self):
-        """Записывает ошибку декодирования и проверяет, нужно ли переподключаться"""
-        if not self.reconnect_on_decode_error:
-            return False
-            
-        current_time = time.time()
-        self.decode_error_times.append(current_time)
-        
-        # Удаляем старые ошибки (старше окна отслеживания)
-        while (self.decode_error_times and 
-               current_time - self.decode_error_times[0] > self.decode_error_window):
-            self.decode_error_times.popleft()
-        
-        # Проверяем, превышен ли порог ошибок
-        if len(self.decode_error_times) >= self.decode_error_threshold:
-            print(f"Превышен порог ошибок декодирования: {len(self.decode_error_times)} ошибок за {self.decode_error_window} секунд")
-            return True
-        
-        return False
-    
-    def reconnect(self):
-        """Переподключение к камере с учетом ошибок декодирования"""
-        if self.reconnect_attempts >= self.max_reconnect_attempts:
-            print(f"Достигнут лимит попыток переподключения ({self.max_reconnect_attempts})")
-            return False
-            
-        self.reconnect_attempts += 1
-        print(f"Попытка переподключения #{self.reconnect_attempts}...")
-        
-        # Сброс счетчиков ошибок декодирования при переподключении
-        self.decode_error_times.clear()
-        self.consecutive_read_errors = 0
-        
-        success = self.initialize_capture()
-        
-        if success:
-            self.last_valid_frame_time = time.time()
-            print("Переподключение успешно")
-            return True
-        else:
-            print(f"Ошибка переподключения, следующая попытка через {self.reconnect_timeout} секунд")
-            time.sleep(self.reconnect_timeout)
-            return self.reconnect()
-    
-    def check_decode_errors_and_reconnect(self):
-        """Проверяет ошибки декодирования и инициирует переподключение при необходимости"""
-        if self.record_decode_error():
-            print("Обнаружены множественные ошибки декодирования. Инициирую переподключение...")
-            return self.reconnect()
-        return True
-    
-    def detect_decode_errors(self):
+    def __init__(self, rtsp_url=RTSP_URL, buffer_size=BUFFER_SIZE,
+                 reconnect_timeout=RECONNECT_TIMEOUT, max_reconnect_attempts=MAX_RECONNECT_ATTEMPTS,
+                 capture_mode=CAPTURE_MODE, retrieve_interval=None, output_width=OUTPUT_WIDTH, crop_rect=None,
+                 evidence_url=RTSP_URL_MAIN, evidence_mode=EVIDENCE_STREAM_MODE):
+        # Размер кадра для детекции: обрезка по crop_rect и уменьшение до output_width
+        # (0 / None - полный кадр). Полный кадр доступен через read_full()
+        self.output_width = output_width
+        self.crop_rect = crop_rect
+        self.transform = None
+
+        # Основной поток камеры (высокое разрешение) для снимков нарушений,
+        # если детекция работает на дополнительном потоке
+        self.evidence_stream = EvidenceStream(evidence_url, evidence_mode, open_timeout=OPEN_TIMEOUT) if evidence_url else None
+
+        super().__init__(
+            rtsp_url, buffer_size, reconnect_timeout, max_reconnect_attempts,
+            reconnect_max_delay=RECONNECT_MAX_DELAY, open_timeout=OPEN_TIMEOUT,
+            capture_mode=capture_mode, retrieve_interval=retrieve_interval,
+            backend=CAMERA_BACKEND, decode_mode=DECODE_MODE, decode_every=DECODE_EVERY,
+            decode_error_threshold=DECODE_ERROR_THRESHOLD, decode_error_window=DECODE_ERROR_WINDOW,
+            reconnect_on_decode_error=RECONNECT_ON_DECODE_ERROR
+        )
+
+    def open_capture(self):
+        """PyAV уменьшает и обрезает кадр сразу при преобразовании в BGR"""
+        return super().open_capture(output_width=self.output_width, crop_rect=self.crop_rect)
+
+    def transform_frame(self, frame):
         """
-        Детектирование ошибок декодирования на основе качества кадра.
-        В реальной системе можно расширить для анализа конкретных ошибок.
+        Уменьшение/обрезка кадра для детекции.
+        Возвращает (кадр, кадр источника в полном разрешении, FrameTransform)
         """
-        # Упрощенная проверка: если много последовательных ошибок чтения,
-        # считаем это проблемой декодирования
-        if self.consecutive_read_errors > 5:
-            print(f"Обнаружено {self.consecutive_read_errors} последовательных ошибок чтения")
-            self.record_decode_error()
-            
-        # Проверяем, нужно ли переподключаться из-за ошибок
-        if not self.check_decode_errors_and_reconnect():
-            return False
-        return True
-        
+        if not self.output_width and not self.crop_rect:
+            return frame, None, None
+        if self.backend == 'pyav':
+            # PyAV уже уменьшил кадр при преобразовании в BGR
+            return frame, self.cap.last_source, self.cap.transform
+        height, width = frame.shape[:2]
+        if self.transform is None or self.transform.source_size != (width, height):
+            self.transform = FrameTransform(width, height, self.output_width, self.crop_rect)
+        return self.transform.apply(frame), frame, self.transform
+
     def start(self):
-        """Запуск потока захвата видео"""
-        self.thread = threading.Thread(target=self.update, args=())
-        self.thread.daemon = True
-        self.thread.start()
+        """Запуск потока захвата видео и основного потока для снимков"""
+        super().start()
+        if self.evidence_stream is not None:
+            self.evidence_stream.start()
         return self
-    
-    def update(self):
-        """Основной цикл захвата кадров с отслеживанием ошибок декодирования"""
-        while not self.stopped:
-            try:
-                if self.cap is None or not self.cap.isOpened():
-                    if not self.reconnect():
-                        break
-                    continue
-                
-                # Проверяем ошибки декодирования
-                if not self.detect_decode_errors():
-                    continue
-                
-                grabbed, frame = self.cap.read()
-                if grabbed and frame is not None and frame.size > 0:
-                    with self.lock:
-                        self.grabbed = grabbed
-                        self.current_frame = frame
-                        self.last_valid_frame_time = time.time()
-                        self.consecutive_read_errors = 0  # Сбрасываем счетчик ошибок
-                        self.frame_buffer.clear()
-                        self.frame_buffer.append(frame)
-                else:
-                    # Увеличиваем счетчик ошибок чтения
-                    self.consecutive_read_errors += 1
-                    
-                    # Проверяем, не пора ли переподключаться из-за отсутствия кадров
-                    if time.time() - self.last_valid_frame_time > 5.0:
-                        print(f"Нет валидных кадров более 5 секунд. Ошибок чтения: {self.consecutive_read_errors}")
-                        if not self.reconnect():
-                            break
-                        
-            except cv2.error as e:
-                self.consecutive_read_errors += 1
-                error_msg = str(e)
-                
-                # Фиксируем ошибки декодирования
-                if any(keyword in error_msg for keyword in ['decoding', 'h264', 'MB', 'block unavailable']):
-                    print(f"Ошибка декодирования: {error_msg}")
-                    self.record_decode_error()
-                
-                if self.consecutive_read_errors > self.max_consecutive_errors:
-                    print(f"Превышено максимальное количество ошибок ({self.max_consecutive_errors})")
-                    if not self.reconnect():
-                        break
-                        
-            except Exception as e:
-                print(f"Ошибка в потоке захвата видео: {e}")
-                if not self.reconnect():
-                    break
-                    
-            time.sleep(0.01)  # Небольшая пауза для снижения нагрузки
-    
-    def read(self):
-        """Чтение последнего кадра"""
-        with self.lock:
-            if self.frame_buffer:
-                return True, self.frame_buffer[-1].copy()
+
+    def read_full(self):
+        """
+        Последний кадр в полном разрешении источника (изменяемая копия).
+        Для снимков нарушений, когда детекция работает на уменьшенном кадре
+        """
+        ret, frame_view = self.read_view()
+        if not ret:
             return False, None
-    
-    def stop(self):
-        """Остановка потока"""
-        self.stopped = True
-        if hasattr(self, 'thread'):
-            self.thread.join(timeout=2.0)
-    
+        return True, frame_view.full()
+
+    def read_evidence(self, frame_view, bbox):
+        """
+        Снимок нарушения в максимальном доступном разрешении.
+        Возвращает (кадр, bbox в координатах этого кадра). При наличии основного потока
+        кадр берется из него (снят чуть позже кадра детекции), иначе - источник frame_view
+        """
+        bbox = frame_view.to_source_bbox(bbox)
+        if self.evidence_stream is not None:
+            ret, frame = self.evidence_stream.read_full()
+            if ret:
+                return frame, scale_bbox(bbox, frame_view.source_size, frame.shape[1::-1])
+            print("Основной поток недоступен, снимок нарушения из потока детекции")
+        return frame_view.full(), bbox
+
     def release(self):
         """Освобождение ресурсов"""
-        self.stop()
-        if self.cap is not None:
-            self.cap.release()
-            
-    def manual_reconnect(self):
-        """Ручное инициирование переподключения"""
-        print("Ручной запрос на переподключение...")
-        return self.reconnect()
+        super().release()
+        if self.evidence_stream is not None:
+            self.evidence_stream.release()
+
+    def get_status(self):
+        """Возвращает статус видеопотока (с размером кадра для детекции)"""
+        status = super().get_status()
+        latest_view = self.latest_view
+        status['output_size'] = latest_view.frame.shape[1::-1] if latest_view is not None else None
+        return status
@@ -0,0 +1,45 @@
+import os
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Определяем путь к .env файлу
+current_dir = Path(__file__).parent
+env_path = current_dir.parent / 'enviroment' / '.env'
+
+# Загрузка переменных окружения
+load_dotenv(env_path)
+
+# --- Потоки, которые публикует брокер ---
+# Список имен переменных окружения с RTSP URL (через запятую)
+STREAM_ENV_NAMES = [name.strip() for name in os.getenv('FRAME_BROKER_STREAMS', 'RTSP_URL_CLIENT').split(',') if name.strip()]
+
+STREAMS = {}
+for env_name in STREAM_ENV_NAMES:
+    url = os.getenv(env_name)
+    if url and url not in STREAMS.values():
+        STREAMS[env_name] = url
+
+# --- Параметры общей памяти ---
+MAX_FRAME_WIDTH = int(os.getenv('FRAME_BROKER_MAX_WIDTH', '1920'))
+MAX_FRAME_HEIGHT = int(os.getenv('FRAME_BROKER_MAX_HEIGHT', '1080'))
+PUBLISH_FPS = float(os.getenv('FRAME_BROKER_MAX_FPS', '10'))
+RESTART_DELAY = int(os.getenv('FRAME_BROKER_RESTART_DELAY', '5'))
+
+# Настройки подключения камеры
+BUFFER_SIZE = int(os.getenv('CAMERA_BUFFER_SIZE', '1'))
+RECONNECT_TIMEOUT = int(os.getenv('CAMERA_RECONNECT_TIMEOUT', '10'))
+MAX_RECONNECT_ATTEMPTS = int(os.getenv('CAMERA_MAX_RECONNECT_ATTEMPTS', '1000000'))
+RECONNECT_MAX_DELAY = float(os.getenv('CAMERA_RECONNECT_MAX_DELAY', '120'))
+OPEN_TIMEOUT = float(os.getenv('CAMERA_OPEN_TIMEOUT', '10'))
+
+# --- Настройки обработки ошибок декодирования ---
+DECODE_ERROR_THRESHOLD = int(os.getenv('DECODE_ERROR_THRESHOLD', 10))
+DECODE_ERROR_WINDOW = int(os.getenv('DECODE_ERROR_WINDOW', 180))
+RECONNECT_ON_DECODE_ERROR = os.getenv('RECONNECT_ON_DECODE_ERROR', 'True').lower() == 'true'
+
+if __name__ == "__main__":
+    print("\nТекущие настройки брокера кадров:")
+    for env_name, url in STREAMS.items():
+        print(f"{env_name}: {url[:50]}..." if len(url) > 50 else f"{env_name}: {url}")
+    print(f"Макс. размер кадра: {MAX_FRAME_WIDTH}x{MAX_FRAME_HEIGHT}")
+    print(f"Частота публикации: {PUBLISH_FPS} FPS")
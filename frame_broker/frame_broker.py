@@ -0,0 +1,99 @@
+import time
+import signal
+import multiprocessing
+
+from config import (STREAMS, MAX_FRAME_WIDTH, MAX_FRAME_HEIGHT, PUBLISH_FPS, RESTART_DELAY,
+                    BUFFER_SIZE, RECONNECT_TIMEOUT, MAX_RECONNECT_ATTEMPTS, RECONNECT_MAX_DELAY, OPEN_TIMEOUT,
+                    DECODE_ERROR_THRESHOLD, DECODE_ERROR_WINDOW, RECONNECT_ON_DECODE_ERROR)
+from common.video_stream import VideoStream
+from common.shared_frame import SharedFrameWriter
+
+def handle_sigterm(signum, frame):
+    """SIGTERM от systemd обрабатываем как Ctrl+C"""
+    raise KeyboardInterrupt
+
+def publish_camera(env_name, rtsp_url):
+    """
+    Процесс одной камеры: один декодер на RTSP URL, последний кадр публикуется
+    в общую память для всех подписанных сервисов.
+    """
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    print(f"[{time.strftime('%H:%M:%S')}] [{env_name}] Запуск публикации потока")
+
+    writer = SharedFrameWriter(rtsp_url, MAX_FRAME_WIDTH, MAX_FRAME_HEIGHT)
+    video_stream = VideoStream(
+        rtsp_url, BUFFER_SIZE, RECONNECT_TIMEOUT, MAX_RECONNECT_ATTEMPTS,
+        reconnect_max_delay=RECONNECT_MAX_DELAY, open_timeout=OPEN_TIMEOUT,
+        decode_error_threshold=DECODE_ERROR_THRESHOLD, decode_error_window=DECODE_ERROR_WINDOW,
+        reconnect_on_decode_error=RECONNECT_ON_DECODE_ERROR
+    ).start()
+
+    publish_interval = 1.0 / PUBLISH_FPS if PUBLISH_FPS > 0 else 0
+    last_seq = 0
+    last_publish_time = 0
+
+    try:
+        while True:
+            # Поток захвата завершился из-за ошибки - процесс перезапустит брокер
+            if not video_stream.thread.is_alive():
+                break
+
+            # Ограничение частоты публикации
+            wait_time = publish_interval - (time.time() - last_publish_time)
+            if wait_time > 0:
+                time.sleep(wait_time)
+
+            # Ждем новый кадр; без кадров раз в 0.5 сек обновляем heartbeat
+            ret, frame_view = video_stream.wait_for_new_frame(timeout=0.5, after_seq=last_seq)
+            if ret:
+                writer.publish(frame_view.frame, video_stream.get_status())
+                last_seq = frame_view.seq
+                last_publish_time = time.time()
+            else:
+                writer.heartbeat(video_stream.get_status())
+
+    except KeyboardInterrupt:
+        pass
+    finally:
+        video_stream.release()
+        writer.close()
+        print(f"[{time.strftime('%H:%M:%S')}] [{env_name}] Публикация потока остановлена")
+
+def run_broker():
+    """
+    Главный цикл брокера: по процессу на камеру, перезапуск упавших процессов.
+    """
+    if not STREAMS:
+        print("Не заданы потоки для брокера (FRAME_BROKER_STREAMS). Завершение.")
+        return
+
+    print(f"Запуск брокера кадров. Потоков: {len(STREAMS)}")
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+    processes = {}
+    try:
+        while True:
+            for env_name, rtsp_url in STREAMS.items():
+                process = processes.get(env_name)
+                if process is None or not process.is_alive():
+                    if process is not None:
+                        print(f"[{time.strftime('%H:%M:%S')}] [{env_name}] Процесс камеры завершился (код {process.exitcode}). Перезапуск...")
+                    process = multiprocessing.Process(
+                        target=publish_camera, args=(env_name, rtsp_url),
+                        name=f"frame_broker_{env_name}", daemon=True
+                    )
+                    process.start()
+                    processes[env_name] = process
+            time.sleep(RESTART_DELAY)
+
+    except KeyboardInterrupt:
+        print("\nОстановка брокера кадров")
+    finally:
+        for process in processes.values():
+            if process.is_alive():
+                process.terminate()
+        for process in processes.values():
+            process.join(timeout=5.0)
+
+if __name__ == "__main__":
+    run_broker()
@@ -0,0 +1,46 @@
+import os
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Определяем путь к .env файлу
+current_dir = Path(__file__).parent
+env_path = current_dir.parent / 'enviroment' / '.env'
+
+# Загрузка переменных окружения
+load_dotenv(env_path)
+
+# --- Сокет сервера ---
+INFERENCE_SOCKET = os.getenv('INFERENCE_SOCKET', '/tmp/cyber_inference.sock')
+
+# --- Модели, загружаемые при запуске ---
+# Список имен переменных окружения с путями моделей (через запятую).
+# Остальные модели загружаются при первом запросе сервиса
+MODEL_ENV_NAMES = [name.strip() for name in os.getenv('INFERENCE_SERVER_MODELS', 'MODEL_PATH').split(',') if name.strip()]
+PRELOAD_MODELS = [os.getenv(env_name) for env_name in MODEL_ENV_NAMES if os.getenv(env_name)]
+INFERENCE_ENGINE = os.getenv('INFERENCE_ENGINE', 'onnxruntime').lower()
+MODEL_PRECISION = os.getenv('MODEL_PRECISION', 'fp32').lower()
+
+# --- Приоритеты клиентов ---
+# имя:приоритет через запятую, меньше - обслуживается раньше
+PRIORITIES = {}
+for item in os.getenv('INFERENCE_SERVER_PRIORITIES', 'cassir:0,client:0,cook:1,scale:2').split(','):
+    if ':' in item:
+        name, priority = item.split(':', 1)
+        PRIORITIES[name.strip()] = int(priority)
+DEFAULT_PRIORITY = int(os.getenv('INFERENCE_SERVER_DEFAULT_PRIORITY', '1'))
+
+# --- Объединение запросов в пакеты ---
+# Одновременные запросы к одной модели выполняются одним проходом (модель с dynamic batch)
+MAX_BATCH = int(os.getenv('INFERENCE_SERVER_MAX_BATCH', '4'))
+# Сколько ждать остальные запросы пакета после первого (мс)
+MAX_BATCH_WAIT = float(os.getenv('INFERENCE_SERVER_MAX_BATCH_WAIT_MS', '5')) / 1000
+
+# Период вывода статистики запросов (сек, 0 - не выводить)
+STATS_INTERVAL = float(os.getenv('INFERENCE_SERVER_STATS_INTERVAL', '300'))
+
+if __name__ == "__main__":
+    print("\nТекущие настройки сервера инференса:")
+    print(f"Сокет: {INFERENCE_SOCKET}")
+    print(f"Модели при запуске: {PRELOAD_MODELS} ({INFERENCE_ENGINE}, {MODEL_PRECISION})")
+    print(f"Приоритеты: {PRIORITIES} (по умолчанию {DEFAULT_PRIORITY})")
+    print(f"Пакеты: до {MAX_BATCH} запросов, ожидание {MAX_BATCH_WAIT * 1000:.0f} мс")
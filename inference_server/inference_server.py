@@ -0,0 +1,190 @@
+import os
+import time
+import signal
+import socket
+import threading
+import numpy as np
+
+from config import (INFERENCE_SOCKET, PRELOAD_MODELS, INFERENCE_ENGINE, MODEL_PRECISION,
+                    PRIORITIES, DEFAULT_PRIORITY, STATS_INTERVAL, MAX_BATCH, MAX_BATCH_WAIT)
+from common.inference_client import send_message, recv_message
+from common.inference_engine import load_detector
+from common.micro_batch import MicroBatcher, format_histogram
+from common.postprocess import results_to_array
+from common.shared_frame import attach_segment
+
+def handle_sigterm(signum, frame):
+    """SIGTERM от systemd обрабатываем как Ctrl+C"""
+    raise KeyboardInterrupt
+
+class InferenceServer:
+    """
+    Сервер инференса: модели загружаются один раз и обслуживают запросы всех сервисов.
+    На каждого клиента - поток соединения, кадры читаются из сегмента общей памяти клиента.
+    Запросы к модели идут через MicroBatcher: приоритеты клиентов и объединение
+    одновременных запросов в один пакетный проход
+    """
+    def __init__(self):
+        self.workers = {}
+        self.workers_lock = threading.Lock()
+        self.stats = {}
+        self.stats_lock = threading.Lock()
+
+    def get_worker(self, model_path, engine, precision, engine_options=None):
+        """
+        Модель по пути, движку, точности и параметрам движка клиента (max_batch, imgsz) -
+        загружается при первом обращении. Без max_batch клиента - MAX_BATCH сервера
+        """
+        options = dict({'max_batch': MAX_BATCH}, **(engine_options or {}))
+        key = (os.path.abspath(model_path), engine, precision,
+               tuple(sorted((name, tuple(value) if isinstance(value, list) else value) for name, value in options.items())))
+        with self.workers_lock:
+            worker = self.workers.get(key)
+            if worker is None:
+                start = time.time()
+                model = load_detector(key[0], engine, precision, **options)
+                worker = MicroBatcher(model, options['max_batch'], MAX_BATCH_WAIT, os.path.basename(key[0]))
+                self.workers[key] = worker
+                print(f"[{time.strftime('%H:%M:%S')}] Модель загружена: {key[0]} ({engine}, {precision}, {options}) "
+                      f"за {time.time() - start:.1f} сек")
+            return worker
+
+    def record(self, client, request):
+        with self.stats_lock:
+            stats = self.stats.setdefault(client, {'requests': 0, 'wait': 0.0, 'inference': 0.0})
+            stats['requests'] += 1
+            stats['wait'] += request.wait_time
+            stats['inference'] += request.inference_time
+
+    def print_stats(self):
+        """Статистика запросов по клиентам и размеров пакетов по моделям за период (счетчики сбрасываются)"""
+        with self.stats_lock:
+            stats, self.stats = self.stats, {}
+        with self.workers_lock:
+            workers = list(self.workers.values())
+        for worker in workers:
+            batches = worker.get_stats(reset=True)
+            if batches['batches']:
+                print(f"[{time.strftime('%H:%M:%S')}] [{worker.name}] проходов: {batches['batches']}, "
+                      f"запросов: {batches['requests']}, пакеты: {format_histogram(batches['histogram'])}")
+        for client, s in sorted(stats.items()):
+            print(f"[{time.strftime('%H:%M:%S')}] [{client}] запросов: {s['requests']}, "
+                  f"ожидание: {s['wait'] / s['requests'] * 1000:.1f} мс, "
+                  f"инференс: {s['inference'] / s['requests'] * 1000:.1f} мс")
+
+    def handle_client(self, conn):
+        """
+        Соединение одного клиента: load - выбор модели, detect - детекция кадра из общей памяти,
+        detect_batch - детекция нескольких кадров, записанных в сегмент подряд
+        """
+        client = 'unknown'
+        priority = DEFAULT_PRIORITY
+        worker = None
+        shm = None
+        frames = None
+        requests = None
+        try:
+            while True:
+                message, _ = recv_message(conn)
+                op = message.get('op')
+                if op == 'load':
+                    client = message.get('client', client)
+                    priority = PRIORITIES.get(client, DEFAULT_PRIORITY)
+                    try:
+                        worker = self.get_worker(message['model'], message.get('engine', INFERENCE_ENGINE),
+                                                 message.get('precision', MODEL_PRECISION),
+                                                 message.get('engine_options'))
+                    except Exception as e:
+                        send_message(conn, {'ok': False, 'error': str(e)})
+                        continue
+                    names = getattr(worker.model, 'names', None) or {}
+                    send_message(conn, {'ok': True, 'priority': priority, 'names': {str(k): v for k, v in names.items()}})
+                    print(f"[{time.strftime('%H:%M:%S')}] [{client}] Подключен к {worker.name} (приоритет {priority})")
+                elif op in ('detect', 'detect_batch') and worker is not None:
+                    if shm is None or shm.name.lstrip('/') != message['shm']:
+                        # Клиент пересоздал сегмент под кадр большего размера: до close() не должно
+                        # остаться ссылок на буфер (результат ultralytics хранит кадр в orig_img)
+                        frames = requests = None
+                        if shm is not None:
+                            try:
+                                shm.close()
+                            except BufferError:
+                                pass
+                        shm = attach_segment(message['shm'])
+                    if op == 'detect':
+                        shapes, options = [message['shape']], [message]
+                    else:
+                        shapes, options = message['shapes'], message['options']
+                    # Кадры пакета записаны в сегмент подряд
+                    frames, offset = [], 0
+                    for shape in shapes:
+                        frames.append(np.ndarray(tuple(shape), dtype=np.uint8, buffer=shm.buf, offset=offset))
+                        offset += frames[-1].nbytes
+                    options = [{key: opts[key] for key in ('conf', 'iou', 'classes') if key in opts} for opts in options]
+                    try:
+                        requests = worker.submit_many(frames, options, priority)
+                    except Exception as e:
+                        frames = None
+                        send_message(conn, {'ok': False, 'error': str(e)})
+                        continue
+                    for request in requests:
+                        self.record(client, request)
+                    dets = [results_to_array([request.result]).copy() for request in requests]
+                    frames = requests = request = None
+                    counts = [len(frame_dets) for frame_dets in dets]
+                    reply = {'ok': True, 'count': counts[0]} if op == 'detect' else {'ok': True, 'counts': counts}
+                    send_message(conn, reply, b''.join(frame_dets.tobytes() for frame_dets in dets))
+                else:
+                    send_message(conn, {'ok': False, 'error': f"Неизвестный запрос: {op}"})
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            frames = requests = None
+            if shm is not None:
+                try:
+                    shm.close()
+                except Exception:
+                    pass
+            conn.close()
+            print(f"[{time.strftime('%H:%M:%S')}] [{client}] Отключен")
+
+def stats_loop(server):
+    while True:
+        time.sleep(STATS_INTERVAL)
+        server.print_stats()
+
+def run_server():
+    """
+    Главный цикл сервера инференса: загрузка моделей, прием подключений сервисов.
+    """
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    server = InferenceServer()
+    for model_path in PRELOAD_MODELS:
+        try:
+            server.get_worker(model_path, INFERENCE_ENGINE, MODEL_PRECISION)
+        except Exception as e:
+            print(f"Ошибка загрузки модели {model_path}: {e}")
+
+    # Сокет от аварийно завершенного сервера удаляем
+    if os.path.exists(INFERENCE_SOCKET):
+        os.remove(INFERENCE_SOCKET)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(INFERENCE_SOCKET)
+    listener.listen(16)
+    if STATS_INTERVAL > 0:
+        threading.Thread(target=stats_loop, args=(server,), daemon=True).start()
+    print(f"Сервер инференса запущен: {INFERENCE_SOCKET}")
+
+    try:
+        while True:
+            conn, _ = listener.accept()
+            threading.Thread(target=server.handle_client, args=(conn,), daemon=True).start()
+    except KeyboardInterrupt:
+        print("\nОстановка сервера инференса")
+    finally:
+        listener.close()
+        if os.path.exists(INFERENCE_SOCKET):
+            os.remove(INFERENCE_SOCKET)
+
+if __name__ == "__main__":
+    run_server()
@@ -34,6 +34,15 @@ SHOW_WINDOW = os.getenv('SHOW_DETECTION_PEOPLE').lower() == 'true'
 TARGET_DETECTION_FPS = int(os.getenv('TARGET_FPS'))
 CONFIDENCE_THRESHOLD = float(os.getenv('CONFIDENCE_THRESHOLD'))
 
+# Полная детекция каждые N кадров, на остальных боксы треков переносятся оптическим потоком
+# (1 - детекция с трекингом ByteTrack model.track на каждом кадре)
+DETECT_EVERY_N = int(os.getenv('DETECT_EVERY_N_PEOPLE', '1'))
+# Трекинг между детекциями (DETECT_EVERY_N > 1): мин. IoU перенесенного бокса трека с детекцией,
+# детекций без бокса до удаления трека, детекций трека до учета его id в счетчике уникальных людей
+TRACK_IOU_THRESHOLD = float(os.getenv('TRACK_IOU_THRESHOLD_PEOPLE', '0.3'))
+TRACK_MAX_MISSED = int(os.getenv('TRACK_MAX_MISSED_PEOPLE', '3'))
+TRACK_MIN_HITS = int(os.getenv('TRACK_MIN_HITS_PEOPLE', '2'))
+
 # Настройки ROI
 ROI_STR = os.getenv('ROI_POINTS_PEOPLE')
 
@@ -1,28 +1,37 @@
 import time
 import threading
-import cv2
 import numpy as np
 from collections import deque
 from ultralytics import YOLO
-from config import REPORT_INTERVAL, CONFIDENCE_THRESHOLD
+from config import (REPORT_INTERVAL, CONFIDENCE_THRESHOLD, DETECT_EVERY_N,
+                    TRACK_IOU_THRESHOLD, TRACK_MAX_MISSED, TRACK_MIN_HITS)
 from database import save_people_count_to_db
+from common.roi_geometry import get_roi_geometry
+from common.postprocess import results_to_array, bottom_centers, boxes_xyxy, empty_detections
+from common.flow_tracker import FlowTracker
 
 class DetectionProcessor:
     """
-    Класс для обработки детекции и трекинга в отдельном потоке
+    Класс для обработки детекции и трекинга в отдельном потоке.
+    detect_every > 1 - полная детекция на каждом detect_every-м кадре, между детекциями
+    боксы треков переносятся оптическим потоком (FlowTracker) вместо model.track
     """
-    def __init__(self, model, roi_points=None, report_interval=None):
+    def __init__(self, model, roi_points=None, report_interval=None, detect_every=DETECT_EVERY_N):
         self.model = model
         self.roi_points = roi_points
+        self.detect_every = max(1, detect_every)
+        self.tracker = FlowTracker(TRACK_IOU_THRESHOLD, TRACK_MAX_MISSED) if self.detect_every > 1 else None
+        self.frames_since_detection = self.detect_every  # Первый кадр - с детекцией
         self.lock = threading.Lock()
         self.current_results = {
             'person_count': 0,
             'tracked_people': set(),  # Множество для отслеживания уникальных ID людей
-            'boxes': [],
+            'boxes': empty_detections(),  # Детекции DETECTION_DTYPE (bbox и track_id)
             'timestamp': 0,
             'processed_frames': 0
         }
         self.frame_queue = deque(maxlen=1)  # Очередь на 1 кадр
+        self.frame_ready = threading.Condition()  # Сигнал о новом кадре в очереди
         self.stopped = False
         self.processing = False
         
@@ -43,58 +52,65 @@ class DetectionProcessor:
     def add_frame(self, frame):
         """Добавление кадра для обработки"""
         if not self.processing and frame is not None:
-            self.frame_queue.append(frame)
+            with self.frame_ready:
+                self.frame_queue.append(frame)
+                self.frame_ready.notify()
             
-    def is_point_in_roi(self, x, y):
-        """Проверяет, находится ли точка внутри ROI"""
+    def points_in_roi(self, points, frame_shape):
+        """
+        Какие точки (N, 2) находятся внутри ROI - одно чтение растра ROI на точку
+        (геометрия ROI строится один раз для размера кадра)
+        """
         if self.roi_points is None or len(self.roi_points) < 3:
-            return True  # Если ROI не задан, считаем всю область валидной
-        
-        # Преобразуем точки ROI в numpy массив
-        roi_array = np.array(self.roi_points, np.int32)
-        
-        # Используем pointPolygonTest для проверки нахождения точки внутри полигона
-        result = cv2.pointPolygonTest(roi_array, (x, y), False)
-        return result >= 0  # >=0 означает внутри полигона, <0 - снаружи
+            return np.ones(len(points), dtype=bool)  # Если ROI не задан, считаем всю область валидной
+        return get_roi_geometry([self.roi_points], frame_shape).contains(points)
+    
+    def detect_or_propagate(self, frame):
+        """
+        Люди с id треков в режиме detect_every > 1: на каждом detect_every-м кадре - детекция
+        и сопоставление с треками, на остальных - перенос боксов треков на кадр.
+        В результат входят треки, подтвержденные не менее чем TRACK_MIN_HITS детекциями
+        """
+        if self.frames_since_detection >= self.detect_every:
+            results = self.model(frame, verbose=False, conf=CONFIDENCE_THRESHOLD)
+            detections = results_to_array(results, classes=[0], min_conf=CONFIDENCE_THRESHOLD)
+            self.tracker.update(frame, boxes_xyxy(detections), detections['conf'])
+            self.frames_since_detection = 0
+        else:
+            self.tracker.propagate(frame)
+        self.frames_since_detection += 1
+        return self.tracker.detections(TRACK_MIN_HITS)
     
     def process(self):
         """Основной цикл обработки"""
         while not self.stopped:
-            if self.frame_queue:
-                frame = self.frame_queue[0]
+            # Ждем кадр без опроса очереди в цикле
+            with self.frame_ready:
+                self.frame_ready.wait_for(lambda: self.frame_queue or self.stopped, timeout=1.0)
+                frame = self.frame_queue[0] if self.frame_queue else None
+            
+            if frame is not None:
                 self.processing = True
                 
                 try:
-                    # Выполняем детекцию с трекингом
-                    results = self.model.track(frame, persist=True, verbose=False, conf=CONFIDENCE_THRESHOLD)
-                    
-                    # Обрабатываем результаты
-                    person_count = 0
-                    current_tracked_people = set()
-                    boxes = []
+                    if self.tracker is not None:
+                        # Детекция каждые detect_every кадров, между ними - перенос треков
+                        persons = self.detect_or_propagate(frame)
+                    else:
+                        # Выполняем детекцию с трекингом
+                        results = self.model.track(frame, persist=True, verbose=False, conf=CONFIDENCE_THRESHOLD)
+                        
+                        # Люди с достаточной уверенностью и id трека - фильтр над массивами всех боксов
+                        persons = results_to_array(results, classes=[0], min_conf=CONFIDENCE_THRESHOLD)
+                        persons = persons[persons['track_id'] >= 0]
                     
-                    for result in results:
-                        result_boxes = result.boxes
-                        if result_boxes is not None and result_boxes.id is not None:
-                            for box, track_id in zip(result_boxes, result_boxes.id):
-                                cls = int(box.cls[0])
-                                confidence = box.conf[0].item()
-                                
-                                # Фильтруем только людей с достаточной уверенностью
-                                if cls == 0 and confidence >= CONFIDENCE_THRESHOLD:
-                                    # Получаем координаты bounding box
-                                    x1, y1, x2, y2 = map(int, box.xyxy[0])
-                                    
-                                    # Проверяем, находится ли центр нижней части bounding box внутри ROI
-                                    center_x = (x1 + x2) // 2
-                                    center_y = y2  # Нижний центр bounding box
-                                    
-                                    if self.is_point_in_roi(center_x, center_y):
-                                        person_count += 1
-                                        track_id_int = int(track_id.item())
-                                        current_tracked_people.add(track_id_int)
-                                        self.all_tracked_people.add(track_id_int)
-                                        boxes.append((box, track_id_int))
+                    # Нижний центр bounding box должен быть внутри ROI (все боксы сразу)
+                    if len(persons):
+                        persons = persons[self.points_in_roi(bottom_centers(persons), frame.shape)]
+                    boxes = persons
+                    person_count = len(persons)
+                    current_tracked_people = set(persons['track_id'].tolist())
+                    self.all_tracked_people.update(current_tracked_people)
                     
                     # Проверяем, нужно ли вывести отчет и сохранить в БД
                     current_time = time.time()
@@ -123,16 +139,14 @@ class DetectionProcessor:
                             'processed_frames': self.current_results['processed_frames'] + 1
                         }
                     
-                    # Удаляем обработанный кадр
-                    if self.frame_queue:
-                        self.frame_queue.pop()
-                        
                 except Exception as e:
                     print(f"Ошибка при обработке детекции: {e}")
                 
+                # Удаляем обработанный кадр
+                with self.frame_ready:
+                    if self.frame_queue:
+                        self.frame_queue.pop()
                 self.processing = False
-            else:
-                time.sleep(0.001)  # Короткая пауза если нет кадров для обработки
                 
     def get_results(self):
         """Получение текущих результатов"""
@@ -142,5 +156,7 @@ class DetectionProcessor:
     def stop(self):
         """Остановка потока"""
         self.stopped = True
+        with self.frame_ready:
+            self.frame_ready.notify_all()
         if hasattr(self, 'thread'):
             self.thread.join(timeout=1.0)
@@ -6,6 +6,7 @@ from ultralytics import YOLO
 from config import *
 from video_stream import VideoStream
 from detection_processor import DetectionProcessor
+from common.postprocess import bbox_tuple
 import schedule_checker
 from database import init_local_db, sync_offline_data
 
@@ -89,13 +90,22 @@ def run_ncnn_realtime():
                 
                 last_detection_time = 0
                 detection_interval = 1.0 / TARGET_DETECTION_FPS
+                last_frame_seq = None
                 
                 try:
                     while time.time() < end_loop_time:
                         
-                        ret, frame = video_stream.read()
+                        # Без окна кадры нужны только с частотой детекции
+                        if not SHOW_WINDOW:
+                            wait_time = last_detection_time + detection_interval - time.time()
+                            if wait_time > 0:
+                                time.sleep(wait_time)
                         
-                        if not ret or frame is None:
+                        # Ожидание нового кадра без опроса в цикле. Кадр без копирования:
+                        # детектор только читает его, копия делается один раз для отрисовки
+                        ret, frame_view = video_stream.wait_for_new_frame(timeout=1.0, after_seq=last_frame_seq)
+                        
+                        if not ret or frame_view is None:
                             if SHOW_WINDOW:
                                 error_frame = np.zeros((480, 640, 3), dtype=np.uint8)
                                 cv2.putText(error_frame, 'NO SIGNAL', (200, 240), 
@@ -103,9 +113,10 @@ def run_ncnn_realtime():
                                 cv2.imshow('Person Detection', error_frame)
                                 if cv2.waitKey(1) & 0xFF == ord('q'):
                                     raise KeyboardInterrupt
-                            time.sleep(0.1)
                             continue
 
+                        last_frame_seq = frame_view.seq
+                        frame = frame_view.frame
                         current_time = time.time()
                         
                         # Отправка на детекцию (FPS limit)
@@ -124,10 +135,10 @@ def run_ncnn_realtime():
 
                             results = detection_processor.get_results()
                             
-                            for box, track_id in results['boxes']:
-                                x1, y1, x2, y2 = map(int, box.xyxy[0])
+                            for det in results['boxes']:
+                                x1, y1, x2, y2 = bbox_tuple(det)
                                 cv2.rectangle(display_frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                                cv2.putText(display_frame, f'ID: {track_id}', (x1, y1-10), 
+                                cv2.putText(display_frame, f'ID: {det["track_id"]}', (x1, y1-10), 
                                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
 
                             cv2.putText(display_frame, f'Persons: {results["person_count"]}', (10, 30), 
@@ -8,6 +8,8 @@ from config import (
     HEALTH_CHECK_INTERVAL, DECODE_ERROR_THRESHOLD, 
     DECODE_ERROR_WINDOW, RECONNECT_ON_DECODE_ERROR
 )
+from common.frame_view import make_frame_view
+from common.frame_pool import FramePool
 
 class VideoStream:
     """
@@ -45,12 +47,16 @@ class VideoStream:
         self.initialize_capture()
         
         # Буфер для хранения последнего кадра
-        self.frame_buffer = deque(maxlen=self.buffer_size)
+        self.frame_buffer = deque(maxlen=self.buffer_size)  # История последних кадров (FrameView)
+        self.frame_pool = FramePool(self.buffer_size + 2)  # Слоты для декодера: история + кадр у потребителя + декодируемый
         self.lock = threading.Lock()
+        self.new_frame = threading.Condition(self.lock)
         self.stopped = False
         self.grabbed = False
         self.current_frame = None
         self.last_valid_frame_time = time.time()
+        self.frame_seq = 0  # Порядковый номер последнего кадра
+        self.latest_view = None
         self.consecutive_empty_frames = 0
         self.max_consecutive_empty_frames = 15  # Максимальное количество пустых кадров подряд
         
@@ -221,7 +227,8 @@ class VideoStream:
                         break
                     continue
                 
-                grabbed, frame = self.cap.read()
+                slot = self.frame_pool.acquire()
+                grabbed, frame = self.cap.read(slot)
                 
                 # Проверяем на ошибки декодирования (пустой или поврежденный кадр)
                 if not grabbed:
@@ -265,15 +272,16 @@ class VideoStream:
                 
                 # Валидный кадр получен
                 self.consecutive_empty_frames = 0
+                self.frame_pool.register(frame, slot)
                 
                 with self.lock:
                     self.grabbed = grabbed
                     self.current_frame = frame
                     self.last_valid_frame_time = time.time()
-                    # Очищаем буфер и добавляем только последний кадр
-                    if self.frame_buffer:
-                        self.frame_buffer.clear()
-                    self.frame_buffer.append(frame)
+                    self.frame_seq += 1
+                    self.latest_view = make_frame_view(frame, self.frame_seq, self.last_valid_frame_time)
+                    self.frame_buffer.append(self.latest_view)
+                    self.new_frame.notify_all()
                 
             except cv2.error as e:
                 print(f"OpenCV ошибка в потоке захвата видео: {e}")
@@ -288,8 +296,6 @@ class VideoStream:
                 
                 if not self.reconnect():
                     break
-            
-            time.sleep(0.001)  # Минимальная задержка для реального времени
     
     def health_check(self):
         """Поток для проверки здоровья видеопотока"""
@@ -322,9 +328,45 @@ class VideoStream:
                 return True, self.frame_buffer[-1].copy()
             return False, None
     
+    def read_history(self, count=None):
+        """
+        Последние count кадров (не больше CAMERA_BUFFER_SIZE) как FrameView без копирования,
+        от старых к новым. Для временного голосования по нескольким кадрам
+        """
+        with self.lock:
+            views = list(self.frame_buffer)
+        if count is None:
+            return views
+        return views[max(0, len(views) - count):]
+    
+    def read_view(self):
+        """
+        Чтение последнего кадра без копирования: FrameView с кадром только для чтения
+        и порядковым номером. Для изменения кадра вызывайте view.copy()
+        """
+        with self.lock:
+            if self.frame_buffer:
+                return True, self.latest_view
+            return False, None
+    
+    def wait_for_new_frame(self, timeout=None, after_seq=None):
+        """
+        Ожидание кадра новее after_seq (None - новее текущего) без опроса в цикле.
+        Возвращает (True, FrameView) или (False, None) по таймауту / остановке потока
+        """
+        with self.lock:
+            if after_seq is None:
+                after_seq = self.frame_seq
+            self.new_frame.wait_for(lambda: self.frame_seq != after_seq or self.stopped, timeout=timeout)
+            if self.frame_seq != after_seq and self.frame_buffer:
+                return True, self.latest_view
+            return False, None
+    
     def stop(self):
         """Остановка потока"""
         self.stopped = True
+        with self.lock:
+            self.new_frame.notify_all()
         if hasattr(self, 'thread') and self.thread.is_alive():
             self.thread.join(timeout=2.0)
         if hasattr(self, 'health_thread') and self.health_thread.is_alive():
@@ -53,6 +53,10 @@ class Config:
         self.YOLO_MODEL_PATH = os.getenv('YOLO_MODEL_PATH')
         self.YOLO_CONF_THRESH = float(os.getenv('YOLO_CONF_THRESH'))
         self.YOLO_CLASSES = [int(x) for x in os.getenv('YOLO_CLASSES').split(',')]
+        self.INFERENCE_ENGINE = (os.getenv('INFERENCE_ENGINE_SCALE') or os.getenv('INFERENCE_ENGINE', 'onnxruntime')).lower()  # onnxruntime | ncnn | ultralytics
+        self.MODEL_PRECISION = (os.getenv('MODEL_PRECISION_SCALE') or os.getenv('MODEL_PRECISION', 'fp32')).lower()  # fp32 | int8
+        self.USE_INFERENCE_SERVER = os.getenv('USE_INFERENCE_SERVER', 'False').lower() == 'true'  # Детекция на сервере инференса
+        self.INFERENCE_SOCKET = os.getenv('INFERENCE_SOCKET', '/tmp/cyber_inference.sock')
         
         # Настройки весов (USB)
         self.SCALE_PORT = os.getenv('SCALE_PORT')
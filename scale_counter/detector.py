@@ -1,7 +1,8 @@
 # detector.py
 import cv2
 import os
-from ultralytics import YOLO
+from common.inference_client import create_detector
+from common.postprocess import results_to_array, bbox_tuple
 
 class YOLODetector:
     def __init__(self, config):
@@ -12,9 +13,9 @@ class YOLODetector:
             raise FileNotFoundError(f"Модель YOLO не найдена по пути: {model_path}")
         
         try:
-            # Устанавливаем провайдер только для CPU чтобы избежать предупреждений о GPU
-            providers = ['CPUExecutionProvider']
-            self.model = YOLO(model_path, task='detect')
+            # onnxruntime работает только с CPUExecutionProvider - без предупреждений о GPU
+            self.model = create_detector(model_path, 'scale', config.INFERENCE_ENGINE, config.MODEL_PRECISION,
+                                         config.USE_INFERENCE_SERVER, config.INFERENCE_SOCKET)
         except Exception as e:
             raise
         
@@ -39,23 +40,17 @@ class YOLODetector:
         except Exception as e:
             return 0
         
-        detections = []
-        for result in results:
-            if result.boxes is not None:
-                boxes = result.boxes.xyxy.cpu().numpy()
-                confs = result.boxes.conf.cpu().numpy()
-                clss = result.boxes.cls.cpu().numpy().astype(int)
-                
-                for box, conf, cls in zip(boxes, confs, clss):
-                    detections.append((box, conf, cls))
-                    
-                    x1, y1, x2, y2 = map(int, box)
-                    cv2.rectangle(img, (x1, y1), (x2, y2), self.colors.get(cls, (0, 255, 0)), 2)
-                    
-                    class_name = self.model.names.get(cls, f"Class_{cls}")
-                    label = f"{class_name} {conf:.2f}"
-                    cv2.putText(img, label, (x1, y1-10), 
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.9, self.colors.get(cls, (0, 255, 0)), 2)
+        # xyxy / conf / cls забираются из результата массивами один раз
+        detections = results_to_array(results)
+        for det in detections:
+            cls = int(det['cls'])
+            x1, y1, x2, y2 = bbox_tuple(det)
+            cv2.rectangle(img, (x1, y1), (x2, y2), self.colors.get(cls, (0, 255, 0)), 2)
+            
+            class_name = self.model.names.get(cls, f"Class_{cls}")
+            label = f"{class_name} {det['conf']:.2f}"
+            cv2.putText(img, label, (x1, y1-10), 
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.9, self.colors.get(cls, (0, 255, 0)), 2)
 
         count_label = f"Count: {len(detections)}"
         cv2.putText(img, count_label, (10, 30), 